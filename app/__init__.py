@@ -1,24 +1,21 @@
 from flask import Flask, jsonify
 from flask_restful import Api
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
-from flask_cors import CORS
 from flask_socketio import SocketIO
+import click
 import os
 
 # Initialize extensions
 db = SQLAlchemy()
-migrate = Migrate()
 bcrypt = Bcrypt()
 jwt = JWTManager()
-api = Api()
-cors = CORS()
 socketio = SocketIO(cors_allowed_origins="*")
 
 def create_app(config_class=None):
     flask_app = Flask(__name__)
+    api = Api()  # Per app: resources are registered on every create_app() call
     
     # Determine config class based on environment
     if config_class is None:
@@ -29,18 +26,51 @@ def create_app(config_class=None):
             config_class = Config
     
     flask_app.config.from_object(config_class)
+    
+    # Client address from the trusted proxies' X-Forwarded-* headers (TRUSTED_PROXY_HOPS)
+    proxy_hops = flask_app.config.get('TRUSTED_PROXY_HOPS', 0)
+    if proxy_hops:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        flask_app.wsgi_app = ProxyFix(flask_app.wsgi_app, x_for=proxy_hops, x_proto=proxy_hops)
 
     # Initialize extensions with flask_app
     db.init_app(flask_app)
-    migrate.init_app(flask_app, db)
+    if click.get_current_context(silent=True) is not None:
+        # Only `flask db ...` needs Flask-Migrate (and Alembic); serving processes skip the import
+        from flask_migrate import Migrate
+        Migrate(flask_app, db)
     bcrypt.init_app(flask_app)
     jwt.init_app(flask_app)
-    cors.init_app(flask_app, 
-                  resources={r"/api/*": {"origins": flask_app.config['CORS_ORIGINS']}}, 
-                  supports_credentials=True,
-                  allow_headers=['Content-Type', 'Authorization'],
-                  methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
-    socketio.init_app(flask_app, cors_allowed_origins=flask_app.config['CORS_ORIGINS'])
+    # CORS: origins matched by a policy compiled once from CORS_ORIGINS (app/utils/cors.py)
+    from app.utils.cors import init_cors
+    cors_policy = init_cors(flask_app)
+    # Register Socket.IO handlers before init_app so every app's server gets them
+    try:
+        import app.sockets
+    except Exception:
+        pass
+    socketio.init_app(flask_app, cors_allowed_origins='*' if cors_policy.allow_any else cors_policy.allows,
+                      message_queue=flask_app.config.get('REDIS_URL') or None)
+    
+    # Shared presence store for Socket.IO (Redis when REDIS_URL is set)
+    from app.utils.presence import init_presence
+    init_presence(flask_app)
+    
+    # Login throttling, sharing the presence store's Redis (app/utils/rate_limit.py)
+    from app.utils.rate_limit import init_login_limiters
+    init_login_limiters(flask_app)
+    
+    # Optional write-behind for socket chat messages (replays leftover journals)
+    from app.utils.message_buffer import init_message_buffer
+    init_message_buffer(flask_app)
+    
+    # Bounded bcrypt pool for set_password/check_password (app/utils/passwords.py)
+    from app.utils.passwords import init_password_hasher
+    init_password_hasher(flask_app)
+    
+    # JWT claims/revocation loaders and request-scoped current user (app/utils/auth.py)
+    from app.utils.auth import init_auth
+    init_auth(flask_app)
     
     # Import models to ensure they're registered
     try:
@@ -48,27 +78,23 @@ def create_app(config_class=None):
     except Exception:
         pass
     
-    # Initialize Cloudinary only if credentials are provided
-    if flask_app.config.get('CLOUDINARY_CLOUD_NAME'):
-        try:
-            from app.utils.cloudinary import init_cloudinary
-            with flask_app.app_context():
-                init_cloudinary()
-        except Exception:
-            pass
+    # Cloudinary and SendGrid are imported and configured on first use
+    # (app/utils/cloudinary.py, app/utils/email.py), not here
     
     # Register resources with error handling
     try:
-        from app.resources.auth import Register, Login, Profile
+        from app.resources.auth import Register, Login, Refresh, Logout, Profile
         from app.resources.users import UserList, UserDetail, UserProfileImage
         from app.resources.properties import PropertyList, PropertyDetail, PropertyImages
         from app.resources.payments import PaymentList, PaymentDetail, PaymentCallback
-        from app.resources.chat import ConversationList, ConversationDetail, MessageList
+        from app.resources.chat import ConversationList, ConversationDetail, ConversationRead, MessageList
         from app.resources.dashboard import LandlordDashboard, TenantDashboard
         
         # Authentication routes
         api.add_resource(Register, '/api/auth/register')
         api.add_resource(Login, '/api/auth/login')
+        api.add_resource(Refresh, '/api/auth/refresh')
+        api.add_resource(Logout, '/api/auth/logout')
         api.add_resource(Profile, '/api/auth/profile')
         
         # User routes
@@ -89,6 +115,7 @@ def create_app(config_class=None):
         # Chat routes
         api.add_resource(ConversationList, '/api/conversations')
         api.add_resource(ConversationDetail, '/api/conversations/<int:conversation_id>')
+        api.add_resource(ConversationRead, '/api/conversations/<int:conversation_id>/read')
         api.add_resource(MessageList, '/api/conversations/<int:conversation_id>/messages')
         
         # Dashboard routes
@@ -100,12 +127,6 @@ def create_app(config_class=None):
     
     api.init_app(flask_app)
     
-    # Register Socket.IO handlers
-    try:
-        import app.sockets
-    except Exception:
-        pass
-    
     # Health check endpoint
     @flask_app.route('/health')
     def health_check():
@@ -123,48 +144,6 @@ def create_app(config_class=None):
             'environment': os.environ.get('FLASK_ENV', 'development')
         }), 200
     
-    # Handle preflight OPTIONS requests
-    @flask_app.before_request
-    def handle_preflight():
-        from flask import request
-        if request.method == "OPTIONS":
-            response = jsonify({'status': 'ok'})
-            origin = request.headers.get('Origin')
-            allowed_origins = flask_app.config.get('CORS_ORIGINS', ['*'])
-            
-            # Set proper origin header
-            if origin and origin in allowed_origins:
-                response.headers['Access-Control-Allow-Origin'] = origin
-            elif '*' in allowed_origins:
-                response.headers['Access-Control-Allow-Origin'] = '*'
-            else:
-                # Default to the requesting origin if it's in our list
-                response.headers['Access-Control-Allow-Origin'] = origin or '*'
-            
-            response.headers['Access-Control-Allow-Headers'] = 'Content-Type,Authorization'
-            response.headers['Access-Control-Allow-Methods'] = 'GET,PUT,POST,DELETE,OPTIONS'
-            response.headers['Access-Control-Allow-Credentials'] = 'true'
-            return response
-    
-    # Handle CORS for all requests
-    @flask_app.after_request
-    def after_request(response):
-        from flask import request
-        origin = request.headers.get('Origin')
-        allowed_origins = flask_app.config.get('CORS_ORIGINS', ['*'])
-        
-        # Only set CORS headers if not already set by preflight handler
-        if not response.headers.get('Access-Control-Allow-Origin'):
-            if origin and origin in allowed_origins:
-                response.headers['Access-Control-Allow-Origin'] = origin
-            elif '*' in allowed_origins:
-                response.headers['Access-Control-Allow-Origin'] = '*'
-        
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type,Authorization'
-        response.headers['Access-Control-Allow-Methods'] = 'GET,PUT,POST,DELETE,OPTIONS'
-        response.headers['Access-Control-Allow-Credentials'] = 'true'
-        return response
-    
     # Error handlers
     @flask_app.errorhandler(404)
     def not_found(error):
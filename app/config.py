@@ -32,11 +32,29 @@ class Config:
     
     # JWT Configuration
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key-change-in-production'
-    JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
+    # Access tokens are short-lived and never looked up; sessions continue
+    # through rotating refresh tokens (POST /api/auth/refresh)
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=int(os.environ.get('JWT_ACCESS_TOKEN_MINUTES', 15)))
+    REFRESH_TOKEN_EXPIRES = timedelta(days=int(os.environ.get('REFRESH_TOKEN_DAYS', 30)))
     JWT_TOKEN_LOCATION = ['headers']
+    # How long each worker trusts its cached User.token_version (app/utils/auth.py)
+    TOKEN_VERSION_CACHE_SECONDS = int(os.environ.get('TOKEN_VERSION_CACHE_SECONDS', 30))
     
     # Security Configuration
-    BCRYPT_LOG_ROUNDS = 12
+    # Password hashing (app/utils/passwords.py): bcrypt rounds, concurrent
+    # hashes, and callers allowed to wait before logins get a 503
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 4))
+    PASSWORD_HASH_MAX_QUEUE = int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', 64))
+    # Login throttling (app/utils/rate_limit.py): attempts per client IP and
+    # failed attempts per email allowed in a sliding window
+    LOGIN_LIMIT_WINDOW_SECONDS = int(os.environ.get('LOGIN_LIMIT_WINDOW_SECONDS', 300))
+    LOGIN_LIMIT_PER_IP = int(os.environ.get('LOGIN_LIMIT_PER_IP', 100))
+    LOGIN_LIMIT_PER_EMAIL = int(os.environ.get('LOGIN_LIMIT_PER_EMAIL', 10))
+    # Reverse proxies in front of the app whose X-Forwarded-For/-Proto are
+    # trusted (werkzeug ProxyFix), so request.remote_addr is the client's
+    # address and per-IP limits don't lump every client into the proxy's bucket
+    TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
     
     # CORS Configuration
     cors_origins = os.environ.get('CORS_ORIGINS', '*')
@@ -44,21 +62,50 @@ class Config:
         CORS_ORIGINS = ['*']
     else:
         CORS_ORIGINS = [origin.strip() for origin in cors_origins.split(',') if origin.strip()]
+    # How long browsers may cache a preflight (Chromium caps this at 2 hours)
+    CORS_MAX_AGE = int(os.environ.get('CORS_MAX_AGE', 7200))
     
     # Optional Services (can be empty for local development)
     MPESA_CONSUMER_KEY = os.environ.get('MPESA_CONSUMER_KEY', '')
     MPESA_CONSUMER_SECRET = os.environ.get('MPESA_CONSUMER_SECRET', '')
     MPESA_BUSINESS_SHORTCODE = os.environ.get('MPESA_BUSINESS_SHORTCODE', '174379')
     MPESA_PASSKEY = os.environ.get('MPESA_PASSKEY', '')
+    STK_PUSH_WORKERS = int(os.environ.get('STK_PUSH_WORKERS', 8))  # Background STK push threads
     
     SENDGRID_API_KEY = os.environ.get('SENDGRID_API_KEY', '')
     SENDGRID_FROM_EMAIL = os.environ.get('SENDGRID_FROM_EMAIL', 'noreply@rentalplatform.com')
     
+    # Email outbox worker thread in each serving web process (app/utils/email_outbox.py);
+    # disable when running email_worker.py separately
+    EMAIL_OUTBOX_WORKER = os.environ.get('EMAIL_OUTBOX_WORKER', 'true').lower() == 'true'
+    EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', 50))
+    EMAIL_OUTBOX_POLL_SECONDS = float(os.environ.get('EMAIL_OUTBOX_POLL_SECONDS', 2))
+    
     CLOUDINARY_CLOUD_NAME = os.environ.get('CLOUDINARY_CLOUD_NAME', '')
     CLOUDINARY_API_KEY = os.environ.get('CLOUDINARY_API_KEY', '')
     CLOUDINARY_API_SECRET = os.environ.get('CLOUDINARY_API_SECRET', '')
     
     FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
+    
+    # Socket.IO message queue and presence store (app/utils/presence.py);
+    # required to run more than one worker or node
+    REDIS_URL = os.environ.get('REDIS_URL', '')
+    PRESENCE_TTL_SECONDS = int(os.environ.get('PRESENCE_TTL_SECONDS', 90))  # Drop sockets of dead workers after this
+    
+    # Socket.IO throttling (app/sockets/__init__.py)
+    SOCKET_EVENT_RATE = float(os.environ.get('SOCKET_EVENT_RATE', 10))  # Events per second per connection
+    SOCKET_EVENT_BURST = int(os.environ.get('SOCKET_EVENT_BURST', 20))
+    TYPING_REFRESH_SECONDS = 3  # Relay a continuing is_typing=true at most this often
+    TYPING_TIMEOUT_SECONDS = 6  # Receivers drop the indicator after this without a refresh
+    
+    # Write-behind socket chat messages (app/utils/message_buffer.py); off by default
+    CHAT_WRITE_BEHIND = os.environ.get('CHAT_WRITE_BEHIND', 'false').lower() == 'true'
+    CHAT_JOURNAL_DIR = os.environ.get('CHAT_JOURNAL_DIR', '')  # Default: <instance>/chat_journal
+    CHAT_FLUSH_INTERVAL = float(os.environ.get('CHAT_FLUSH_INTERVAL', 0.2))
+    CHAT_FLUSH_BATCH = int(os.environ.get('CHAT_FLUSH_BATCH', 200))
+    # Delta sync tokens (?since=) stay this far behind now, so changes
+    # committed late by slow transactions are still picked up (app/resources/chat.py)
+    CHAT_SYNC_LAG_SECONDS = float(os.environ.get('CHAT_SYNC_LAG_SECONDS', 5))
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -70,6 +117,7 @@ class DevelopmentConfig(Config):
 class ProductionConfig(Config):
     DEBUG = False
     BCRYPT_LOG_ROUNDS = 13
+    TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 1))  # Render's / Heroku's router
     
     # Production CORS settings - Allow all Vercel domains
     cors_origins = os.environ.get('CORS_ORIGINS', '*')
@@ -82,4 +130,6 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=15)
-    SQLALCHEMY_ENGINE_OPTIONS = {}
\ No newline at end of file
+    EMAIL_OUTBOX_WORKER = False
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    BCRYPT_LOG_ROUNDS = 4  # Fastest bcrypt allows
\ No newline at end of file
@@ -1,13 +1,19 @@
-from .base import BaseModel
+from .base import BaseModel, db
 from .user import User, UserRole
 from .property import Property, PropertyStatus, PropertyType
 from .payment import Payment, PaymentStatus, PaymentMethod
 from .chat import Conversation, Message
+from .stats import LandlordMonthlyStats
+from .outbox import EmailOutbox
+from .refresh_token import RefreshToken
 
 __all__ = [
-    'BaseModel',
+    'BaseModel', 'db',
     'User', 'UserRole',
     'Property', 'PropertyStatus', 'PropertyType', 
     'Payment', 'PaymentStatus', 'PaymentMethod',
-    'Conversation', 'Message'
+    'Conversation', 'Message',
+    'LandlordMonthlyStats',
+    'EmailOutbox',
+    'RefreshToken'
 ]
\ No newline at end of file
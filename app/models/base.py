@@ -1,11 +1,110 @@
-from flask_sqlalchemy import SQLAlchemy
+from app import db
+from sqlalchemy.orm import load_only, selectinload
 from datetime import datetime
 
-db = SQLAlchemy()
+
+# Value converters used by SERIALIZED_FIELDS declarations
+def isoformat(value):
+    return value.isoformat() if value else None
+
+def to_float(value):
+    return float(value) if value else None
+
+def enum_value(value):
+    return value.value if value else None
+
+# values_callable for ENUM columns: store the lowercase values the
+# migrations create the Postgres types with, not the member names
+def enum_values(enum_class):
+    return [member.value for member in enum_class]
 
 class BaseModel(db.Model):
     __abstract__ = True
-    
+
     id = db.Column(db.Integer, primary_key=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Declarative serialization (used by to_dict / load_options below):
+    # - SERIALIZED_FIELDS: response key -> (model attribute, converter or None)
+    # - SERIALIZED_RELATIONS: relationships that can be embedded via expand
+    # - DEFAULT_DEPTH: how many levels of relations to embed by default
+    SERIALIZED_FIELDS = {}
+    SERIALIZED_RELATIONS = ()
+    DEFAULT_DEPTH = 0
+
+    @classmethod
+    def related_model(cls, relation):
+        """Return the mapped class at the other end of a relationship"""
+        return getattr(cls, relation).property.mapper.class_
+
+    @classmethod
+    def expand_for_depth(cls, depth=None):
+        """Build the expand tree that embeds every relation up to depth levels
+        e.g. Payment.expand_for_depth(2) ->
+        {'property': {'landlord': {}, 'tenant': {}}, 'tenant': {}}
+        """
+        depth = cls.DEFAULT_DEPTH if depth is None else depth
+        if depth < 1:
+            return {}
+        return {
+            relation: cls.related_model(relation).expand_for_depth(depth - 1)
+            for relation in cls.SERIALIZED_RELATIONS
+        }
+
+    @classmethod
+    def selected_expand(cls, depth=None, fields=None, expand=None):
+        """Relations to embed: expand (default: every relation up to depth levels),
+        keeping only the relations listed in fields when fields is given
+        """
+        if expand is None:
+            expand = cls.expand_for_depth(depth)
+        if fields is not None:
+            expand = {relation: nested for relation, nested in expand.items() if relation in fields}
+        return expand
+
+    @classmethod
+    def load_options(cls, depth=None, fields=None, expand=None, strategy=selectinload):
+        """Query options matching to_dict(depth, fields, expand)
+        Use with query.options(*Model.load_options(...)) so serializing a list
+        costs a fixed number of queries and only reads the requested columns.
+        strategy=joinedload folds relations into the main statement, which
+        suits small bounded results (e.g. LIMIT 5) better than extra SELECTs
+        """
+        expand = cls.selected_expand(depth, fields, expand)
+
+        options = []
+        if fields is not None:
+            columns = {'id', 'created_at'}  # Needed for identity and keyset pagination
+            for key in fields:
+                attr = cls.SERIALIZED_FIELDS.get(key, (None, None))[0]
+                if attr in cls.__mapper__.column_attrs:
+                    columns.add(attr)
+            for relation in expand:
+                # Foreign keys must stay loaded or selectinload falls back to per-row loads
+                columns.update(col.key for col in getattr(cls, relation).property.local_columns)
+            options.append(load_only(*[getattr(cls, name) for name in sorted(columns)]))
+
+        for relation, nested in expand.items():
+            target = cls.related_model(relation)
+            loader = strategy(getattr(cls, relation))
+            options.append(loader.options(*target.load_options(expand=nested, strategy=strategy)))
+        return options
+
+    def to_dict(self, depth=None, fields=None, expand=None):
+        """Serialize model to dictionary for API responses
+        fields limits the top-level keys, relations included; expand selects
+        embedded relations (defaults to every relation up to DEFAULT_DEPTH levels)
+        """
+        expand = self.selected_expand(depth, fields, expand)
+
+        data = {}
+        for key, (attr, convert) in self.SERIALIZED_FIELDS.items():
+            if fields is None or key in fields:
+                value = getattr(self, attr)
+                data[key] = convert(value) if convert else value
+
+        for relation, nested in expand.items():
+            related = getattr(self, relation)
+            data[relation] = related.to_dict(expand=nested) if related else None
+        return data
@@ -10,6 +10,18 @@
 # - property_id: Related property (optional)
 # - last_message: Preview of last message
 # - last_message_at: Timestamp of last message
+# - message_count: Messages in the conversation (maintained counter)
+# - initiator_unread_count / participant_unread_count: Messages each side
+#   has not read yet (maintained counters)
+#
+# COUNTERS:
+# - add_message() bumps message_count and the recipient's unread counter
+# - mark_read() flips a reader's unread messages in one UPDATE and lowers
+#   their unread counter by the number of rows it changed
+# Both use SQL expressions (col = col + n) so concurrent writers don't lose
+# updates, and neither commits, so counters change in the same transaction
+# as the messages themselves. The inbox list reads them without touching
+# chat_messages.
 #
 # MESSAGE FIELDS:
 # - id: Primary key
@@ -31,17 +43,26 @@
 # - Emit 'send_message' event
 # ============================================================================
 
-from app.models.base import BaseModel
+from app.models.base import BaseModel, isoformat
 from app import db
 from datetime import datetime
+from sqlalchemy import update
 
 class Conversation(BaseModel):
     """Conversation model for chat threads between users"""
     __tablename__ = 'chat_conversations'
+    __table_args__ = (
+        # Match migration 004: inbox lists filter on either side, newest first
+        db.Index('ix_chat_conversations_initiator_id_last_message_at', 'initiator_id', 'last_message_at'),
+        db.Index('ix_chat_conversations_participant_id_last_message_at', 'participant_id', 'last_message_at'),
+    )
 
     title = db.Column(db.String(200))
     last_message = db.Column(db.Text)
     last_message_at = db.Column(db.DateTime)
+    message_count = db.Column(db.Integer, default=0, nullable=False)
+    initiator_unread_count = db.Column(db.Integer, default=0, nullable=False)
+    participant_unread_count = db.Column(db.Integer, default=0, nullable=False)
 
     initiator_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     participant_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -52,38 +73,97 @@ class Conversation(BaseModel):
     property = db.relationship('Property', back_populates='conversations')
     messages = db.relationship('Message', back_populates='conversation', cascade='all, delete-orphan', order_by='Message.created_at')
 
-    def to_dict(self):
-        """Serialize conversation to dictionary for API responses
-        Returns conversation with participant details and message preview
-        """
-        return {
-            'id': self.id,
-            'title': self.title,
-            'last_message': self.last_message,
-            'last_message_at': self.last_message_at.isoformat() if self.last_message_at else None,
-            'initiator_id': self.initiator_id,  # sender_id
-            'participant_id': self.participant_id,  # receiver_id
-            'property_id': self.property_id,
-            'initiator': self.initiator.to_dict() if self.initiator else None,
-            'participant': self.participant.to_dict() if self.participant else None,
-            'property': self.property.to_dict() if self.property else None,
-            'message_count': len(self.messages),
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
-
-    def update_last_message(self, message_content):
-        """Update conversation preview with latest message"""
-        self.last_message = message_content
+    # Serialization spec (see BaseModel.to_dict)
+    # Returns conversation with participant details and message preview
+    SERIALIZED_FIELDS = {
+        'id': ('id', None),
+        'title': ('title', None),
+        'last_message': ('last_message', None),
+        'last_message_at': ('last_message_at', isoformat),
+        'initiator_id': ('initiator_id', None),  # sender_id
+        'participant_id': ('participant_id', None),  # receiver_id
+        'property_id': ('property_id', None),
+        'message_count': ('message_count', None),
+        'initiator_unread_count': ('initiator_unread_count', None),
+        'participant_unread_count': ('participant_unread_count', None),
+        'created_at': ('created_at', isoformat)
+    }
+    SERIALIZED_RELATIONS = ('initiator', 'participant', 'property')
+    DEFAULT_DEPTH = 2
+
+    def other_user_id(self, user_id):
+        """The participant on the other side from user_id"""
+        return self.participant_id if self.initiator_id == user_id else self.initiator_id
+
+    def _unread_column(self, user_id):
+        return 'initiator_unread_count' if self.initiator_id == user_id else 'participant_unread_count'
+
+    def unread_count_for(self, user_id):
+        """Messages user_id has not read yet"""
+        return getattr(self, self._unread_column(user_id)) or 0
+
+    def add_message(self, sender_id, content):
+        """Create a message and update counters and preview (does not commit)"""
+        message = Message(content=content, conversation_id=self.id, sender_id=sender_id)
+        db.session.add(message)
+
+        recipient_column = self._unread_column(self.other_user_id(sender_id))
+        self.message_count = Conversation.message_count + 1
+        setattr(self, recipient_column, getattr(Conversation, recipient_column) + 1)
+        self.last_message = content
         self.last_message_at = datetime.utcnow()
-        db.session.commit()
+        return message
+
+    def mark_read(self, user_id, up_to_id=None):
+        """Mark messages sent to user_id as read in a single UPDATE (does not commit)
+        Only unread rows match, so repeating the call is a no-op.
+
+        Args:
+            user_id: Reader
+            up_to_id: Watermark; only mark messages with id <= up_to_id
+                      (default: everything)
+
+        Returns:
+            List of message ids that changed to read
+        """
+        now = datetime.utcnow()
+        statement = update(Message).where(
+            Message.conversation_id == self.id,
+            Message.sender_id != user_id,
+            Message.is_read == False
+        )
+        if up_to_id is not None:
+            statement = statement.where(Message.id <= up_to_id)
+        # updated_at is set explicitly: bulk UPDATEs skip onupdate hooks and ?since= sync relies on it
+        read_ids = db.session.execute(
+            statement.values(is_read=True, read_at=now, updated_at=now).returning(Message.id)
+        ).scalars().all()
+        self.mark_read_by(user_id, len(read_ids))
+        return read_ids
+
+    def mark_read_by(self, user_id, count):
+        """Lower user_id's unread counter after count messages were read (does not commit)"""
+        if count:
+            column = self._unread_column(user_id)
+            setattr(self, column, getattr(Conversation, column) - count)
 
 class Message(BaseModel):
     """Message model for individual chat messages"""
     __tablename__ = 'chat_messages'
+    __table_args__ = (
+        # Match migrations 004/007: keyset history windows and delta sync,
+        # partial index over unread rows only
+        db.Index('ix_chat_messages_conversation_id_created_at', 'conversation_id', 'created_at', 'id'),
+        db.Index('ix_chat_messages_conversation_id_updated_at', 'conversation_id', 'updated_at', 'id'),
+        db.Index('ix_chat_messages_unread', 'conversation_id', 'sender_id',
+                 postgresql_where=db.text('is_read = false'),
+                 sqlite_where=db.text('is_read = 0')),
+    )
 
     content = db.Column(db.Text, nullable=False)
     is_read = db.Column(db.Boolean, default=False)
     read_at = db.Column(db.DateTime)
+    client_uid = db.Column(db.String(32), unique=True)  # Write-behind idempotency key (app/utils/message_buffer.py)
 
     conversation_id = db.Column(db.Integer, db.ForeignKey('chat_conversations.id'), nullable=False)
     sender_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -91,21 +171,21 @@ class Message(BaseModel):
     conversation = db.relationship('Conversation', back_populates='messages')
     sender = db.relationship('User', back_populates='messages')
 
-    def to_dict(self):
-        """Serialize message to dictionary for API responses
-        Returns message with sender details and timestamp
-        """
-        return {
-            'id': self.id,
-            'content': self.content,
-            'is_read': self.is_read,
-            'read_at': self.read_at.isoformat() if self.read_at else None,
-            'conversation_id': self.conversation_id,
-            'sender_id': self.sender_id,
-            'sender': self.sender.to_dict() if self.sender else None,
-            'timestamp': self.created_at.isoformat() if self.created_at else None,  # Frontend expects 'timestamp'
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+    # Serialization spec (see BaseModel.to_dict)
+    # Returns message with sender details and timestamp
+    SERIALIZED_FIELDS = {
+        'id': ('id', None),
+        'content': ('content', None),
+        'is_read': ('is_read', None),
+        'read_at': ('read_at', isoformat),
+        'conversation_id': ('conversation_id', None),
+        'sender_id': ('sender_id', None),
+        'client_uid': ('client_uid', None),
+        'timestamp': ('created_at', isoformat),  # Frontend expects 'timestamp'
+        'created_at': ('created_at', isoformat)
+    }
+    SERIALIZED_RELATIONS = ('sender',)
+    DEFAULT_DEPTH = 1
 
     def mark_as_read(self):
         """Mark message as read and update read timestamp"""
@@ -0,0 +1,67 @@
+# ============================================================================
+# EMAIL OUTBOX - Transactional Email Queue
+# ============================================================================
+# Emails are written here in the same transaction as the change that
+# triggers them (e.g. a payment completing) and sent later by the outbox
+# worker (app/utils/email_outbox.py), so request handlers never wait on the
+# mail provider and an email is queued if and only if the change commits.
+#
+# STATUS FLOW:
+# pending -> sent
+# pending -> pending (attempts + 1, next_attempt_at pushed back) -> ... -> failed
+#
+# A worker leases the emails it claims by pushing next_attempt_at
+# LEASE_SECONDS ahead, so if it dies mid-batch they are sent again later.
+# ============================================================================
+
+from .base import BaseModel, db
+from datetime import datetime, timedelta
+
+class EmailOutbox(BaseModel):
+    """Queued outgoing email"""
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        # Worker polls due pending rows in id order
+        db.Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+    to_email = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    html_content = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending/sent/failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_error = db.Column(db.Text)
+    sent_at = db.Column(db.DateTime)
+
+    MAX_ATTEMPTS = 6
+    BACKOFF_SECONDS = 30  # Doubles each attempt: 30s, 1m, 2m, 4m, 8m
+    LEASE_SECONDS = 600  # A claimed email is retried after this if its worker dies mid-batch
+
+    @classmethod
+    def enqueue(cls, to_email, subject, html_content):
+        """Queue an email in the current transaction (does not commit)"""
+        email = cls(to_email=to_email, subject=subject, html_content=html_content,
+                    status='pending', attempts=0, next_attempt_at=datetime.utcnow())
+        db.session.add(email)
+        return email
+
+    def lease(self, seconds):
+        """Hide this email from other workers while it is being sent"""
+        self.next_attempt_at = datetime.utcnow() + timedelta(seconds=seconds)
+
+    def mark_sent(self):
+        self.status = 'sent'
+        self.attempts += 1
+        self.sent_at = datetime.utcnow()
+        self.last_error = None
+
+    def mark_failed(self, error):
+        """Record a failed attempt and schedule a retry with exponential backoff"""
+        self.attempts += 1
+        self.last_error = error
+        if self.attempts >= self.MAX_ATTEMPTS:
+            self.status = 'failed'
+        else:
+            delay = self.BACKOFF_SECONDS * 2 ** (self.attempts - 1)
+            self.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
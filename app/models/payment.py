@@ -33,7 +33,7 @@
 # 5. Payment status updated to 'completed' or 'failed'
 # ============================================================================
 
-from .base import BaseModel, db
+from .base import BaseModel, db, isoformat, to_float, enum_value, enum_values
 from sqlalchemy.dialects.postgresql import ENUM
 import enum
 
@@ -54,13 +54,18 @@ class PaymentMethod(enum.Enum):
 class Payment(BaseModel):
     """Payment model for rent payment tracking"""
     __tablename__ = 'payments'
+    __table_args__ = (
+        # Match migration 004: tenant history and landlord lists via property
+        db.Index('ix_payments_tenant_id_status', 'tenant_id', 'status'),
+        db.Index('ix_payments_property_id_created_at', 'property_id', 'created_at'),
+    )
     
     amount = db.Column(db.Numeric(10, 2), nullable=False)
     payment_date = db.Column(db.DateTime, nullable=False)
-    payment_method = db.Column(ENUM(PaymentMethod), default=PaymentMethod.MPESA)
-    status = db.Column(ENUM(PaymentStatus), default=PaymentStatus.PENDING)
+    payment_method = db.Column(ENUM(PaymentMethod, values_callable=enum_values), default=PaymentMethod.MPESA)
+    status = db.Column(ENUM(PaymentStatus, values_callable=enum_values), default=PaymentStatus.PENDING)
     reference = db.Column(db.String(100), unique=True)
-    mpesa_checkout_id = db.Column(db.String(100))
+    mpesa_checkout_id = db.Column(db.String(100), unique=True, index=True)  # One payment per STK push
     phone_number = db.Column(db.String(20))
     
     property_id = db.Column(db.Integer, db.ForeignKey('properties.id'), nullable=False)
@@ -69,22 +74,23 @@ class Payment(BaseModel):
     property = db.relationship('Property', backref='payments')
     tenant = db.relationship('User', backref='payments')
     
-    def to_dict(self):
-        """Serialize payment to dictionary for API responses
-        Returns payment with property and tenant details
-        """
-        return {
-            'id': self.id,
-            'amount': float(self.amount) if self.amount else None,
-            'due_date': self.payment_date.isoformat() if self.payment_date else None,  # Frontend expects 'due_date'
-            'payment_date': self.payment_date.isoformat() if self.payment_date else None,
-            'payment_method': self.payment_method.value if self.payment_method else None,
-            'status': self.status.value if self.status else None,  # 'pending', 'completed', 'failed'
-            'reference': self.reference,
-            'phone_number': self.phone_number,
-            'property_id': self.property_id,
-            'tenant_id': self.tenant_id,
-            'property': self.property.to_dict() if self.property else None,  # Full property details
-            'tenant': self.tenant.to_dict() if self.tenant else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
\ No newline at end of file
+    # Serialization spec (see BaseModel.to_dict)
+    # depth 0: payment columns only
+    # depth 1: + property and tenant
+    # depth 2: + property's landlord and tenant (default)
+    SERIALIZED_FIELDS = {
+        'id': ('id', None),
+        'amount': ('amount', to_float),
+        'due_date': ('payment_date', isoformat),  # Frontend expects 'due_date'
+        'payment_date': ('payment_date', isoformat),
+        'payment_method': ('payment_method', enum_value),
+        'status': ('status', enum_value),  # 'pending', 'completed', 'failed'
+        'reference': ('reference', None),
+        'mpesa_checkout_id': ('mpesa_checkout_id', None),  # Set once the STK push is sent
+        'phone_number': ('phone_number', None),
+        'property_id': ('property_id', None),
+        'tenant_id': ('tenant_id', None),
+        'created_at': ('created_at', isoformat)
+    }
+    SERIALIZED_RELATIONS = ('property', 'tenant')
+    DEFAULT_DEPTH = 2
@@ -37,7 +37,7 @@
 # db.session.commit()
 # ============================================================================
 
-from .base import BaseModel, db
+from .base import BaseModel, db, isoformat, to_float, enum_value, enum_values
 from sqlalchemy.dialects.postgresql import ENUM
 import enum
 
@@ -58,6 +58,12 @@ class PropertyType(enum.Enum):
 class Property(BaseModel):
     """Property model for rental listings"""
     __tablename__ = 'properties'
+    __table_args__ = (
+        # Match migration 004: role-filtered lists and dashboard counts
+        db.Index('ix_properties_landlord_id_created_at', 'landlord_id', 'created_at', 'id'),
+        db.Index('ix_properties_tenant_id_created_at', 'tenant_id', 'created_at', 'id'),
+        db.Index('ix_properties_landlord_id_status', 'landlord_id', 'status'),
+    )
 
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
@@ -65,8 +71,8 @@ class Property(BaseModel):
     city = db.Column(db.String(100), nullable=False)
     state = db.Column(db.String(50), nullable=False)
     zip_code = db.Column(db.String(20), nullable=False)
-    property_type = db.Column(ENUM(PropertyType), nullable=False)
-    status = db.Column(ENUM(PropertyStatus), default=PropertyStatus.AVAILABLE)
+    property_type = db.Column(ENUM(PropertyType, values_callable=enum_values), nullable=False)
+    status = db.Column(ENUM(PropertyStatus, values_callable=enum_values), default=PropertyStatus.AVAILABLE)
 
     monthly_rent = db.Column(db.Numeric(10, 2), nullable=False)
     security_deposit = db.Column(db.Numeric(10, 2), default=0)
@@ -86,32 +92,30 @@ class Property(BaseModel):
     tenant = db.relationship('User', foreign_keys=[tenant_id], backref='tenant_properties')
     conversations = db.relationship('Conversation', back_populates='property')
 
-    def to_dict(self):
-        """Serialize property to dictionary for API responses
-        Returns all property details including landlord and tenant info
-        """
-        return {
-            'id': self.id,
-            'title': self.title,
-            'description': self.description,
-            'address': self.address,
-            'city': self.city,
-            'state': self.state,
-            'zip_code': self.zip_code,
-            'property_type': self.property_type.value if self.property_type else None,
-            'status': self.status.value if self.status else None,  # 'occupied' or 'vacant'
-            'monthly_rent': float(self.monthly_rent) if self.monthly_rent else None,
-            'security_deposit': float(self.security_deposit) if self.security_deposit else None,
-            'bedrooms': self.bedrooms,
-            'bathrooms': float(self.bathrooms) if self.bathrooms else None,
-            'square_feet': self.square_feet,
-            'amenities': self.amenities,
-            'images': self.images or [],
-            'landlord_id': self.landlord_id,  # Property owner
-            'tenant_id': self.tenant_id,      # Current tenant (null if vacant)
-            'landlord': self.landlord.to_dict() if self.landlord else None,
-            'tenant': self.tenant.to_dict() if self.tenant else None,
-            'lease_start': self.lease_start.isoformat() if self.lease_start else None,
-            'lease_end': self.lease_end.isoformat() if self.lease_end else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
\ No newline at end of file
+    # Serialization spec (see BaseModel.to_dict)
+    # Returns all property details; landlord and tenant are embedded by default
+    SERIALIZED_FIELDS = {
+        'id': ('id', None),
+        'title': ('title', None),
+        'description': ('description', None),
+        'address': ('address', None),
+        'city': ('city', None),
+        'state': ('state', None),
+        'zip_code': ('zip_code', None),
+        'property_type': ('property_type', enum_value),
+        'status': ('status', enum_value),  # 'occupied' or 'vacant'
+        'monthly_rent': ('monthly_rent', to_float),
+        'security_deposit': ('security_deposit', to_float),
+        'bedrooms': ('bedrooms', None),
+        'bathrooms': ('bathrooms', to_float),
+        'square_feet': ('square_feet', None),
+        'amenities': ('amenities', None),
+        'images': ('images', lambda images: images or []),
+        'landlord_id': ('landlord_id', None),  # Property owner
+        'tenant_id': ('tenant_id', None),      # Current tenant (null if vacant)
+        'lease_start': ('lease_start', isoformat),
+        'lease_end': ('lease_end', isoformat),
+        'created_at': ('created_at', isoformat)
+    }
+    SERIALIZED_RELATIONS = ('landlord', 'tenant')
+    DEFAULT_DEPTH = 1
@@ -0,0 +1,91 @@
+# ============================================================================
+# REFRESH TOKEN MODEL - Long-lived Sessions Behind Short-lived Access Tokens
+# ============================================================================
+# Access tokens live for minutes and are checked purely cryptographically;
+# a refresh token (POST /api/auth/refresh) trades for a new access token.
+#
+# STORAGE:
+# Only the SHA-256 of each refresh token is stored. Tokens are 256-bit
+# random strings, so a fast hash is enough and a database leak reveals no
+# usable tokens.
+#
+# ROTATION AND REUSE DETECTION:
+# - Every refresh marks the presented token used and issues a new one in
+#   the same family (one family per login)
+# - Presenting a used token again means it was copied: the whole family is
+#   revoked, so the thief and the victim both have to sign in again
+# - Logout (revoke_tokens) revokes every family of the user
+# ============================================================================
+
+from .base import BaseModel, db
+from datetime import datetime
+from sqlalchemy import update
+import hashlib
+import secrets
+import uuid
+
+class RefreshToken(BaseModel):
+    """Hashed refresh token, one row per rotation"""
+    __tablename__ = 'refresh_tokens'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    family_id = db.Column(db.String(32), nullable=False, index=True)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    used_at = db.Column(db.DateTime)  # Set when rotated
+    revoked_at = db.Column(db.DateTime)
+
+    user = db.relationship('User')
+
+    @staticmethod
+    def hash_token(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def issue(cls, user_id, lifetime, family_id=None):
+        """Create a token (does not commit)
+
+        Returns:
+            (RefreshToken, plain token to hand to the client once)
+        """
+        token = secrets.token_urlsafe(32)
+        record = cls(user_id=user_id, family_id=family_id or uuid.uuid4().hex,
+                     token_hash=cls.hash_token(token), expires_at=datetime.utcnow() + lifetime)
+        db.session.add(record)
+        return record, token
+
+    @classmethod
+    def find(cls, token):
+        return cls.query.filter_by(token_hash=cls.hash_token(token)).first()
+
+    def is_active(self):
+        return self.revoked_at is None and datetime.utcnow() < self.expires_at
+
+    def claim(self):
+        """Mark this token used; False if it already was (a replay)
+        A single conditional UPDATE, so two concurrent refreshes can't both win
+        """
+        claimed = db.session.execute(
+            update(RefreshToken).where(
+                RefreshToken.id == self.id,
+                RefreshToken.used_at.is_(None),
+                RefreshToken.revoked_at.is_(None)
+            ).values(used_at=datetime.utcnow())
+        ).rowcount
+        return claimed == 1
+
+    @classmethod
+    def revoke_family(cls, family_id):
+        """Revoke every token of a login session (does not commit)"""
+        db.session.execute(
+            update(cls).where(cls.family_id == family_id, cls.revoked_at.is_(None))
+            .values(revoked_at=datetime.utcnow())
+        )
+
+    @classmethod
+    def revoke_for_user(cls, user_id):
+        """Revoke all of a user's sessions (does not commit)"""
+        db.session.execute(
+            update(cls).where(cls.user_id == user_id, cls.revoked_at.is_(None))
+            .values(revoked_at=datetime.utcnow())
+        )
@@ -0,0 +1,160 @@
+# ============================================================================
+# LANDLORD MONTHLY STATS - Materialized Payment Rollup
+# ============================================================================
+# One row per (landlord, month) holding running payment totals so dashboards
+# read O(months) rows instead of scanning every payment on each page load.
+#
+# FIELDS:
+# - landlord_id: Property owner the payments belong to
+# - month: First day of the month of the payment's payment_date
+# - completed_count / completed_total: Successful payments and their sum
+# - pending_count, failed_count, cancelled_count: Payments in those states
+#
+# MAINTENANCE:
+# - record_payment(payment, old_status) is called in the same transaction
+#   as every payment create/status change (PaymentList.post, PaymentDetail.put,
+#   PaymentCallback.post), so the rollup commits or rolls back with it
+# - rebuild() recomputes rows from the payments table
+#   (run: python rebuild_stats.py)
+# ============================================================================
+
+from .base import BaseModel, db
+from .payment import Payment, PaymentStatus
+from .property import Property
+from sqlalchemy import func, case, extract
+from sqlalchemy.exc import IntegrityError
+from datetime import date
+
+class LandlordMonthlyStats(BaseModel):
+    """Per-landlord, per-month payment rollup"""
+    __tablename__ = 'landlord_monthly_stats'
+    __table_args__ = (
+        db.UniqueConstraint('landlord_id', 'month', name='uq_landlord_monthly_stats_landlord_month'),
+    )
+
+    landlord_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    month = db.Column(db.Date, nullable=False)
+    completed_count = db.Column(db.Integer, default=0, nullable=False)
+    completed_total = db.Column(db.Numeric(12, 2), default=0, nullable=False)
+    pending_count = db.Column(db.Integer, default=0, nullable=False)
+    failed_count = db.Column(db.Integer, default=0, nullable=False)
+    cancelled_count = db.Column(db.Integer, default=0, nullable=False)
+
+    # Which counter column tracks each payment status
+    STATUS_COUNTERS = {
+        PaymentStatus.COMPLETED: 'completed_count',
+        PaymentStatus.PENDING: 'pending_count',
+        PaymentStatus.FAILED: 'failed_count',
+        PaymentStatus.CANCELLED: 'cancelled_count'
+    }
+
+    @staticmethod
+    def month_of(moment):
+        """First day of the month containing moment"""
+        return date(moment.year, moment.month, 1)
+
+    @staticmethod
+    def _as_status(value):
+        if value is None or isinstance(value, PaymentStatus):
+            return value
+        return PaymentStatus(value)
+
+    @classmethod
+    def _get_or_create(cls, landlord_id, month):
+        row = cls.query.filter_by(landlord_id=landlord_id, month=month).first()
+        if row:
+            return row
+        try:
+            # Savepoint so a concurrent insert of the same row doesn't abort the caller's transaction
+            with db.session.begin_nested():
+                row = cls(landlord_id=landlord_id, month=month, completed_count=0, completed_total=0,
+                          pending_count=0, failed_count=0, cancelled_count=0)
+                db.session.add(row)
+        except IntegrityError:
+            row = cls.query.filter_by(landlord_id=landlord_id, month=month).first()
+        return row
+
+    @classmethod
+    def record_payment(cls, payment, old_status=None):
+        """Apply a payment create or status change to the rollup
+        Counters are updated with SQL expressions (col = col + 1) so concurrent
+        transactions touching the same row don't lose increments.
+        Does not commit; call before the payment change is committed.
+
+        Args:
+            payment: Payment whose status was just set (new or changed)
+            old_status: Status before the change, or None for a new payment
+        """
+        old_status = cls._as_status(old_status)
+        new_status = cls._as_status(payment.status)
+        if old_status == new_status:
+            return
+
+        landlord_id = payment.property.landlord_id
+        row = cls._get_or_create(landlord_id, cls.month_of(payment.payment_date))
+        amount = payment.amount or 0
+
+        if old_status in cls.STATUS_COUNTERS:
+            column = cls.STATUS_COUNTERS[old_status]
+            setattr(row, column, getattr(cls, column) - 1)
+            if old_status == PaymentStatus.COMPLETED:
+                row.completed_total = cls.completed_total - amount
+        if new_status in cls.STATUS_COUNTERS:
+            column = cls.STATUS_COUNTERS[new_status]
+            setattr(row, column, getattr(cls, column) + 1)
+            if new_status == PaymentStatus.COMPLETED:
+                row.completed_total = cls.completed_total + amount
+
+    @classmethod
+    def rebuild(cls, landlord_id=None):
+        """Recompute rollup rows from the payments table
+        Use after bulk imports or to repair drift; commits when done.
+
+        Args:
+            landlord_id: Only rebuild this landlord's rows (default: everyone)
+
+        Returns:
+            Number of rollup rows written
+        """
+        year = extract('year', Payment.payment_date)
+        month = extract('month', Payment.payment_date)
+
+        def count_status(status):
+            return func.coalesce(func.sum(case((Payment.status == status, 1), else_=0)), 0)
+
+        query = db.session.query(
+            Property.landlord_id, year, month,
+            count_status(PaymentStatus.COMPLETED),
+            func.coalesce(func.sum(case((Payment.status == PaymentStatus.COMPLETED, Payment.amount), else_=0)), 0),
+            count_status(PaymentStatus.PENDING),
+            count_status(PaymentStatus.FAILED),
+            count_status(PaymentStatus.CANCELLED)
+        ).join(Property, Payment.property_id == Property.id).group_by(Property.landlord_id, year, month)
+
+        existing = cls.query
+        if landlord_id is not None:
+            query = query.filter(Property.landlord_id == landlord_id)
+            existing = existing.filter_by(landlord_id=landlord_id)
+
+        rows = [
+            cls(landlord_id=owner, month=date(int(y), int(m), 1), completed_count=completed,
+                completed_total=completed_total, pending_count=pending, failed_count=failed,
+                cancelled_count=cancelled)
+            for owner, y, m, completed, completed_total, pending, failed, cancelled in query.all()
+        ]
+
+        existing.delete(synchronize_session=False)
+        db.session.add_all(rows)
+        db.session.commit()
+        return len(rows)
+
+    def to_dict(self):
+        return {
+            'landlord_id': self.landlord_id,
+            'month': self.month.isoformat(),
+            'completed_count': self.completed_count,
+            'completed_total': float(self.completed_total or 0),
+            'pending_count': self.pending_count,
+            'failed_count': self.failed_count,
+            'cancelled_count': self.cancelled_count
+        }
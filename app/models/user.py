@@ -6,9 +6,11 @@
 # USER FIELDS:
 # - id: Primary key (auto-generated)
 # - email: Unique email for login
-# - password_hash: Bcrypt hashed password
+# - password_hash: Bcrypt hashed password (see app/utils/passwords.py)
 # - first_name: User's first name
 # - profile: One-to-one relationship with Profile (contains role)
+# - token_version: Embedded in access tokens; bumping it revokes them all
+#   (see app/utils/auth.py)
 #
 # PROFILE FIELDS:
 # - id: Primary key
@@ -33,7 +35,8 @@
 # ============================================================================
 
 from .base import BaseModel, db
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.orm import selectinload
+from app.utils.passwords import get_password_hasher
 import enum
 
 class UserRole(enum.Enum):
@@ -64,6 +67,7 @@ class User(BaseModel):
     last_name = db.Column(db.String(50))
     phone = db.Column(db.String(20))
     is_active = db.Column(db.Boolean, default=True)
+    token_version = db.Column(db.Integer, default=0, nullable=False)  # Bumped to revoke issued tokens
     profile_image = db.Column(db.String(255))
     
     # Profile relationship
@@ -78,21 +82,36 @@ class User(BaseModel):
     def role(self):
         return self.profile.role if self.profile else 'tenant'
     
+    @role.setter
+    def role(self, value):
+        """Set the role on the profile, creating it if needed (User(role='landlord'))"""
+        if self.profile is None:
+            self.profile = Profile(role=value)
+        else:
+            self.profile.role = value
+    
     def set_password(self, password):
-        """Hash and store password securely using bcrypt"""
-        self.password_hash = generate_password_hash(password)
+        """Hash and store password securely using bcrypt (on the hashing pool)"""
+        self.password_hash = get_password_hasher().hash(password)
     
     def check_password(self, password):
         """Verify password against stored hash for login"""
-        return check_password_hash(self.password_hash, password)
+        return get_password_hasher().verify(self.password_hash, password)
     
-    def to_dict(self):
-        """Serialize user to dictionary for API responses
-        Returns user with profile.role format expected by frontend
-        """
-        return {
-            'id': self.id,
-            'email': self.email,
-            'first_name': self.first_name,
-            'profile': self.profile.to_dict() if self.profile else {'id': None, 'role': 'tenant'}
-        }
\ No newline at end of file
+    def password_needs_rehash(self):
+        """Whether the stored hash predates the current algorithm or rounds"""
+        return get_password_hasher().needs_rehash(self.password_hash)
+    
+    # Serialization spec (see BaseModel.to_dict)
+    # Returns user with profile.role format expected by frontend
+    SERIALIZED_FIELDS = {
+        'id': ('id', None),
+        'email': ('email', None),
+        'first_name': ('first_name', None),
+        'profile': ('profile', lambda profile: profile.to_dict() if profile else {'id': None, 'role': 'tenant'})
+    }
+
+    @classmethod
+    def load_options(cls, depth=None, fields=None, expand=None, strategy=selectinload):
+        """Query options matching to_dict, always eager-loading the profile"""
+        return super().load_options(depth, fields, expand, strategy) + [strategy(cls.profile)]
@@ -6,6 +6,8 @@
 # ENDPOINTS:
 # POST /api/auth/register - Register new user
 # POST /api/auth/login - Login and get JWT token
+# POST /api/auth/refresh - Trade a refresh token for a new access + refresh token
+# POST /api/auth/logout - Sign out everywhere: revokes every token issued to the user
 # GET /api/auth/profile - Get current user profile (requires JWT)
 # PUT /api/auth/profile - Update user profile (requires JWT)
 #
@@ -24,9 +26,20 @@
 #   "password": "secure_password"
 # }
 #
+# Logins are throttled per client IP and per email; over the limit the
+# response is 429 with a Retry-After header (see app/utils/rate_limit.py)
+#
+# REFRESH REQUEST:
+# {
+#   "refresh_token": "q3X9..."  // From login/register or the previous refresh
+# }
+# Each refresh token works once; store the new one from the response.
+# Reusing an old one signs that session out (see app/models/refresh_token.py)
+#
 # RESPONSE:
 # {
-#   "token": "eyJ0eXAiOiJKV1QiLCJhbGc...",
+#   "token": "eyJ0eXAiOiJKV1QiLCJhbGc...",  // Access token, expires in 15 minutes
+#   "refresh_token": "q3X9...",
 #   "user": {
 #     "id": 1,
 #     "email": "user@example.com",
@@ -42,9 +55,12 @@
 
 from flask_restful import Resource
 from flask import request, current_app
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, jwt_required
 from marshmallow import ValidationError
 from app.utils.errors import AuthError, create_error_response, create_success_response
+from app.utils.auth import load_current_user, issue_tokens, revoke_tokens
+from app.utils.passwords import PasswordHasherBusy
+from app.utils.rate_limit import login_retry_after, record_login_attempt
 
 class Register(Resource):
     """User registration endpoint - Creates new user account"""
@@ -85,11 +101,12 @@ class Register(Resource):
             db.session.add(user)
             db.session.commit()
             
-            # Generate JWT token (expires in 24 hours by default)
-            token = create_access_token(identity=user.id)
+            # Short-lived JWT access token (claims: role, is_active, token_version) plus refresh token
+            tokens = issue_tokens(user)
+            db.session.commit()
             
             return create_success_response({
-                'token': token,  # JWT token for authentication
+                **tokens,  # token: JWT for authentication, refresh_token: for /api/auth/refresh
                 'user': UserSchema().dump(user)  # User data with profile.role
             }, "Account created successfully", 201)
             
@@ -99,6 +116,12 @@ class Register(Resource):
                 AuthError.VALIDATION_ERROR, 
                 400
             )
+        except PasswordHasherBusy:
+            return create_error_response(
+                "The server is busy. Please try again shortly", 
+                AuthError.SERVER_BUSY, 
+                503
+            )
         except Exception as e:
             current_app.logger.error(f"Registration error: {str(e)}")
             db.session.rollback()
@@ -134,15 +157,27 @@ class Login(Resource):
                     400
                 )
             
+            # Throttle before the lookup and password hash so bursts cost no CPU
+            retry_after = login_retry_after(email, request.remote_addr)
+            if retry_after:
+                body, status = create_error_response(
+                    "Too many sign-in attempts. Please try again later", 
+                    AuthError.RATE_LIMITED, 
+                    429
+                )
+                return body, status, {'Retry-After': str(retry_after)}
+            
             # Find user
             user = User.query.filter_by(email=email).first()
             
             if not user or not user.check_password(password):
+                record_login_attempt(email, request.remote_addr, succeeded=False)
                 return create_error_response(
                     "Invalid email or password", 
                     AuthError.INVALID_CREDENTIALS, 
                     401
                 )
+            record_login_attempt(email, request.remote_addr, succeeded=True)
             
             if not user.is_active:
                 return create_error_response(
@@ -151,32 +186,135 @@ class Login(Resource):
                     403
                 )
             
-            # Generate JWT token for authenticated session
-            token = create_access_token(identity=user.id)
+            # Upgrade legacy (werkzeug) or lower-round hashes while we have the password
+            if user.password_needs_rehash():
+                user.set_password(password)
+            
+            # Short-lived access token plus a refresh token starting a new session
+            tokens = issue_tokens(user)
+            db.session.commit()
             
             return create_success_response({
-                'token': token,  # Store this token in frontend (localStorage/cookies)
+                **tokens,  # Store both in frontend; refresh the token before it expires
                 'user': UserSchema().dump(user)  # User data with profile.role
             }, "Login successful")
             
+        except PasswordHasherBusy:
+            return create_error_response(
+                "Too many sign-in attempts in progress. Please try again shortly", 
+                AuthError.SERVER_BUSY, 
+                503
+            )
         except Exception as e:
             current_app.logger.error(f"Login error: {str(e)}")
+            db.session.rollback()
             return create_error_response(
                 "Unable to sign in. Please try again later", 
                 AuthError.SERVER_ERROR, 
                 500
             )
 
+class Refresh(Resource):
+    """Token refresh endpoint - Rotates a refresh token for a new access token"""
+    def post(self):
+        try:
+            from app import db
+            from app.models import RefreshToken
+            
+            data = request.get_json(silent=True) or {}
+            refresh_token = data.get('refresh_token')
+            if not refresh_token or not isinstance(refresh_token, str):
+                return create_error_response(
+                    "Refresh token is required", 
+                    AuthError.VALIDATION_ERROR, 
+                    400
+                )
+            
+            record = RefreshToken.find(refresh_token)
+            if not record or not record.is_active():
+                return create_error_response(
+                    "Session expired. Please sign in again", 
+                    AuthError.INVALID_TOKEN, 
+                    401
+                )
+            
+            if not record.claim():
+                # Already rotated: someone replayed a copy, so end the whole session
+                RefreshToken.revoke_family(record.family_id)
+                db.session.commit()
+                current_app.logger.warning(f"Refresh token reuse for user {record.user_id}, session revoked")
+                return create_error_response(
+                    "Session expired. Please sign in again", 
+                    AuthError.INVALID_TOKEN, 
+                    401
+                )
+            
+            user = record.user
+            if not user.is_active:
+                RefreshToken.revoke_family(record.family_id)
+                db.session.commit()
+                return create_error_response(
+                    "Your account has been disabled", 
+                    AuthError.ACCOUNT_DISABLED, 
+                    403
+                )
+            
+            _, new_refresh_token = RefreshToken.issue(
+                user.id, current_app.config['REFRESH_TOKEN_EXPIRES'], family_id=record.family_id
+            )
+            db.session.commit()
+            
+            return create_success_response({
+                'token': create_access_token(identity=user),
+                'refresh_token': new_refresh_token  # The old one no longer works
+            }, "Token refreshed")
+            
+        except Exception as e:
+            current_app.logger.error(f"Token refresh error: {str(e)}")
+            from app import db
+            db.session.rollback()
+            return create_error_response(
+                "Unable to refresh session. Please sign in again", 
+                AuthError.SERVER_ERROR, 
+                500
+            )
+
+class Logout(Resource):
+    """Logout endpoint - Revokes every token issued to the current user"""
+    @jwt_required()
+    def post(self):
+        try:
+            user = load_current_user()
+            
+            if not user:
+                return create_error_response(
+                    "User not found", 
+                    AuthError.INVALID_CREDENTIALS, 
+                    404
+                )
+            
+            revoke_tokens(user)
+            
+            return create_success_response({}, "Signed out on all devices")
+            
+        except Exception as e:
+            current_app.logger.error(f"Logout error: {str(e)}")
+            from app import db
+            db.session.rollback()
+            return create_error_response(
+                "Unable to sign out. Please try again later", 
+                AuthError.SERVER_ERROR, 
+                500
+            )
+
 class Profile(Resource):
     """User profile endpoint - Get and update current user profile"""
     @jwt_required()
     def get(self):
         try:
-            from app.models import User
             from app.schemas.user import UserSchema
             
-            user_id = get_jwt_identity()
-            user = User.query.get(user_id)
+            user = load_current_user()
             
             if not user:
                 return create_error_response(
@@ -201,11 +339,9 @@ class Profile(Resource):
     def put(self):
         try:
             from app import db
-            from app.models import User
             from app.schemas.user import UserSchema
             
-            user_id = get_jwt_identity()
-            user = User.query.get(user_id)
+            user = load_current_user()
             
             if not user:
                 return create_error_response(
@@ -8,7 +8,8 @@
 # POST /api/conversations - Create new conversation
 # GET /api/conversations/<id> - Get conversation details
 # DELETE /api/conversations/<id> - Delete conversation
-# GET /api/conversations/<id>/messages - Get all messages in conversation
+# PUT /api/conversations/<id>/read - Mark messages read up to a watermark
+# GET /api/conversations/<id>/messages - Get a window of messages in conversation
 # POST /api/conversations/<id>/messages - Send new message
 #
 # CONVERSATION STRUCTURE:
@@ -18,7 +19,9 @@
 #   "participant_id": 3,    // receiver_id
 #   "property_id": 1,
 #   "last_message": "Hello",
-#   "last_message_at": "2024-01-15T10:30:00"
+#   "last_message_at": "2024-01-15T10:30:00",
+#   "message_count": 12,
+#   "unread_count": 2       // Current user's unread messages (list only)
 # }
 #
 # MESSAGE STRUCTURE:
@@ -36,6 +39,42 @@
 #   "property_id": 1      // Optional: Related property
 # }
 #
+# SPARSE FIELDSETS (GET list endpoints):
+# ?fields=id,last_message,participant&expand=participant returns only those
+# keys, embedding just the participant (see app/utils/serialization.py).
+# unread_count (the current user's side) is returned with any selection;
+# listing it in fields is allowed but not required
+#
+# READ WATERMARK REQUEST (PUT /api/conversations/<id>/read):
+# {
+#   "up_to_id": 120  // Optional: mark messages up to this id read (default: all)
+# }
+# Marks every unread message sent to the current user with id <= up_to_id in
+# a single UPDATE and returns {"conversation_id", "read_count", "unread_count"}
+#
+# MESSAGE HISTORY (GET /api/conversations/<id>/messages):
+# - (no params): newest `limit` messages (default 50, max 100)
+# - before_id=<id>: the `limit` messages before that one (scroll back)
+# - after_id=<id>: the `limit` messages after that one (catch up)
+# - since=<sync_token>: delta sync; messages created or changed (e.g. read)
+#   since the token was issued, oldest change first
+# Messages are always returned oldest first. Senders are listed once in a
+# side table keyed by id instead of being embedded in every message
+# (expand= omits it):
+# {
+#   "messages": [{"id": 7, "sender_id": 2, ...}],
+#   "senders": {"2": {"id": 2, "email": ..., ...}},
+#   "pagination": {"limit": 50, "has_more": true, "sync_token": "..."}
+# }
+# has_more: more messages beyond the window (older for the default and
+# before_id, newer for after_id and since). Store sync_token and send it
+# back as ?since= to fetch only what changed.
+# updated_at is stamped before the writing transaction commits, so a change
+# can become visible after a later one. sync_token therefore never passes
+# now - CHAT_SYNC_LAG_SECONDS: changes newer than that are sent again on the
+# next sync, and clients merge messages by id. When the token is held back
+# like this, has_more is false and the next poll picks up the rest.
+#
 # SEND MESSAGE REQUEST:
 # {
 #   "content": "Hello, is the property available?"
@@ -45,14 +84,19 @@
 # Use Socket.IO for instant message delivery (see app/sockets/__init__.py)
 # ============================================================================
 
-from flask import request
+from datetime import datetime, timedelta
+from flask import request, current_app
 from flask_restful import Resource
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from app import db
 from app.models.chat import Conversation, Message
 from app.models.user import User
 from app.models.property import Property
 from app.schemas.chat import ConversationSchema, MessageSchema, ConversationCreateSchema, MessageCreateSchema
+from app.utils.serialization import get_fieldset_params
+from app.utils.pagination import get_limit_param, keyset_window, encode_cursor, decode_cursor, InvalidCursorError
+from app.utils.auth import current_user_or_404
+from app.utils.validators import validate_id
 
 conversation_schema = ConversationSchema()
 message_schema = MessageSchema()
@@ -61,29 +105,44 @@ message_create_schema = MessageCreateSchema()
 
 class ConversationList(Resource):
     """Conversation list endpoint - Get all conversations or create new one"""
+    UNREAD_FIELDS = {'initiator_id', 'initiator_unread_count', 'participant_unread_count'}
+
     @jwt_required()  # Requires JWT token in Authorization header
     def get(self):
         """Get all conversations for current user
         Returns conversations where user is either initiator or participant
         """
-        user_id = get_jwt_identity()  # Extract user ID from JWT token
-        user = User.query.get_or_404(user_id)
+        user = current_user_or_404()  # Loaded once per request with profile
+
+        try:
+            fields, expand = get_fieldset_params(Conversation, extra_fields=('unread_count',))
+        except ValueError as err:
+            return {'error': str(err)}, 400
+
+        # unread_count_for reads these, so they load whatever fields selects
+        load_fields = fields | self.UNREAD_FIELDS if fields is not None else None
 
         # Get conversations where user is involved (as initiator or participant)
         conversations = Conversation.query.filter(
             (Conversation.initiator_id == user.id) | 
             (Conversation.participant_id == user.id)
+        ).options(
+            *Conversation.load_options(fields=load_fields, expand=expand)
         ).order_by(Conversation.last_message_at.desc()).all()  # Most recent first
 
-        return {'conversations': [conv.to_dict() for conv in conversations]}, 200
+        results = []
+        for conv in conversations:
+            conv_dict = conv.to_dict(fields=fields, expand=expand)
+            conv_dict['unread_count'] = conv.unread_count_for(user.id)  # Current user's side
+            results.append(conv_dict)
+        return {'conversations': results}, 200
 
     @jwt_required()  # Requires JWT token
     def post(self):
         """Create new conversation between two users
         Returns existing conversation if one already exists
         """
-        user_id = get_jwt_identity()
-        user = User.query.get_or_404(user_id)
+        user = current_user_or_404()
 
         data = request.get_json()
         errors = conversation_create_schema.validate(data)
@@ -116,29 +175,21 @@ class ConversationDetail(Resource):
     """Conversation detail endpoint - Get or delete specific conversation"""
     @jwt_required()
     def get(self, conversation_id):
-        user_id = get_jwt_identity()
-        user = User.query.get_or_404(user_id)
+        user = current_user_or_404()
         conversation = Conversation.query.get_or_404(conversation_id)
 
         if conversation.initiator_id != user.id and conversation.participant_id != user.id:
             return {'error': 'Access denied'}, 403
         
-        # Mark all messages as read for current user
-        unread_messages = Message.query.filter(
-            Message.conversation_id == conversation_id,
-            Message.sender_id != user.id,
-            Message.is_read == False
-        ).all()
-        
-        for message in unread_messages:
-            message.mark_as_read()
+        # Mark all messages as read for current user (one UPDATE, one commit)
+        conversation.mark_read(user.id)
+        db.session.commit()
         
         return {'conversation': conversation.to_dict()}, 200
 
     @jwt_required()
     def delete(self, conversation_id):
-        user_id = get_jwt_identity()
-        user = User.query.get_or_404(user_id)
+        user = current_user_or_404()
         conversation = Conversation.query.get_or_404(conversation_id)
         
         if conversation.initiator_id != user.id and conversation.participant_id != user.id:
@@ -148,33 +199,136 @@ class ConversationDetail(Resource):
         db.session.commit()
         
         return {'message': 'Conversation deleted successfully'}, 200
+
+class ConversationRead(Resource):
+    """Read watermark endpoint - Mark messages read up to a message id"""
+    @jwt_required()
+    def put(self, conversation_id):
+        user = current_user_or_404()
+        conversation = Conversation.query.get_or_404(conversation_id)
+
+        if conversation.initiator_id != user.id and conversation.participant_id != user.id:
+            return {'error': 'Access denied'}, 403
+
+        data = request.get_json(silent=True) or {}
+        up_to_id = data.get('up_to_id')
+        if up_to_id is not None and not validate_id(up_to_id):
+            return {'error': 'up_to_id must be a positive integer'}, 400
+
+        read_ids = conversation.mark_read(user.id, up_to_id)
+        db.session.commit()
+
+        return {
+            'conversation_id': conversation.id,
+            'read_count': len(read_ids),
+            'unread_count': conversation.unread_count_for(user.id)
+        }, 200
 class MessageList(Resource):
     """Message list endpoint - Get messages or send new message"""
+    HISTORY_LIMIT = 50
+
     @jwt_required()  # Requires JWT token
     def get(self, conversation_id):
-        """Get all messages in a conversation
-        Returns messages in chronological order (oldest first)
+        """Get a window of messages in a conversation
+        Returns messages in chronological order (oldest first), with
+        before_id/after_id paging and since= delta sync
         """
-        user_id = get_jwt_identity()
-        user = User.query.get_or_404(user_id)
+        user = current_user_or_404()
         conversation = Conversation.query.get_or_404(conversation_id)
 
         # Verify user is part of this conversation
         if conversation.initiator_id != user.id and conversation.participant_id != user.id:
             return {'error': 'Access denied'}, 403
 
-        # Get all messages in chronological order
-        messages = Message.query.filter_by(conversation_id=conversation_id).order_by(Message.created_at.asc()).all()
+        try:
+            fields, expand = get_fieldset_params(Message)
+            window = self._window_params(conversation_id)
+        except (ValueError, InvalidCursorError) as err:
+            return {'error': str(err)}, 400
+
+        # Senders go in a side table rather than being repeated per message
+        sender_expand = expand.pop('sender', None)
+        query = Message.query.filter_by(conversation_id=conversation_id).options(
+            *Message.load_options(fields=fields, expand=expand)
+        )
+
+        limit = get_limit_param(self.HISTORY_LIMIT)
+        if 'since' in window:
+            # Delta sync: ordered by last change so the token can advance
+            messages, has_more = keyset_window(query, (Message.updated_at, Message.id),
+                                               after=window['since'], limit=limit)
+            if messages:
+                position = (messages[-1].updated_at, messages[-1].id)
+                horizon = self._sync_horizon()
+                if position > horizon:
+                    position, has_more = max(horizon, window['since'], key=self._sort_key), False
+                sync_token = encode_cursor(*position)
+            else:
+                sync_token = request.args['since']
+        else:
+            messages, has_more = keyset_window(query, (Message.created_at, Message.id),
+                                               before=window.get('before'), after=window.get('after'),
+                                               limit=limit)
+            sync_token = self._sync_token(conversation_id)
+
+        response = {
+            'messages': [msg.to_dict(fields=fields, expand=expand) for msg in messages],
+            'pagination': {'limit': limit, 'has_more': has_more, 'sync_token': sync_token}
+        }
+        if sender_expand is not None:
+            sender_ids = {msg.sender_id for msg in messages}
+            senders = User.query.filter(User.id.in_(sender_ids)).options(
+                *User.load_options(expand=sender_expand)
+            ).all() if sender_ids else []
+            response['senders'] = {str(sender.id): sender.to_dict(expand=sender_expand) for sender in senders}
+        return response, 200
+
+    @staticmethod
+    def _window_params(conversation_id):
+        """Resolve before_id / after_id / since into keyset anchors"""
+        given = [name for name in ('before_id', 'after_id', 'since') if request.args.get(name)]
+        if len(given) > 1:
+            raise ValueError('Use only one of before_id, after_id and since')
+        if not given:
+            return {}
+        if given[0] == 'since':
+            return {'since': decode_cursor(request.args['since'])}
+
+        anchor_id = request.args.get(given[0], type=int)
+        anchor = db.session.query(Message.created_at, Message.id).filter_by(
+            id=anchor_id, conversation_id=conversation_id
+        ).first() if anchor_id else None
+        if anchor is None:
+            raise ValueError(f'Unknown {given[0]}')
+        return {given[0][:-3]: tuple(anchor)}
 
-        return {'messages': [msg.to_dict() for msg in messages]}, 200
+    @staticmethod
+    def _sync_horizon():
+        """Latest (updated_at, id) position every writer has surely committed by now"""
+        lag = timedelta(seconds=current_app.config.get('CHAT_SYNC_LAG_SECONDS', 5))
+        return datetime.utcnow() - lag, 0
+
+    @staticmethod
+    def _sort_key(position):
+        """Order positions with the empty conversation's (None, 0) first"""
+        return (position[0] is not None, position[0] or datetime.min, position[1])
+
+    @classmethod
+    def _sync_token(cls, conversation_id):
+        """Token for the latest settled change in the conversation (for later ?since=)"""
+        latest = db.session.query(Message.updated_at, Message.id).filter_by(
+            conversation_id=conversation_id
+        ).order_by(Message.updated_at.desc(), Message.id.desc()).first()
+        if latest is None:
+            return encode_cursor(None, 0)
+        return encode_cursor(*min(tuple(latest), cls._sync_horizon()))
 
     @jwt_required()  # Requires JWT token
     def post(self, conversation_id):
         """Send new message in conversation
         Creates message and updates conversation's last_message preview
         """
-        user_id = get_jwt_identity()
-        user = User.query.get_or_404(user_id)
+        user = current_user_or_404()
         conversation = Conversation.query.get_or_404(conversation_id)
 
         # Verify user is part of this conversation
@@ -182,20 +336,13 @@ class MessageList(Resource):
             return {'error': 'Access denied'}, 403
 
         data = request.get_json()
-        errors = message_create_schema.validate(data)
+        # The conversation comes from the URL; the body need not repeat it
+        errors = message_create_schema.validate(data, partial=('conversation_id',))
         if errors:
             return {'errors': errors}, 400
 
-        # Create new message
-        message = Message(
-            content=data['content'],
-            conversation_id=conversation_id,
-            sender_id=user.id  # Current user is sender
-        )
-
-        db.session.add(message)
-        # Update conversation preview with latest message
-        conversation.update_last_message(data['content'])
+        # Create new message; updates preview and counters in the same transaction
+        message = conversation.add_message(user.id, data['content'])
         db.session.commit()
 
         # For real-time updates, emit Socket.IO event (see app/sockets/__init__.py)
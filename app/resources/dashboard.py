@@ -1,63 +1,75 @@
 from flask_restful import Resource
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import User, Property, Payment, Conversation, db
-from sqlalchemy import func
+from flask_jwt_extended import jwt_required
+from app.models import Property, PropertyStatus, Payment, Conversation, LandlordMonthlyStats, db
+from app.utils.auth import current_user_or_404
+from sqlalchemy import func, case, or_, select
+from sqlalchemy.orm import joinedload
 from datetime import datetime, timedelta
 
+def unread_messages_subquery(user_id):
+    """Scalar subquery counting unread messages sent to user_id
+    Sums the user's side of the maintained unread counters on every
+    conversation they're in, so it never reads chat_messages
+    """
+    user_side_unread = case(
+        (Conversation.initiator_id == user_id, Conversation.initiator_unread_count),
+        else_=Conversation.participant_unread_count
+    )
+    return select(func.coalesce(func.sum(user_side_unread), 0)).where(
+        or_(Conversation.initiator_id == user_id, Conversation.participant_id == user_id)
+    ).scalar_subquery()
+
 class LandlordDashboard(Resource):
     @jwt_required()
     def get(self):
-        user_id = get_jwt_identity()
-        user = User.query.get_or_404(user_id)
+        user = current_user_or_404()
         
         if user.role != 'landlord':
             return {'error': 'Landlord access required'}, 403
         
-        # Get properties count
-        total_properties = Property.query.filter_by(landlord_id=user.id).count()
-        occupied_properties = Property.query.filter_by(
-            landlord_id=user.id, 
-            status='occupied'
-        ).count()
-        available_properties = Property.query.filter_by(
-            landlord_id=user.id, 
-            status='available'
-        ).count()
+        # Summary: one round-trip built from single-row conditional aggregates
+        # (CASE WHEN inside SUM) instead of a separate COUNT/SUM per figure
+        current_month = LandlordMonthlyStats.month_of(datetime.now())
         
-        # Get payments data
-        current_month = datetime.now().replace(day=1)
-        monthly_revenue = db.session.query(func.sum(Payment.amount)).join(Property).filter(
-            Property.landlord_id == user.id,
-            Payment.status == 'completed',
-            Payment.payment_date >= current_month
-        ).scalar() or 0
+        property_stats = select(
+            func.count(Property.id).label('total'),
+            func.coalesce(func.sum(case((Property.status == PropertyStatus.OCCUPIED, 1), else_=0)), 0).label('occupied'),
+            func.coalesce(func.sum(case((Property.status == PropertyStatus.AVAILABLE, 1), else_=0)), 0).label('available')
+        ).where(Property.landlord_id == user.id).subquery()
         
-        pending_payments = Payment.query.join(Property).filter(
-            Property.landlord_id == user.id,
-            Payment.status == 'pending'
-        ).count()
+        # Payment figures come from the monthly rollup: O(months) rows, not O(payments)
+        payment_stats = select(
+            func.coalesce(func.sum(case(
+                (LandlordMonthlyStats.month == current_month, LandlordMonthlyStats.completed_total),
+                else_=0
+            )), 0).label('monthly_revenue'),
+            func.coalesce(func.sum(LandlordMonthlyStats.pending_count), 0).label('pending')
+        ).where(LandlordMonthlyStats.landlord_id == user.id).subquery()
         
-        # Recent payments
+        summary = db.session.execute(select(
+            property_stats.c.total,
+            property_stats.c.occupied,
+            property_stats.c.available,
+            payment_stats.c.monthly_revenue,
+            payment_stats.c.pending,
+            unread_messages_subquery(user.id).label('unread')
+        )).one()
+        
+        # Recent payments: second round-trip, relations joined into the same statement
         recent_payments = Payment.query.join(Property).filter(
             Property.landlord_id == user.id
+        ).options(
+            *Payment.load_options(strategy=joinedload)
         ).order_by(Payment.created_at.desc()).limit(5).all()
         
-        # Unread messages count
-        unread_messages = db.session.query(func.count()).select_from(Conversation).join(
-            'messages'
-        ).filter(
-            Conversation.participant_id == user.id,
-            'Message.is_read == False'
-        ).scalar() or 0
-        
         return {
             'summary': {
-                'total_properties': total_properties,
-                'occupied_properties': occupied_properties,
-                'available_properties': available_properties,
-                'monthly_revenue': float(monthly_revenue),
-                'pending_payments': pending_payments,
-                'unread_messages': unread_messages
+                'total_properties': summary.total,
+                'occupied_properties': int(summary.occupied),
+                'available_properties': int(summary.available),
+                'monthly_revenue': float(summary.monthly_revenue),
+                'pending_payments': int(summary.pending),
+                'unread_messages': summary.unread
             },
             'recent_payments': [payment.to_dict() for payment in recent_payments]
         }, 200
@@ -65,8 +77,7 @@ class LandlordDashboard(Resource):
 class TenantDashboard(Resource):
     @jwt_required()
     def get(self):
-        user_id = get_jwt_identity()
-        user = User.query.get_or_404(user_id)
+        user = current_user_or_404()
         
         if user.role != 'tenant':
             return {'error': 'Tenant access required'}, 403
@@ -88,7 +99,7 @@ class TenantDashboard(Resource):
         # Recent payments
         recent_payments = Payment.query.filter_by(
             tenant_id=user.id
-        ).order_by(Payment.created_at.desc()).limit(5).all()
+        ).options(*Payment.load_options()).order_by(Payment.created_at.desc()).limit(5).all()
         
         # Next rent due (assuming monthly rent)
         next_due_date = None
@@ -103,12 +114,7 @@ class TenantDashboard(Resource):
                     next_due_date = next_due_date.replace(month=next_due_date.month + 1)
         
         # Unread messages count
-        unread_messages = db.session.query(func.count()).select_from(Conversation).join(
-            'messages'
-        ).filter(
-            Conversation.participant_id == user.id,
-            'Message.is_read == False'
-        ).scalar() or 0
+        unread_messages = db.session.execute(select(unread_messages_subquery(user.id))).scalar() or 0
         
         return {
             'summary': {
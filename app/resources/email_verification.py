@@ -3,11 +3,12 @@
 
 from flask import request
 from flask_restful import Resource
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from app import db
 from app.models.user import User
 from app.models.verification import VerificationToken
 from app.utils.email_service import email_service
+from app.utils.auth import current_user_or_404
 from flasgger import swag_from
 
 class SendVerificationEmail(Resource):
@@ -34,8 +35,7 @@ class SendVerificationEmail(Resource):
         """
         try:
             # Get current user
-            user_id = get_jwt_identity()
-            user = User.query.get_or_404(user_id)
+            user = current_user_or_404()
             
             # Check if already verified
             if user.is_verified:
@@ -5,10 +5,10 @@ from flask import request
 from flask_restful import Resource
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
-from app.models.user import User
 from app.models.property import Property
 from app.utils.cloudinary_service import cloudinary_service
 from app.utils.decorators import landlord_required
+from app.utils.auth import current_user_or_404
 from flasgger import swag_from
 
 class UploadPropertyImage(Resource):
@@ -156,13 +156,12 @@ class UploadProfileImage(Resource):
         
         try:
             # Get current user
-            user_id = get_jwt_identity()
-            user = User.query.get_or_404(user_id)
+            user = current_user_or_404()
             
             # Upload image to Cloudinary with optimization
             image_url = cloudinary_service.upload_profile_image(
                 image_file=image_file,
-                user_id=user_id
+                user_id=user.id
             )
             
             if not image_url:
@@ -5,7 +5,7 @@
 #
 # ENDPOINTS:
 # GET /api/payments - List payments (filtered by user role)
-# POST /api/payments - Create payment and initiate M-Pesa STK Push
+# POST /api/payments - Create payment and queue M-Pesa STK Push (202 Accepted)
 # GET /api/payments/<id> - Get payment details
 # PUT /api/payments/<id> - Update payment status (landlord only)
 # POST /api/payments/callback - M-Pesa callback endpoint
@@ -15,6 +15,13 @@
 # - Tenant: Returns their own payments
 # - Admin: Returns all payments
 #
+# QUERY PARAMETERS (GET /api/payments):
+# - fields, expand, depth: Sparse fieldsets (see app/utils/serialization.py)
+#   depth: 0 = payment only, 1 = + property/tenant, 2 = + property's
+#   landlord/tenant (default 2)
+#   e.g. fields=id,amount,status,property&expand=property (relations are
+#   only embedded when fields lists them)
+#
 # RESPONSE FORMAT:
 # {
 #   "payments": [
@@ -38,24 +45,32 @@
 # }
 #
 # M-PESA FLOW:
-# 1. POST /api/payments - Initiates STK Push to user's phone
+# 1. POST /api/payments - Returns 202 with the pending payment; the STK Push
+#    is sent in the background (app/utils/stk_push.py). Clients poll
+#    GET /api/payments/<id> (Location header) until mpesa_checkout_id is set
+#    or status changes, or listen for the 'payment_updated' Socket.IO event
 # 2. User enters M-Pesa PIN on their phone
 # 3. M-Pesa processes payment
 # 4. M-Pesa sends callback to /api/payments/callback
-# 5. Payment status updated to 'completed' or 'failed'
-# 6. Email confirmation sent to tenant and landlord
+# 5. Payment status updated to 'completed' or 'failed' (only from 'pending',
+#    so duplicate callbacks are acknowledged without changing anything)
+# 6. Email confirmation queued in the email outbox in the same transaction
+#    and sent by the outbox worker (app/utils/email_outbox.py)
 # ============================================================================
 
 from flask_restful import Resource
 from flask import request
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import Payment, Property, User, db
+from flask_jwt_extended import jwt_required
+from app.models import Payment, PaymentStatus, PaymentMethod, Property, LandlordMonthlyStats, db
 from app.schemas.payment import PaymentSchema, PaymentCreateSchema
-from app.utils.payments import MPesaService
-from app.utils.email import send_payment_confirmation
+from app.utils.stk_push import submit_stk_push
+from app.utils.email import queue_payment_confirmation
+from app.utils.serialization import get_fieldset_params
+from app.utils.auth import current_user_or_404
 from datetime import datetime
 import uuid
 from marshmallow import ValidationError
+from sqlalchemy import update
 
 class PaymentList(Resource):
     """Payment list endpoint - Get all payments or create new payment"""
@@ -64,30 +79,36 @@ class PaymentList(Resource):
         """Get payments filtered by user role
         Landlords see payments for their properties, tenants see their payments
         """
-        user_id = get_jwt_identity()  # Extract user ID from JWT token
-        user = User.query.get_or_404(user_id)
+        user = current_user_or_404()  # Loaded once per request with profile
+        
+        try:
+            fields, expand = get_fieldset_params(Payment)
+        except ValueError as err:
+            return {'error': str(err)}, 400
         
         # Filter payments based on user role
         if user.role == 'landlord':
             # Landlords see payments for properties they own
-            payments = Payment.query.join(Property).filter(Property.landlord_id == user.id).all()
+            query = Payment.query.join(Property).filter(Property.landlord_id == user.id)
         elif user.role == 'tenant':
             # Tenants see their own payments
-            payments = Payment.query.filter_by(tenant_id=user.id).all()
+            query = Payment.query.filter_by(tenant_id=user.id)
         else:
             # Admins see all payments
-            payments = Payment.query.all()
+            query = Payment.query
+        
+        # Eager-load everything to_dict touches so the list costs a fixed number of queries
+        payments = query.options(*Payment.load_options(fields=fields, expand=expand)).all()
         
         # Return payments array as expected by frontend
-        return {'payments': [payment.to_dict() for payment in payments]}, 200
+        return {'payments': [payment.to_dict(fields=fields, expand=expand) for payment in payments]}, 200
 
     @jwt_required()  # Requires JWT token
     def post(self):
         """Create new payment and initiate M-Pesa STK Push
         Sends payment prompt to user's phone for M-Pesa payment
         """
-        user_id = get_jwt_identity()
-        user = User.query.get_or_404(user_id)
+        user = current_user_or_404()
         
         # Validate request data
         schema = PaymentCreateSchema()
@@ -96,6 +117,12 @@ class PaymentList(Resource):
         except ValidationError as err:
             return {'errors': err.messages}, 400
         
+        try:
+            payment_method = PaymentMethod(data.get('payment_method', 'mpesa'))
+        except ValueError:
+            valid = ', '.join(method.value for method in PaymentMethod)
+            return {'errors': {'payment_method': [f'Must be one of: {valid}']}}, 400
+        
         property = Property.query.get_or_404(data['property_id'])
         
         # Verify tenant can pay for this property
@@ -106,7 +133,7 @@ class PaymentList(Resource):
         payment = Payment(
             amount=data['amount'],
             payment_date=datetime.utcnow(),  # Used as due_date
-            payment_method=data.get('payment_method', 'mpesa'),
+            payment_method=payment_method,
             property_id=data['property_id'],
             tenant_id=user.id,
             reference=str(uuid.uuid4()),  # Unique payment reference
@@ -114,27 +141,15 @@ class PaymentList(Resource):
         )
         
         db.session.add(payment)
+        db.session.flush()
+        LandlordMonthlyStats.record_payment(payment)
         db.session.commit()
         
-        # Initiate M-Pesa STK Push if payment method is M-Pesa
-        if payment.payment_method.value == 'mpesa' and payment.phone_number:
-            mpesa = MPesaService()
-            # Send STK Push to user's phone
-            result = mpesa.initiate_payment(
-                payment.phone_number,
-                payment.amount,
-                payment.reference
-            )
-            
-            if 'CheckoutRequestID' in result:
-                # Store M-Pesa checkout ID for callback matching
-                payment.mpesa_checkout_id = result['CheckoutRequestID']
-                db.session.commit()
-            elif 'error' in result:
-                # Mark payment as failed if STK Push fails
-                payment.status = 'failed'
-                db.session.commit()
-                return {'error': result['error']}, 400
+        # Queue M-Pesa STK Push if payment method is M-Pesa; don't wait on Daraja
+        if payment_method == PaymentMethod.MPESA and payment.phone_number:
+            payment_dict = payment.to_dict()
+            submit_stk_push(payment.id)
+            return {'payment': payment_dict}, 202, {'Location': f'/api/payments/{payment.id}'}
         
         return {'payment': payment.to_dict()}, 201
 
@@ -142,8 +157,7 @@ class PaymentDetail(Resource):
     """Payment detail endpoint - Get or update specific payment"""
     @jwt_required()
     def get(self, payment_id):
-        user_id = get_jwt_identity()
-        user = User.query.get_or_404(user_id)
+        user = current_user_or_404()
         payment = Payment.query.get_or_404(payment_id)
         
         # Check access permissions
@@ -152,25 +166,37 @@ class PaymentDetail(Resource):
         elif user.role == 'landlord' and payment.property.landlord_id != user.id:
             return {'error': 'Access denied'}, 403
         
-        return {'payment': payment.to_dict()}, 200
+        try:
+            fields, expand = get_fieldset_params(Payment)
+        except ValueError as err:
+            return {'error': str(err)}, 400
+        
+        return {'payment': payment.to_dict(fields=fields, expand=expand)}, 200
     
     @jwt_required()
     def put(self, payment_id):
-        user_id = get_jwt_identity()
-        user = User.query.get_or_404(user_id)
+        user = current_user_or_404()
         payment = Payment.query.get_or_404(payment_id)
         
         # Only landlords can update payment status
         if user.role != 'landlord' or payment.property.landlord_id != user.id:
             return {'error': 'Only property owner can update payment status'}, 403
         
-        data = request.json
+        data = request.get_json(silent=True) or {}
         if 'status' in data:
-            payment.status = data['status']
+            try:
+                new_status = PaymentStatus(data['status'])
+            except ValueError:
+                valid = ', '.join(status.value for status in PaymentStatus)
+                return {'error': f'Invalid status; expected one of: {valid}'}, 400
+            
+            old_status = payment.status
+            payment.status = new_status
+            LandlordMonthlyStats.record_payment(payment, old_status)
             
-            # Send confirmation email if payment is completed
-            if payment.status.value == 'completed':
-                send_payment_confirmation(payment)
+            # Queue confirmation email when the payment becomes completed
+            if new_status == PaymentStatus.COMPLETED and old_status != PaymentStatus.COMPLETED:
+                queue_payment_confirmation(payment)
         
         db.session.commit()
         return {'payment': payment.to_dict()}, 200
@@ -188,18 +214,27 @@ class PaymentCallback(Resource):
             callback_data = data['Body']['stkCallback']
             checkout_id = callback_data.get('CheckoutRequestID')
             
-            # Find payment by M-Pesa checkout ID
-            payment = Payment.query.filter_by(mpesa_checkout_id=checkout_id).first()
-            if payment:
-                # ResultCode 0 means success
-                if callback_data.get('ResultCode') == 0:
-                    payment.status = 'completed'
-                    # Send email confirmation to tenant and landlord
-                    send_payment_confirmation(payment)
-                else:
-                    # Payment failed or cancelled
-                    payment.status = 'failed'
-                
+            # ResultCode 0 means success, anything else is failed or cancelled
+            succeeded = callback_data.get('ResultCode') == 0
+            new_status = PaymentStatus.COMPLETED if succeeded else PaymentStatus.FAILED
+            
+            # Single conditional UPDATE on the unique checkout id index: only a
+            # pending payment transitions, so duplicate or late callbacks match
+            # no row and become no-ops without a prior SELECT
+            payment_id = db.session.execute(
+                update(Payment)
+                .where(Payment.mpesa_checkout_id == checkout_id, Payment.status == PaymentStatus.PENDING)
+                .values(status=new_status, updated_at=datetime.utcnow())
+                .returning(Payment.id)
+            ).scalar_one_or_none()
+            
+            if payment_id is not None:
+                payment = db.session.get(Payment, payment_id)
+                # Keep the dashboard rollup and confirmation email in the same
+                # transaction as the status change; the outbox worker sends the email
+                LandlordMonthlyStats.record_payment(payment, PaymentStatus.PENDING)
+                if succeeded:
+                    queue_payment_confirmation(payment)
                 db.session.commit()
         
         return {'message': 'Callback processed'}, 200
\ No newline at end of file
@@ -15,6 +15,15 @@
 # - Tenant: Returns properties assigned to them (tenant_id = user.id)
 # - Admin: Returns all properties
 #
+# QUERY PARAMETERS (GET /api/properties):
+# - limit: Page size (default 20, max 100)
+# - cursor: Opaque cursor from the previous page's pagination.next_cursor
+# - city, status, property_type: Exact match filters
+# - min_rent, max_rent: Monthly rent range (inclusive)
+# - bedrooms: Exact number of bedrooms
+# - fields, expand, depth: Sparse fieldsets (see app/utils/serialization.py),
+#   e.g. fields=id,title,status&expand= returns no embedded users
+#
 # RESPONSE FORMAT:
 # {
 #   "properties": [
@@ -26,7 +35,8 @@
 #       "landlord_id": 2,
 #       "tenant_id": 3
 #     }
-#   ]
+#   ],
+#   "pagination": {"limit": 20, "next_cursor": "...", "has_more": true}
 # }
 #
 # CREATE PROPERTY REQUEST:
@@ -41,41 +51,102 @@
 
 from flask_restful import Resource
 from flask import request
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import Property, User, db
+from flask_jwt_extended import jwt_required
+from app.models import Property, PropertyStatus, PropertyType, db
 from app.schemas.property import PropertySchema, PropertyCreateSchema
 from app.utils.cloudinary import upload_image, delete_image
+from app.utils.pagination import get_cursor_params, keyset_paginate, InvalidCursorError
+from app.utils.serialization import get_fieldset_params
+from app.utils.auth import current_user_or_404
 from marshmallow import ValidationError
+from sqlalchemy import func
 
 class PropertyList(Resource):
     """Property list endpoint - Get all properties or create new property"""
     @jwt_required()  # Requires JWT token in Authorization header
     def get(self):
         """Get properties filtered by user role
-        Landlords see their properties, tenants see assigned properties
+        Landlords see their properties, tenants see assigned properties.
+        Results are cursor-paginated and can be narrowed with query filters.
         """
-        user_id = get_jwt_identity()  # Extract user ID from JWT token
-        user = User.query.get_or_404(user_id)
+        user = current_user_or_404()  # Loaded once per request with profile
 
         # Filter properties based on user role
         if user.role == 'landlord':
             # Landlords see properties they own
-            properties = Property.query.filter_by(landlord_id=user.id).all()
+            query = Property.query.filter_by(landlord_id=user.id)
         elif user.role == 'tenant':
             # Tenants see properties assigned to them
-            properties = Property.query.filter_by(tenant_id=user.id).all()
+            query = Property.query.filter_by(tenant_id=user.id)
         else:
             # Admins see all properties
-            properties = Property.query.all()
+            query = Property.query
+
+        try:
+            query = self._apply_filters(query)
+            cursor, limit = get_cursor_params()
+            fields, expand = get_fieldset_params(Property)
+        except (ValueError, InvalidCursorError) as err:
+            return {'error': str(err)}, 400
+
+        # Eager-load requested relations and read only requested columns
+        query = query.options(*Property.load_options(fields=fields, expand=expand))
+        properties, pagination = keyset_paginate(query, Property, cursor, limit)
 
         # Return properties array as expected by frontend
-        return {'properties': [prop.to_dict() for prop in properties]}, 200
+        return {
+            'properties': [prop.to_dict(fields=fields, expand=expand) for prop in properties],
+            'pagination': pagination
+        }, 200
+
+    def _apply_filters(self, query):
+        """Narrow the property query with optional request filters
+        Raises ValueError with a client-facing message on bad input
+        """
+        args = request.args
+
+        city = args.get('city')
+        if city:
+            query = query.filter(func.lower(Property.city) == city.strip().lower())
+
+        status = args.get('status')
+        if status:
+            try:
+                query = query.filter(Property.status == PropertyStatus(status))
+            except ValueError:
+                raise ValueError(f'Invalid status: {status}')
+
+        property_type = args.get('property_type')
+        if property_type:
+            try:
+                query = query.filter(Property.property_type == PropertyType(property_type))
+            except ValueError:
+                raise ValueError(f'Invalid property_type: {property_type}')
+
+        if args.get('min_rent'):
+            min_rent = args.get('min_rent', type=float)
+            if min_rent is None:
+                raise ValueError('min_rent must be a number')
+            query = query.filter(Property.monthly_rent >= min_rent)
+
+        if args.get('max_rent'):
+            max_rent = args.get('max_rent', type=float)
+            if max_rent is None:
+                raise ValueError('max_rent must be a number')
+            query = query.filter(Property.monthly_rent <= max_rent)
+
+        if args.get('bedrooms'):
+            bedrooms = args.get('bedrooms', type=int)
+            if bedrooms is None:
+                raise ValueError('bedrooms must be an integer')
+            query = query.filter(Property.bedrooms == bedrooms)
+
+        return query
 
     @jwt_required()  # Requires JWT token
     def post(self):
         """Create new property - Landlord only"""
-        user_id = get_jwt_identity()
-        user = User.query.get_or_404(user_id)
+        user = current_user_or_404()
 
         # Only landlords can create properties
         if user.role != 'landlord':
@@ -113,19 +184,22 @@ class PropertyDetail(Resource):
     """Property detail endpoint - Get, update, or delete specific property"""
     @jwt_required()
     def get(self, property_id):
-        user_id = get_jwt_identity()
-        user = User.query.get_or_404(user_id)
+        user = current_user_or_404()
         property = Property.query.get_or_404(property_id)
 
         if not self._can_access_property(user, property):
             return {'error': 'Access denied'}, 403
 
-        return {'property': property.to_dict()}, 200
+        try:
+            fields, expand = get_fieldset_params(Property)
+        except ValueError as err:
+            return {'error': str(err)}, 400
+
+        return {'property': property.to_dict(fields=fields, expand=expand)}, 200
 
     @jwt_required()
     def put(self, property_id):
-        user_id = get_jwt_identity()
-        user = User.query.get_or_404(user_id)
+        user = current_user_or_404()
         property = Property.query.get_or_404(property_id)
 
         if property.landlord_id != user.id:
@@ -147,8 +221,7 @@ class PropertyDetail(Resource):
 
     @jwt_required()
     def delete(self, property_id):
-        user_id = get_jwt_identity()
-        user = User.query.get_or_404(user_id)
+        user = current_user_or_404()
         property = Property.query.get_or_404(property_id)
 
         if property.landlord_id != user.id:
@@ -178,8 +251,7 @@ class PropertyImages(Resource):
     """Property images endpoint - Upload images to Cloudinary"""
     @jwt_required()
     def post(self, property_id):
-        user_id = get_jwt_identity()
-        user = User.query.get_or_404(user_id)
+        user = current_user_or_404()
         property = Property.query.get_or_404(property_id)
 
         if property.landlord_id != user.id:
@@ -1,31 +1,36 @@
 from flask_restful import Resource
 from flask import request
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from app.models import User, db
 from app.schemas.user import UserSchema
+from app.utils.serialization import get_fieldset_params
 from app.utils.cloudinary import upload_image
+from app.utils.auth import current_user_or_404
 
 class UserList(Resource):
     @jwt_required()
     def get(self):
-        user_id = get_jwt_identity()
-        user = User.query.get_or_404(user_id)
+        user = current_user_or_404()
         
         # Only admins can list all users
         if user.role != 'admin':
             return {'error': 'Admin access required'}, 403
             
-        users = User.query.all()
-        return {'users': [user.to_dict() for user in users]}, 200
+        try:
+            fields, expand = get_fieldset_params(User)
+        except ValueError as err:
+            return {'error': str(err)}, 400
+            
+        users = User.query.options(*User.load_options(fields=fields, expand=expand)).all()
+        return {'users': [user.to_dict(fields=fields, expand=expand) for user in users]}, 200
 
 class UserDetail(Resource):
     @jwt_required()
     def get(self, user_id):
-        current_user_id = get_jwt_identity()
-        current_user = User.query.get_or_404(current_user_id)
+        current_user = current_user_or_404()
         
         # Users can only view their own profile unless they're admin
-        if current_user.role != 'admin' and current_user_id != user_id:
+        if current_user.role != 'admin' and current_user.id != user_id:
             return {'error': 'Access denied'}, 403
             
         user = User.query.get_or_404(user_id)
@@ -34,8 +39,7 @@ class UserDetail(Resource):
 class UserProfileImage(Resource):
     @jwt_required()
     def post(self):
-        user_id = get_jwt_identity()
-        user = User.query.get_or_404(user_id)
+        user = current_user_or_404()
         
         if 'image' not in request.files:
             return {'error': 'No image file provided'}, 400
@@ -44,7 +48,7 @@ class UserProfileImage(Resource):
         if file.filename == '':
             return {'error': 'No file selected'}, 400
             
-        result = upload_image(file, folder=f"users/{user_id}")
+        result = upload_image(file, folder=f"users/{user.id}")
         
         if 'error' in result:
             return {'error': result['error']}, 400
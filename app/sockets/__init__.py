@@ -1,15 +1,124 @@
 """
 Socket.IO Event Handlers for Real-Time Chat
+
+Clients must emit 'authenticate' with their JWT first. The identity is bound
+to the connection, and any user_id sent with later events is ignored. Each
+connection caches the conversations its user may access, so repeated events
+(typing, mark_read, ...) don't re-check membership against the database.
+
+THROTTLING:
+- Each connection may send SOCKET_EVENT_RATE events per second (bursts up
+  to SOCKET_EVENT_BURST); extra events are dropped with one 'error'
+- typing is coalesced per user and conversation: is_typing=true is relayed
+  at most every TYPING_REFRESH_SECONDS, and only changes of state otherwise.
+  user_typing carries expires_in so receivers clear the indicator on their
+  own if the typist goes quiet or disconnects without sending false
 """
-from flask import request
+import time
+from flask import request, current_app
 from flask_socketio import emit, join_room, leave_room
 from flask_jwt_extended import decode_token
 from app import socketio, db
-from app.models import User, Conversation, Message
-from datetime import datetime
+from app.models import User, Conversation
+from sqlalchemy import case, or_
+from app.utils.presence import get_presence
+from app.utils.rate_limit import TokenBucket
+from app.utils.auth import token_revoked
+from app.utils.validators import validate_id
+
+class SocketSession:
+    """Identity, access cache and throttling state for one authenticated connection"""
+    def __init__(self, user, expires_at, config):
+        self.user_id = user.id
+        self.expires_at = expires_at
+        self.sender = {'id': user.id, 'first_name': user.first_name, 'last_name': user.last_name,
+                       'profile_image': user.profile_image}
+        self.conversations = {}  # conversation_id -> other participant's user_id
+        self.events = TokenBucket(config.get('SOCKET_EVENT_RATE', 10), config.get('SOCKET_EVENT_BURST', 20))
+        self.throttled = False  # Whether the rate limit error was already sent
+        self.typing = {}  # conversation_id -> when is_typing=true was last relayed
+        self.typing_refresh = config.get('TYPING_REFRESH_SECONDS', 3)
+        self.typing_timeout = config.get('TYPING_TIMEOUT_SECONDS', 6)
+
+    def typing_changed(self, conversation_id, is_typing):
+        """Whether a typing event should be relayed or coalesced away"""
+        now = time.monotonic()
+        last_relayed = self.typing.get(conversation_id)
+        if last_relayed is not None and now - last_relayed >= self.typing_timeout:
+            last_relayed = None  # Receivers have already expired it
+        if is_typing:
+            if last_relayed is not None and now - last_relayed < self.typing_refresh:
+                return False
+            self.typing[conversation_id] = now
+            return True
+        self.typing.pop(conversation_id, None)
+        return last_relayed is not None
+
+    def other_user_in(self, conversation_id):
+        """Other participant of a conversation this user belongs to, else None
+        Membership never changes, so the first lookup is cached for the connection
+        """
+        if conversation_id not in self.conversations:
+            row = db.session.query(Conversation.initiator_id, Conversation.participant_id).filter(
+                Conversation.id == conversation_id
+            ).first()
+            if row is None or self.user_id not in row:
+                return None
+            self.conversations[conversation_id] = row.participant_id if row.initiator_id == self.user_id else row.initiator_id
+        return self.conversations[conversation_id]
+
+# Authenticated sockets held by this worker (sid -> SocketSession); who is
+# online across all workers lives in the presence store
+socket_sessions = {}
+_heartbeat_started = False
 
-# Store active users and their socket IDs
-active_users = {}
+def _presence_heartbeat(app):
+    """Keep this worker's sockets alive in the presence store and expire dead workers' sockets"""
+    with app.app_context():
+        presence = get_presence()
+        while True:
+            socketio.sleep(max(presence.ttl / 3, 1))
+            try:
+                presence.heartbeat(list(socket_sessions))
+                presence.expire_stale()
+            except Exception as e:
+                print(f'Presence heartbeat error: {str(e)}')
+
+def start_presence_heartbeat():
+    """Start the heartbeat task once per worker process"""
+    global _heartbeat_started
+    if not _heartbeat_started:
+        _heartbeat_started = True
+        socketio.start_background_task(_presence_heartbeat, current_app._get_current_object())
+
+def current_session():
+    """Session for the calling socket, or None (error emitted) if not authenticated"""
+    session = socket_sessions.get(request.sid)
+    if session is None:
+        emit('error', {'message': 'Not authenticated'})
+        return None
+    if session.expires_at and session.expires_at < time.time():
+        emit('error', {'message': 'Token expired, authenticate again'})
+        return None
+    if not session.events.allow():
+        if not session.throttled:
+            session.throttled = True
+            emit('error', {'message': 'Rate limit exceeded, slow down'})
+        return None
+    session.throttled = False
+    return session
+
+def authorized_conversation(session, conversation_id):
+    """Other participant's id if session's user may use conversation_id, else None (error emitted)"""
+    other_user_id = session.other_user_in(conversation_id) if conversation_id else None
+    if other_user_id is None:
+        emit('error', {'message': 'Conversation not found or access denied'})
+    return other_user_id
+
+def notify_user(user_id, event, data):
+    """Emit to every device user_id has connected, on any worker, if they're online"""
+    if get_presence().is_online(user_id):
+        emit(event, data, room=f'user_{user_id}')
 
 @socketio.on('connect')
 def handle_connect():
@@ -20,11 +129,10 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnection"""
-    for user_id, sid in list(active_users.items()):
-        if sid == request.sid:
-            del active_users[user_id]
-            print(f'User {user_id} disconnected')
-            break
+    session = socket_sessions.pop(request.sid, None)
+    if session is not None:
+        get_presence().disconnect(request.sid)
+        print(f'User {session.user_id} disconnected')
     print(f'Client disconnected: {request.sid}')
 
 @socketio.on('authenticate')
@@ -37,15 +145,29 @@ def handle_authenticate(data):
             return
         
         decoded = decode_token(token)
-        user_id = decoded['sub']
-        active_users[user_id] = request.sid
-        
-        user = User.query.get(user_id)
-        if user:
-            emit('authenticated', {'user_id': user_id, 'user': user.to_dict()})
-            print(f'User {user_id} authenticated')
-        else:
+        if token_revoked(decoded):  # decode_token doesn't consult the revocation check
+            emit('error', {'message': 'Token has been revoked'})
+            return
+        user = User.query.get(decoded['sub'])
+        if not user:
             emit('error', {'message': 'User not found'})
+            return
+        
+        presence = get_presence()
+        previous = socket_sessions.get(request.sid)
+        if previous is not None and previous.user_id != user.id:
+            # Same socket re-authenticating as someone else
+            presence.disconnect(request.sid)
+            leave_room(f'user_{previous.user_id}')
+        
+        # Bind the identity to this connection; later events can't claim another user
+        socket_sessions[request.sid] = SocketSession(user, decoded.get('exp'), current_app.config)
+        presence.connect(user.id, request.sid)
+        join_room(f'user_{user.id}')  # Every device of the user joins; per-user events fan out
+        start_presence_heartbeat()
+        
+        emit('authenticated', {'user_id': user.id, 'user': user.to_dict()})
+        print(f'User {user.id} authenticated')
     except Exception as e:
         print(f'Authentication error: {str(e)}')
         emit('error', {'message': 'Authentication failed'})
@@ -54,30 +176,21 @@ def handle_authenticate(data):
 def handle_join_conversation(data):
     """Join a conversation room"""
     try:
-        conversation_id = data.get('conversation_id')
-        user_id = data.get('user_id')
-        
-        if not conversation_id or not user_id:
-            emit('error', {'message': 'Missing conversation_id or user_id'})
-            return
-        
-        conversation = Conversation.query.get(conversation_id)
-        if not conversation:
-            emit('error', {'message': 'Conversation not found'})
+        session = current_session()
+        if not session:
             return
+        user_id = session.user_id
+        conversation_id = data.get('conversation_id')
         
-        if conversation.initiator_id != user_id and conversation.participant_id != user_id:
-            emit('error', {'message': 'Access denied'})
+        other_user_id = authorized_conversation(session, conversation_id)
+        if other_user_id is None:
             return
         
         room = f'conversation_{conversation_id}'
         join_room(room)
         
         emit('joined_conversation', {'conversation_id': conversation_id, 'room': room})
-        
-        other_user_id = conversation.participant_id if conversation.initiator_id == user_id else conversation.initiator_id
-        if other_user_id in active_users:
-            emit('user_joined', {'user_id': user_id, 'conversation_id': conversation_id}, room=active_users[other_user_id])
+        notify_user(other_user_id, 'user_joined', {'user_id': user_id, 'conversation_id': conversation_id})
         
         print(f'User {user_id} joined conversation {conversation_id}')
     except Exception as e:
@@ -88,19 +201,20 @@ def handle_join_conversation(data):
 def handle_leave_conversation(data):
     """Leave a conversation room"""
     try:
+        session = current_session()
+        if not session:
+            return
+        user_id = session.user_id
         conversation_id = data.get('conversation_id')
-        user_id = data.get('user_id')
         
         room = f'conversation_{conversation_id}'
         leave_room(room)
         
         emit('left_conversation', {'conversation_id': conversation_id})
         
-        conversation = Conversation.query.get(conversation_id)
-        if conversation:
-            other_user_id = conversation.participant_id if conversation.initiator_id == user_id else conversation.initiator_id
-            if other_user_id in active_users:
-                emit('user_left', {'user_id': user_id, 'conversation_id': conversation_id}, room=active_users[other_user_id])
+        other_user_id = session.other_user_in(conversation_id)
+        if other_user_id is not None:
+            notify_user(other_user_id, 'user_left', {'user_id': user_id, 'conversation_id': conversation_id})
         
         print(f'User {user_id} left conversation {conversation_id}')
     except Exception as e:
@@ -110,47 +224,53 @@ def handle_leave_conversation(data):
 def handle_send_message(data):
     """Handle sending a message"""
     try:
+        session = current_session()
+        if not session:
+            return
+        user_id = session.user_id
         conversation_id = data.get('conversation_id')
-        user_id = data.get('user_id')
         content = data.get('content', '').strip()
         
-        if not conversation_id or not user_id or not content:
+        if not conversation_id or not content:
             emit('error', {'message': 'Missing required fields'})
             return
         
-        conversation = Conversation.query.get(conversation_id)
-        if not conversation:
-            emit('error', {'message': 'Conversation not found'})
+        other_user_id = authorized_conversation(session, conversation_id)
+        if other_user_id is None:
             return
         
-        if conversation.initiator_id != user_id and conversation.participant_id != user_id:
-            emit('error', {'message': 'Access denied'})
-            return
-        
-        message = Message(content=content, conversation_id=conversation_id, sender_id=user_id)
-        db.session.add(message)
-        
-        conversation.last_message = content
-        conversation.last_message_at = datetime.utcnow()
-        db.session.commit()
+        buffer = current_app.extensions.get('message_buffer')
+        if buffer:
+            # Write-behind: journaled now, inserted with the next batch; id follows
+            # in 'message_persisted' (see app/utils/message_buffer.py)
+            record = buffer.enqueue(conversation_id, user_id, content)
+            message_id, client_uid, created_at = None, record['client_uid'], record['created_at']
+        else:
+            conversation = db.session.get(Conversation, conversation_id)
+            if not conversation:
+                session.conversations.pop(conversation_id, None)  # Deleted since it was cached
+                emit('error', {'message': 'Conversation not found'})
+                return
+            
+            message = conversation.add_message(user_id, content)
+            db.session.commit()
+            message_id, client_uid, created_at = message.id, None, message.created_at.isoformat()
+        session.typing.pop(conversation_id, None)  # new_message ends the typing indicator
         
-        sender = User.query.get(user_id)
         message_data = {
-            'id': message.id,
-            'content': message.content,
+            'id': message_id,
+            'client_uid': client_uid,
+            'content': content,
             'conversation_id': conversation_id,
             'sender_id': user_id,
-            'sender': {'id': sender.id, 'first_name': sender.first_name, 'last_name': sender.last_name, 'profile_image': sender.profile_image},
+            'sender': session.sender,
             'is_read': False,
-            'created_at': message.created_at.isoformat()
+            'created_at': created_at
         }
         
         room = f'conversation_{conversation_id}'
         emit('new_message', message_data, room=room, include_self=True)
-        
-        other_user_id = conversation.participant_id if conversation.initiator_id == user_id else conversation.initiator_id
-        if other_user_id in active_users:
-            emit('message_notification', {'conversation_id': conversation_id, 'message': message_data}, room=active_users[other_user_id])
+        notify_user(other_user_id, 'message_notification', {'conversation_id': conversation_id, 'message': message_data})
         
         print(f'Message sent in conversation {conversation_id} by user {user_id}')
     except Exception as e:
@@ -160,17 +280,18 @@ def handle_send_message(data):
 
 @socketio.on('typing')
 def handle_typing(data):
-    """Handle typing indicator"""
+    """Handle typing indicator (no database access once the conversation is cached)"""
     try:
+        session = current_session()
+        if not session:
+            return
         conversation_id = data.get('conversation_id')
-        user_id = data.get('user_id')
-        is_typing = data.get('is_typing', False)
-        
-        conversation = Conversation.query.get(conversation_id)
-        if conversation:
-            other_user_id = conversation.participant_id if conversation.initiator_id == user_id else conversation.initiator_id
-            if other_user_id in active_users:
-                emit('user_typing', {'conversation_id': conversation_id, 'user_id': user_id, 'is_typing': is_typing}, room=active_users[other_user_id])
+        is_typing = bool(data.get('is_typing', False))
+        
+        other_user_id = authorized_conversation(session, conversation_id)
+        if other_user_id is not None and session.typing_changed(conversation_id, is_typing):
+            notify_user(other_user_id, 'user_typing', {'conversation_id': conversation_id, 'user_id': session.user_id,
+                                                       'is_typing': is_typing, 'expires_in': session.typing_timeout})
     except Exception as e:
         print(f'Typing indicator error: {str(e)}')
 
@@ -178,34 +299,46 @@ def handle_typing(data):
 def handle_mark_read(data):
     """Mark messages as read"""
     try:
+        session = current_session()
+        if not session:
+            return
+        user_id = session.user_id
         conversation_id = data.get('conversation_id')
-        user_id = data.get('user_id')
+        up_to_id = data.get('up_to_id')  # Optional read watermark
+        if up_to_id is not None and not validate_id(up_to_id):
+            emit('error', {'message': 'up_to_id must be a positive integer'})
+            return
         
-        unread_messages = Message.query.filter(
-            Message.conversation_id == conversation_id,
-            Message.sender_id != user_id,
-            Message.is_read == False
-        ).all()
+        other_user_id = authorized_conversation(session, conversation_id)
+        if other_user_id is None:
+            return
         
-        for message in unread_messages:
-            message.is_read = True
-            message.read_at = datetime.utcnow()
+        conversation = db.session.get(Conversation, conversation_id)
+        if not conversation:
+            session.conversations.pop(conversation_id, None)
+            emit('error', {'message': 'Conversation not found'})
+            return
         
+        # One UPDATE ... RETURNING id instead of loading and flipping each row
+        read_ids = conversation.mark_read(user_id, up_to_id)
         db.session.commit()
         
-        if unread_messages:
-            conversation = Conversation.query.get(conversation_id)
-            other_user_id = conversation.participant_id if conversation.initiator_id == user_id else conversation.initiator_id
-            
-            if other_user_id in active_users:
-                emit('messages_read', {'conversation_id': conversation_id, 'read_by': user_id, 'message_ids': [msg.id for msg in unread_messages]}, room=active_users[other_user_id])
+        if read_ids:
+            notify_user(other_user_id, 'messages_read', {'conversation_id': conversation_id, 'read_by': user_id, 'message_ids': read_ids})
         
-        emit('marked_read', {'conversation_id': conversation_id, 'count': len(unread_messages)})
+        emit('marked_read', {'conversation_id': conversation_id, 'count': len(read_ids)})
     except Exception as e:
         print(f'Mark read error: {str(e)}')
         db.session.rollback()
 
 @socketio.on('get_online_users')
 def handle_get_online_users():
-    """Get list of online users"""
-    emit('online_users', {'user_ids': list(active_users.keys())})
+    """Get which of the caller's contacts (people they share a conversation with) are online"""
+    session = current_session()
+    if not session:
+        return
+    user_id = session.user_id
+    contact_ids = {row[0] for row in db.session.query(
+        case((Conversation.initiator_id == user_id, Conversation.participant_id), else_=Conversation.initiator_id)
+    ).filter(or_(Conversation.initiator_id == user_id, Conversation.participant_id == user_id))}
+    emit('online_users', {'user_ids': sorted(get_presence().online_among(contact_ids))})
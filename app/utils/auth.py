@@ -1,20 +1,145 @@
-from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+# Current User Helpers
+# The authenticated user is loaded at most once per request (profile joined
+# in the same SELECT) and kept on flask.g, so resources and decorators that
+# all need it share one query.
+#
+# TOKENS (issue_tokens):
+# - access token: short-lived JWT (JWT_ACCESS_TOKEN_EXPIRES, 15 minutes),
+#   validated purely cryptographically with no per-request lookup
+# - refresh token: opaque, stored hashed, rotated on every use
+#   (app/models/refresh_token.py, POST /api/auth/refresh)
+#
+# TOKEN CLAIMS (added to every access token by the claims loader):
+# - role: the user's role, so role checks need no database access
+# - is_active: whether the account was active when the token was issued
+# - token_version: User.token_version at issue time
+#
+# REVOCATION:
+# revoke_tokens(user) bumps User.token_version and revokes every refresh
+# token of the user, so no new access tokens can be obtained and the
+# current ones run out within JWT_ACCESS_TOKEN_EXPIRES. Long-lived
+# Socket.IO connections check the version once when they authenticate
+# (token_revoked). The current version of each user is cached in the
+# presence store's Redis (or its in-memory stand-in) under
+# auth:token_version:<user_id> for TOKEN_VERSION_CACHE_SECONDS; a cache miss
+# reads the column once and caches it. A lookup racing a logout can cache
+# the old version again, but only until the entry expires.
+#
+# Forced logout of sockets across workers needs REDIS_URL: revoke_tokens
+# drops the shared entry, so every worker sees the new version at once.
+# Without Redis each process caches on its own and the others keep
+# accepting the revoked tokens for up to TOKEN_VERSION_CACHE_SECONDS.
+
+from flask import g, abort, current_app
+from flask_jwt_extended import create_access_token, verify_jwt_in_request, get_jwt_identity, get_jwt
+from sqlalchemy.orm import joinedload
+from app.models.base import db
 from app.models.user import User
+from app.models.refresh_token import RefreshToken
+
+_MISSING = object()
+TOKEN_VERSION_KEY = 'auth:token_version:{}'
+
+def init_auth(app):
+    """Register the JWT claim loaders and reset the current user cache on every request"""
+    from app import jwt
+
+    @jwt.user_identity_loader
+    def user_identity(identity):
+        return identity.id if isinstance(identity, User) else identity
+
+    @jwt.additional_claims_loader
+    def user_claims(identity):
+        user = identity if isinstance(identity, User) else db.session.get(User, identity)
+        return token_claims(user) if user else {}
+
+    # g lives on the app context, which a request reuses if one is already
+    # pushed (e.g. in tests), so it would otherwise leak between requests
+    @app.before_request
+    def reset_current_user():
+        g.pop('_current_user', None)
+
+def token_claims(user):
+    """Extra JWT claims describing user at issue time"""
+    return {'role': user.role, 'is_active': bool(user.is_active), 'token_version': user.token_version or 0}
+
+def _version_store():
+    return current_app.extensions['presence'].client
+
+def current_token_version(user_id):
+    """User's current token version (None if the user no longer exists)"""
+    store = _version_store()
+    key = TOKEN_VERSION_KEY.format(user_id)
+    version = store.get(key)
+    if version is None:
+        version = db.session.query(User.token_version).filter(User.id == user_id).scalar()
+        if version is None:
+            return None
+        store.set(key, version, ex=current_app.config.get('TOKEN_VERSION_CACHE_SECONDS', 30))
+    return int(version)
+
+def token_revoked(claims):
+    """Whether a decoded token was issued before its user's tokens were revoked"""
+    version = current_token_version(claims['sub'])
+    return version is None or claims.get('token_version', 0) != version
+
+def issue_tokens(user):
+    """Access token plus a refresh token starting a new session (does not commit)"""
+    _, refresh_token = RefreshToken.issue(user.id, current_app.config['REFRESH_TOKEN_EXPIRES'])
+    return {'token': create_access_token(identity=user), 'refresh_token': refresh_token}
+
+def revoke_tokens(user):
+    """Sign user out everywhere: revoke all refresh tokens and bump the token version (commits)"""
+    RefreshToken.revoke_for_user(user.id)
+    user.token_version = User.token_version + 1
+    db.session.commit()
+    # Drop the cached version only after the commit, so nothing re-caches the old one
+    _version_store().delete(TOKEN_VERSION_KEY.format(user.id))
+
+def load_current_user():
+    """Authenticated user for this request (or None), loaded once with their profile
+    Call inside a @jwt_required() view
+    """
+    user = g.get('_current_user', _MISSING)
+    if user is _MISSING:
+        user = db.session.get(User, get_jwt_identity(), options=[joinedload(User.profile)])
+        g._current_user = user
+    return user
+
+def current_user_or_404():
+    """Authenticated user for this request, aborting with 404 if the account is gone"""
+    user = load_current_user()
+    if user is None:
+        abort(404)
+    return user
+
+def current_role():
+    """Role of the authenticated user, from the token's claims when present
+    Tokens without claims fall back to the database. Returns None for a
+    missing or deactivated account
+    """
+    claims = get_jwt()
+    if 'role' in claims:
+        return claims['role'] if claims.get('is_active', True) else None
+    user = load_current_user()
+    return user.role if user and user.is_active else None
 
 def get_current_user():
     try:
         verify_jwt_in_request()
-        user_id = get_jwt_identity()
-        return User.query.get(user_id)
+        return load_current_user()
     except:
         return None
 
 def require_roles(roles):
     def decorator(fn):
         def wrapper(*args, **kwargs):
-            current_user = get_current_user()
-            if not current_user or not current_user.profile or current_user.profile.role.value not in roles:
+            try:
+                verify_jwt_in_request()
+            except:
+                return {'error': 'Insufficient permissions'}, 403
+            if current_role() not in roles:
                 return {'error': 'Insufficient permissions'}, 403
             return fn(*args, **kwargs)
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
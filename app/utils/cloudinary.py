@@ -1,10 +1,23 @@
-import cloudinary
-import cloudinary.uploader
+# Cloudinary Helpers
+# The cloudinary SDK is imported and configured on the first upload or
+# delete, not at startup, so workers that never touch images don't pay for it.
+
 from flask import current_app
 
+_configured = False
+
+def _uploader():
+    """cloudinary.uploader, configured from the app config on first use"""
+    global _configured
+    import cloudinary.uploader
+    if not _configured:
+        _configured = init_cloudinary()
+    return cloudinary.uploader
+
 def init_cloudinary():
     """Initialize Cloudinary with error handling"""
     try:
+        import cloudinary
         cloudinary.config(
             cloud_name=current_app.config['CLOUDINARY_CLOUD_NAME'],
             api_key=current_app.config['CLOUDINARY_API_KEY'],
@@ -21,7 +34,7 @@ def upload_image(file, folder="properties"):
         if not current_app.config.get('CLOUDINARY_CLOUD_NAME'):
             return {'error': 'Cloudinary not configured'}
             
-        result = cloudinary.uploader.upload(
+        result = _uploader().upload(
             file,
             folder=folder,
             resource_type="image",
@@ -44,7 +57,7 @@ def delete_image(public_id):
         if not current_app.config.get('CLOUDINARY_CLOUD_NAME'):
             return False
             
-        result = cloudinary.uploader.destroy(public_id)
+        result = _uploader().destroy(public_id)
         return result.get('result') == 'ok'
     except Exception as e:
         current_app.logger.error(f"Cloudinary delete error: {e}")
@@ -2,8 +2,6 @@
 # Handles image uploads with resizing and optimization
 
 import os
-import cloudinary
-import cloudinary.uploader
 
 class CloudinaryService:
     """
@@ -11,12 +9,22 @@ class CloudinaryService:
     """
     
     def __init__(self):
-        # Configure Cloudinary with credentials from environment
-        cloudinary.config(
-            cloud_name=os.environ.get('CLOUDINARY_CLOUD_NAME'),
-            api_key=os.environ.get('CLOUDINARY_API_KEY'),
-            api_secret=os.environ.get('CLOUDINARY_API_SECRET')
-        )
+        self._uploader = None
+    
+    @property
+    def uploader(self):
+        """cloudinary.uploader, imported and configured on first use (not at import time)"""
+        if self._uploader is None:
+            import cloudinary
+            import cloudinary.uploader
+            # Configure Cloudinary with credentials from environment
+            cloudinary.config(
+                cloud_name=os.environ.get('CLOUDINARY_CLOUD_NAME'),
+                api_key=os.environ.get('CLOUDINARY_API_KEY'),
+                api_secret=os.environ.get('CLOUDINARY_API_SECRET')
+            )
+            self._uploader = cloudinary.uploader
+        return self._uploader
         
     def is_configured(self):
         """Check if Cloudinary is properly configured"""
@@ -54,7 +62,7 @@ class CloudinaryService:
             if public_id:
                 upload_options['public_id'] = public_id
             
-            result = cloudinary.uploader.upload(image_file, **upload_options)
+            result = self.uploader.upload(image_file, **upload_options)
             
             return {
                 'url': result.get('secure_url'),
@@ -120,7 +128,7 @@ class CloudinaryService:
             return False
         
         try:
-            result = cloudinary.uploader.destroy(public_id)
+            result = self.uploader.destroy(public_id)
             return result.get('result') == 'ok'
         except Exception as e:
             print(f"Error deleting image: {str(e)}")
@@ -0,0 +1,73 @@
+# CORS Policy
+# Everything about CORS_ORIGINS is worked out once when the app is created:
+# exact origins go into a set and wildcard origins into one compiled regex,
+# and the static response headers are built up front. Each response then
+# costs one set lookup (or one regex match) and a few dict copies.
+#
+# CORS_ORIGINS ENTRIES:
+# - "*": any origin
+# - "https://app.example.com": exact match
+# - "https://landlord-app-*.vercel.app": "*" matches within one DNS label
+#   (letters, digits and dashes), for Vercel preview deployments
+#
+# PREFLIGHT:
+# Flask answers OPTIONS for every route itself; the policy only adds the
+# headers, including Access-Control-Max-Age (CORS_MAX_AGE) so browsers cache
+# the preflight instead of sending an OPTIONS before every API call.
+#
+# The allowed origin is echoed back (never "*") because responses allow
+# credentials, and Vary: Origin keeps shared caches from mixing them up.
+
+import re
+from flask import request, current_app
+
+class CorsPolicy:
+    """Precompiled origin matcher plus the headers to attach for allowed origins"""
+    def __init__(self, origins, methods, headers, max_age):
+        origins = [origin.strip().rstrip('/') for origin in origins if origin.strip()]
+        self.allow_any = '*' in origins
+        self.exact = frozenset(origin.lower() for origin in origins if '*' not in origin)
+        patterns = [re.escape(origin).replace(r'\*', '[a-z0-9-]+') for origin in origins
+                    if '*' in origin and origin != '*']
+        self.pattern = re.compile('(?:%s)' % '|'.join(patterns), re.IGNORECASE) if patterns else None
+
+        self.headers = {'Access-Control-Allow-Credentials': 'true'}
+        self.preflight_headers = dict(self.headers, **{
+            'Access-Control-Allow-Methods': ', '.join(methods),
+            'Access-Control-Allow-Headers': ', '.join(headers),
+            'Access-Control-Max-Age': str(max_age)
+        })
+
+    def allows(self, origin):
+        if not origin:
+            return False
+        if self.allow_any or origin.lower() in self.exact:
+            return True
+        return bool(self.pattern and self.pattern.fullmatch(origin))
+
+    def apply(self, response):
+        """Attach CORS headers to response for the current request"""
+        response.vary.add('Origin')
+        origin = request.headers.get('Origin')
+        if not self.allows(origin):
+            return response
+
+        preflight = request.method == 'OPTIONS' and 'Access-Control-Request-Method' in request.headers
+        response.headers.update(self.preflight_headers if preflight else self.headers)
+        response.headers['Access-Control-Allow-Origin'] = origin
+        return response
+
+def init_cors(app):
+    """Build the policy from config and attach it to every response"""
+    policy = CorsPolicy(
+        app.config.get('CORS_ORIGINS', ['*']),
+        methods=('GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'),
+        headers=('Content-Type', 'Authorization'),
+        max_age=app.config.get('CORS_MAX_AGE', 7200)
+    )
+    app.extensions['cors_policy'] = policy
+    app.after_request(_apply_cors)
+    return policy
+
+def _apply_cors(response):
+    return current_app.extensions['cors_policy'].apply(response)
@@ -1,10 +1,16 @@
 # Role-Based Access Control (RBAC) Decorators
 # These decorators protect routes and ensure only authorized users can access them
+# Roles come from the access token's role claim, so checks normally need no
+# database access; older tokens fall back to the request-scoped current user
+# (see app/utils/auth.py), which the view can then reuse for free
 
 from functools import wraps
-from flask_jwt_extended import get_jwt_identity
 from flask import jsonify
-from app.models.user import User, UserRole
+from app.models.user import UserRole
+from app.utils.auth import current_role
+
+def _role_value(role):
+    return role.value if isinstance(role, UserRole) else role
 
 def role_required(*allowed_roles):
     """
@@ -14,19 +20,17 @@ def role_required(*allowed_roles):
     Args:
         allowed_roles: One or more UserRole enum values
     """
+    allowed_values = {_role_value(role) for role in allowed_roles}
+    
     def decorator(fn):
         @wraps(fn)
         def wrapper(*args, **kwargs):
-            # Get current user ID from JWT token
-            user_id = get_jwt_identity()
-            user = User.query.get(user_id)
-            
-            # Check if user exists and has a profile
-            if not user or not user.profile:
+            role = current_role()
+            if role is None:
                 return jsonify({'error': 'User not found or profile incomplete'}), 404
             
             # Check if user's role is in the allowed roles
-            if user.profile.role not in allowed_roles:
+            if role not in allowed_values:
                 return jsonify({'error': 'Access denied. Insufficient permissions'}), 403
             
             # User has permission, proceed with the request
@@ -41,13 +45,11 @@ def admin_required(fn):
     """
     @wraps(fn)
     def wrapper(*args, **kwargs):
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user or not user.profile:
+        role = current_role()
+        if role is None:
             return jsonify({'error': 'User not found'}), 404
         
-        if user.profile.role != UserRole.ADMIN:
+        if role != UserRole.ADMIN.value:
             return jsonify({'error': 'Admin access required'}), 403
         
         return fn(*args, **kwargs)
@@ -60,13 +62,11 @@ def landlord_required(fn):
     """
     @wraps(fn)
     def wrapper(*args, **kwargs):
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user or not user.profile:
+        role = current_role()
+        if role is None:
             return jsonify({'error': 'User not found'}), 404
         
-        if user.profile.role != UserRole.LANDLORD:
+        if role != UserRole.LANDLORD.value:
             return jsonify({'error': 'Landlord access required'}), 403
         
         return fn(*args, **kwargs)
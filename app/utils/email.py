@@ -38,11 +38,8 @@ def send_welcome_email(user):
     """
     return send_email(user.email, subject, html_content)
 
-def send_payment_confirmation(payment):
-    """Send payment confirmation email"""
-    if not current_app.config.get('SENDGRID_API_KEY'):
-        return False
-        
+def build_payment_confirmation(payment):
+    """Build (to_email, subject, html_content) for a payment confirmation"""
     subject = "Payment Confirmation"
     html_content = f"""
     <h2>Payment Confirmed</h2>
@@ -51,4 +48,23 @@ def send_payment_confirmation(payment):
     <p>Date: {payment.payment_date.strftime('%Y-%m-%d')}</p>
     <p>Reference: {payment.reference}</p>
     """
-    return send_email(payment.tenant.email, subject, html_content)
\ No newline at end of file
+    return payment.tenant.email, subject, html_content
+
+def send_payment_confirmation(payment):
+    """Send payment confirmation email"""
+    if not current_app.config.get('SENDGRID_API_KEY'):
+        return False
+        
+    return send_email(*build_payment_confirmation(payment))
+
+def queue_payment_confirmation(payment):
+    """Queue payment confirmation in the email outbox
+    Call before committing the payment change so the email is queued in the
+    same transaction; the outbox worker sends it (see app/utils/email_outbox.py)
+    """
+    if not current_app.config.get('SENDGRID_API_KEY'):
+        return False
+    
+    from app.models.outbox import EmailOutbox
+    EmailOutbox.enqueue(*build_payment_confirmation(payment))
+    return True
\ No newline at end of file
@@ -0,0 +1,93 @@
+# Email Outbox Worker
+# Drains the email_outbox table in batches so request handlers only insert a
+# row and return; SendGrid latency or outages never sit on the request path.
+#
+# RUNNING:
+# - In the web process: a background thread started when serving
+#   (python run.py, or gunicorn via gunicorn.conf.py) and EMAIL_OUTBOX_WORKER
+#   is enabled (default). Importing run.py (flask db upgrade, scripts) does
+#   not start it
+# - As a separate process: python email_worker.py (set EMAIL_OUTBOX_WORKER=false
+#   on the web service)
+#
+# CLAIMING:
+# Each batch is claimed in a short transaction that leases the rows
+# (EmailOutbox.lease) and commits, so no row locks are held while SendGrid is
+# called. On PostgreSQL the claim uses SELECT ... FOR UPDATE SKIP LOCKED, so
+# several workers can run at once without claiming the same email. Every
+# email's outcome is committed as soon as it is sent, so a crash mid-batch
+# re-sends at most the email that was in flight.
+
+import threading
+from datetime import datetime
+from flask import current_app
+from app import db
+from app.models.outbox import EmailOutbox
+from app.utils.email import send_email
+
+def claim_batch(batch_size):
+    """Lease up to batch_size due emails to this worker (commits)"""
+    batch = EmailOutbox.query.filter(
+        EmailOutbox.status == 'pending',
+        EmailOutbox.next_attempt_at <= datetime.utcnow()
+    ).order_by(EmailOutbox.id).limit(batch_size).with_for_update(skip_locked=True).all()
+
+    for email in batch:
+        email.lease(EmailOutbox.LEASE_SECONDS)
+    db.session.commit()  # Releases the row locks before anything is sent
+    return batch
+
+def drain_outbox(batch_size=None):
+    """
+    Send one batch of due emails and record the outcome of each
+
+    Args:
+        batch_size: Maximum emails to claim (default EMAIL_OUTBOX_BATCH_SIZE)
+
+    Returns:
+        Number of emails attempted
+    """
+    batch = claim_batch(batch_size or current_app.config.get('EMAIL_OUTBOX_BATCH_SIZE', 50))
+
+    for email in batch:
+        if send_email(email.to_email, email.subject, email.html_content):
+            email.mark_sent()
+        else:
+            email.mark_failed('Email provider rejected the message or was unreachable')
+        db.session.commit()
+
+    return len(batch)
+
+class OutboxWorker(threading.Thread):
+    """Background thread that drains the outbox until stopped"""
+    def __init__(self, app):
+        super().__init__(name='email-outbox-worker', daemon=True)
+        self.app = app
+        self.poll_interval = app.config.get('EMAIL_OUTBOX_POLL_SECONDS', 2)
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            sent = 0
+            with self.app.app_context():
+                try:
+                    sent = drain_outbox()
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.error(f"Email outbox drain failed: {str(e)}")
+                finally:
+                    db.session.remove()
+            # Keep draining while batches come back full; otherwise wait for new mail
+            if not sent:
+                self._stopped.wait(self.poll_interval)
+
+    def stop(self):
+        self._stopped.set()
+
+def start_outbox_worker(app):
+    """Start a background outbox worker for this process if enabled"""
+    if not app.config.get('EMAIL_OUTBOX_WORKER'):
+        return None
+    worker = OutboxWorker(app)
+    worker.start()
+    return worker
@@ -2,8 +2,6 @@
 # Handles all email notifications including verification emails
 
 import os
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail, Email, To, Content
 
 class EmailService:
     """
@@ -33,6 +31,10 @@ class EmailService:
             return False
         
         try:
+            # Imported on first send so startup doesn't load the SendGrid SDK
+            from sendgrid import SendGridAPIClient
+            from sendgrid.helpers.mail import Mail
+            
             # Create email message
             message = Mail(
                 from_email=self.from_email,
@@ -9,6 +9,9 @@ class AuthError:
     ACCOUNT_DISABLED = "ACCOUNT_DISABLED"
     SERVER_ERROR = "SERVER_ERROR"
     DATABASE_ERROR = "DATABASE_ERROR"
+    SERVER_BUSY = "SERVER_BUSY"
+    RATE_LIMITED = "RATE_LIMITED"
+    INVALID_TOKEN = "INVALID_TOKEN"
 
 def create_error_response(message, code, status_code=400):
     """Create standardized error response"""
@@ -0,0 +1,257 @@
+# Write-Behind Chat Messages
+# Optional mode (CHAT_WRITE_BEHIND=true) for the send_message socket event:
+# instead of one transaction per message, messages are journaled to local
+# disk, broadcast straight away, and inserted in micro-batches.
+#
+# FLOW:
+# 1. enqueue(): assign client_uid + created_at, append the message to this
+#    process's journal (CHAT_JOURNAL_DIR/journal-<pid>.jsonl) and fsync
+# 2. The handler broadcasts new_message (id is null, client_uid set)
+# 3. Every CHAT_FLUSH_INTERVAL seconds (or CHAT_FLUSH_BATCH messages) flush()
+#    bulk-inserts the batch, updates each conversation's counters and preview
+#    once, commits, then drops the batch from the journal
+# 4. 'message_persisted' {conversation_id, client_uid, id} is emitted to the
+#    conversation room so clients learn the database id
+#
+# DURABILITY:
+# - A message is broadcast only after its journal append is fsynced, so a
+#   process crash loses nothing the clients have seen; recover() replays
+#   journals of dead processes on startup
+# - client_uid is unique in chat_messages, so replaying a batch that was
+#   committed but not yet dropped from the journal (crash between the two)
+#   inserts nothing twice
+# - Losing the node's disk loses messages not yet flushed (at most one
+#   flush interval); keep write-behind off where that is unacceptable
+# - REST history, unread counters and ?since= sync see a message once it
+#   is flushed, up to CHAT_FLUSH_INTERVAL after the broadcast
+# - Messages for a conversation deleted before their flush are dropped
+#   (and logged) rather than retried, so they can't block later batches
+
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from flask import current_app
+from app import db, socketio
+from app.models import Conversation, Message
+
+class MessageJournal:
+    """Append-only JSON-lines file of messages not yet in the database"""
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def append(self, record):
+        with open(self.path, 'a', encoding='utf-8') as journal:
+            journal.write(json.dumps(record) + '\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+
+    def read(self):
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break  # Torn final write from a crash mid-append; never acknowledged
+        return records
+
+    def rewrite(self, records):
+        """Atomically replace the journal with records (empty list removes it)"""
+        if not records:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as journal:
+            journal.writelines(json.dumps(record) + '\n' for record in records)
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(temp_path, self.path)
+
+def persist_messages(records):
+    """Insert journaled messages and update their conversations in one transaction
+    Records whose client_uid is already stored are skipped, so replays are safe.
+
+    Returns:
+        List of (record, message_id) for the messages inserted
+    """
+    if not records:
+        return []
+    existing = set(db.session.scalars(
+        db.select(Message.client_uid).where(Message.client_uid.in_([r['client_uid'] for r in records]))
+    ))
+    new_records = [r for r in records if r['client_uid'] not in existing]
+    if not new_records:
+        return []
+
+    initiators = dict(db.session.execute(
+        db.select(Conversation.id, Conversation.initiator_id)
+        .where(Conversation.id.in_({r['conversation_id'] for r in new_records}))
+    ).all())
+    orphaned = [r for r in new_records if r['conversation_id'] not in initiators]
+    if orphaned:
+        # Conversation deleted since the message was queued; retrying can never succeed
+        deleted = sorted({r['conversation_id'] for r in orphaned})
+        current_app.logger.warning(f"Dropped {len(orphaned)} chat messages for deleted conversations {deleted}")
+        new_records = [r for r in new_records if r['conversation_id'] in initiators]
+        if not new_records:
+            return []
+
+    rows = [{
+        'client_uid': r['client_uid'],
+        'conversation_id': r['conversation_id'],
+        'sender_id': r['sender_id'],
+        'content': r['content'],
+        'is_read': False,
+        'created_at': datetime.fromisoformat(r['created_at']),
+        'updated_at': datetime.fromisoformat(r['created_at'])
+    } for r in new_records]
+    inserted = db.session.execute(insert(Message).returning(Message.client_uid, Message.id), rows).all()
+    ids = dict(inserted)
+
+    # One counter/preview UPDATE per conversation in the batch
+    conversation_ids = {r['conversation_id'] for r in new_records}
+    for conversation_id in conversation_ids:
+        batch = [r for r in new_records if r['conversation_id'] == conversation_id]
+        # Messages from the initiator are unread by the participant and vice versa
+        from_initiator = sum(r['sender_id'] == initiators[conversation_id] for r in batch)
+        last = max(batch, key=lambda r: r['created_at'])
+        db.session.execute(update(Conversation).where(Conversation.id == conversation_id).values(
+            message_count=Conversation.message_count + len(batch),
+            participant_unread_count=Conversation.participant_unread_count + from_initiator,
+            initiator_unread_count=Conversation.initiator_unread_count + (len(batch) - from_initiator),
+            last_message=last['content'],
+            last_message_at=datetime.fromisoformat(last['created_at'])
+        ))
+    db.session.commit()
+    return [(r, ids[r['client_uid']]) for r in new_records]
+
+class WriteBehindBuffer:
+    """Journals, buffers and batch-persists socket chat messages for one process"""
+    def __init__(self, app):
+        self.app = app
+        self.journal_dir = app.config.get('CHAT_JOURNAL_DIR') or os.path.join(app.instance_path, 'chat_journal')
+        self.journal = MessageJournal(os.path.join(self.journal_dir, f'journal-{os.getpid()}.jsonl'))
+        self.flush_interval = app.config.get('CHAT_FLUSH_INTERVAL', 0.2)
+        self.batch_size = app.config.get('CHAT_FLUSH_BATCH', 200)
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher_started = False
+
+    def enqueue(self, conversation_id, sender_id, content):
+        """Durably journal a message and queue it for the next flush; returns the record"""
+        record = {
+            'client_uid': uuid.uuid4().hex,
+            'conversation_id': conversation_id,
+            'sender_id': sender_id,
+            'content': content,
+            'created_at': datetime.utcnow().isoformat()
+        }
+        with self._lock:
+            self.journal.append(record)
+            self._pending.append(record)
+            full = len(self._pending) >= self.batch_size
+        self._start_flusher()
+        if full:
+            socketio.start_background_task(self.flush)
+        return record
+
+    def flush(self):
+        """Persist everything queued so far; returns the number of messages inserted"""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending)
+            if not batch:
+                return 0
+            with self.app.app_context():
+                try:
+                    persisted = persist_messages(batch)
+                except Exception:
+                    db.session.rollback()
+                    raise  # Batch stays queued and journaled; retried next flush
+                finally:
+                    db.session.remove()
+            with self._lock:
+                del self._pending[:len(batch)]
+                self.journal.rewrite(self._pending)
+            for record, message_id in persisted:
+                socketio.emit('message_persisted', {
+                    'conversation_id': record['conversation_id'],
+                    'client_uid': record['client_uid'],
+                    'id': message_id
+                }, room=f"conversation_{record['conversation_id']}")
+            return len(persisted)
+
+    def recover(self):
+        """Persist messages left in journals by processes that are no longer running"""
+        recovered = 0
+        if not os.path.isdir(self.journal_dir):
+            return recovered
+        for name in sorted(os.listdir(self.journal_dir)):
+            if not (name.startswith('journal-') and name.endswith('.jsonl')):
+                continue
+            try:
+                pid = int(name[len('journal-'):-len('.jsonl')])
+            except ValueError:
+                continue  # Not one of ours (e.g. a copied backup)
+            if pid != os.getpid() and _process_alive(pid):
+                continue  # Another live worker owns it
+            journal = MessageJournal(os.path.join(self.journal_dir, name))
+            with self.app.app_context():
+                try:
+                    recovered += len(persist_messages(journal.read()))
+                except IntegrityError:
+                    db.session.rollback()  # Another process replayed it concurrently
+                finally:
+                    db.session.remove()
+            if journal.path != self.journal.path:
+                journal.rewrite([])
+            else:
+                with self._lock:
+                    journal.rewrite(self._pending)
+        return recovered
+
+    def _start_flusher(self):
+        if not self._flusher_started:
+            self._flusher_started = True
+            socketio.start_background_task(self._flush_loop)
+
+    def _flush_loop(self):
+        while True:
+            socketio.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                self.app.logger.error(f"Chat write-behind flush failed: {str(e)}")
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def init_message_buffer(app):
+    """Create the write-behind buffer if CHAT_WRITE_BEHIND is on and replay leftover journals"""
+    if not app.config.get('CHAT_WRITE_BEHIND'):
+        return None
+    buffer = WriteBehindBuffer(app)
+    try:
+        recovered = buffer.recover()
+        if recovered:
+            app.logger.warning(f"Recovered {recovered} journaled chat messages")
+    except Exception as e:
+        # Journals stay on disk; the next process start retries
+        app.logger.error(f"Chat journal recovery failed: {str(e)}")
+    app.extensions['message_buffer'] = buffer
+    return buffer
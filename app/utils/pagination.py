@@ -1,7 +1,11 @@
 # Pagination Utility
 # Provides consistent pagination across all list endpoints
 
+import base64
+import json
+from datetime import datetime
 from flask import request
+from sqlalchemy import and_, or_, true
 
 def paginate_query(query, schema):
     """
@@ -61,3 +65,174 @@ def get_pagination_params():
     per_page = min(max(1, per_page), 100)  # Between 1 and 100
     
     return page, per_page
+
+# ----------------------------------------------------------------------------
+# Cursor (keyset) pagination
+# ----------------------------------------------------------------------------
+# Offset pagination gets slower the deeper the page because the database still
+# has to walk every skipped row. Keyset pagination instead remembers the sort
+# key of the last row returned and asks for rows strictly after it, so every
+# page is a bounded index range scan regardless of how far the client scrolls.
+#
+# CONTRACT (shared by every list endpoint that adopts it):
+# - Request:  ?limit=20&cursor=<opaque string from previous response>
+# - Response: {"<items>": [...], "pagination": {"limit": 20,
+#              "next_cursor": "...", "has_more": true}}
+# - Rows are ordered newest first by (created_at, id)
+
+DEFAULT_CURSOR_LIMIT = 20
+MAX_CURSOR_LIMIT = 100
+
+class InvalidCursorError(ValueError):
+    """Raised when a client sends a cursor we did not issue"""
+
+def encode_cursor(created_at, row_id):
+    """
+    Encode the sort key of a row into an opaque, URL-safe cursor string
+
+    Args:
+        created_at: Row creation timestamp
+        row_id: Row primary key (tie-breaker for identical timestamps)
+
+    Returns:
+        Cursor string
+    """
+    payload = json.dumps([created_at.isoformat() if created_at else None, row_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor
+
+    Args:
+        cursor: Cursor string from the client
+
+    Returns:
+        Tuple of (created_at, row_id)
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return (datetime.fromisoformat(created_at) if created_at else None), int(row_id)
+    except (ValueError, TypeError):
+        raise InvalidCursorError('Invalid pagination cursor')
+
+def get_cursor_params():
+    """
+    Extract and validate cursor pagination parameters from request
+
+    Returns:
+        Tuple of (cursor, limit) where cursor is the decoded (created_at, id)
+        tuple or None for the first page
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed
+    """
+    limit = get_limit_param()
+    cursor = request.args.get('cursor')
+    return (decode_cursor(cursor) if cursor else None), limit
+
+def get_limit_param(default=DEFAULT_CURSOR_LIMIT, maximum=MAX_CURSOR_LIMIT):
+    """
+    Read the ?limit= query parameter
+
+    Returns:
+        Integer between 1 and maximum
+    """
+    limit = request.args.get('limit', default, type=int)
+    return min(max(1, limit), maximum)
+
+def keyset_paginate(query, model, cursor=None, limit=DEFAULT_CURSOR_LIMIT):
+    """
+    Apply keyset pagination on (created_at, id) to a SQLAlchemy query
+
+    Args:
+        query: SQLAlchemy query over model (filters already applied)
+        model: Mapped class with created_at and id columns
+        cursor: Decoded cursor tuple from get_cursor_params, or None
+        limit: Maximum number of rows to return
+
+    Returns:
+        Tuple of (items, pagination metadata dict)
+    """
+    if cursor:
+        created_at, row_id = cursor
+        # Rows strictly "older" than the cursor in (created_at DESC, id DESC) order
+        query = query.filter(or_(
+            model.created_at < created_at,
+            and_(model.created_at == created_at, model.id < row_id)
+        ))
+
+    # Fetch one extra row to learn whether another page exists without a COUNT
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    items = rows[:limit]
+
+    next_cursor = None
+    if has_more:
+        last = items[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+
+    return items, {
+        'limit': limit,
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    }
+
+
+# ----------------------------------------------------------------------------
+# Anchored windows (chat history)
+# ----------------------------------------------------------------------------
+# Chat clients page relative to a message they already hold rather than an
+# opaque cursor: ?before_id= scrolls back through history, ?after_id= catches
+# up on newer messages. Both are keyset ranges on a (timestamp, id) pair, so
+# each request is one bounded index range scan.
+
+def _key_greater(key, values):
+    (column, id_column), (value, row_id) = key, values
+    if value is None:
+        # Anchor before every row: the sync token of an empty conversation
+        return true()
+    return or_(column > value, and_(column == value, id_column > row_id))
+
+def _key_less(key, values):
+    (column, id_column), (value, row_id) = key, values
+    return or_(column < value, and_(column == value, id_column < row_id))
+
+def keyset_window(query, key, before=None, after=None, limit=DEFAULT_CURSOR_LIMIT):
+    """
+    Return up to limit rows next to an anchor, in ascending key order
+
+    Args:
+        query: SQLAlchemy query (filters already applied)
+        key: (column, id_column) pair the window is ordered by,
+             e.g. (Message.created_at, Message.id)
+        before: (value, id) anchor; return the rows just before it
+        after: (value, id) anchor; return the rows just after it
+               ((None, 0) means from the first row)
+        limit: Maximum number of rows to return
+
+    With no anchor the newest rows are returned.
+
+    Returns:
+        Tuple of (items, has_more) where has_more says whether more rows exist
+        beyond the window in the direction being paged
+    """
+    column, id_column = key
+    if after is not None:
+        query = query.filter(_key_greater(key, after)).order_by(column.asc(), id_column.asc())
+    else:
+        if before is not None:
+            query = query.filter(_key_less(key, before))
+        query = query.order_by(column.desc(), id_column.desc())
+
+    # Fetch one extra row to learn whether another page exists without a COUNT
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    items = rows[:limit]
+    if after is None:
+        items.reverse()  # Fetched newest first; return oldest first
+    return items, has_more
@@ -0,0 +1,142 @@
+# Password Hashing
+# One algorithm for every password: bcrypt with BCRYPT_LOG_ROUNDS rounds.
+# Hashing is deliberately slow (~0.25s at 12 rounds), so it never runs on
+# the calling thread:
+#
+# - eventlet (production gunicorn worker): each hash runs on eventlet's OS
+#   thread pool (tpool), so the event loop keeps serving chat sockets while
+#   a login is being checked
+# - threads (flask run, tests, scripts): a dedicated ThreadPoolExecutor
+#
+# Either way at most PASSWORD_HASH_WORKERS hashes run at once (0 hashes on
+# the calling thread, as before the pool existed); extra callers
+# wait in line, and past PASSWORD_HASH_MAX_QUEUE waiting callers new ones
+# are turned away with PasswordHasherBusy (the login endpoint answers 503).
+#
+# MIGRATION:
+# Hashes made before bcrypt (werkzeug's pbkdf2/scrypt) or with a different
+# number of rounds still verify; needs_rehash() reports them so the login
+# endpoint can store a fresh hash while it has the plain password.
+#
+# METRICS (get_password_hasher().metrics()):
+# {'waiting': 0, 'active': 1, 'max_waiting': 6, 'completed': 240,
+#  'rejected': 0, 'avg_wait_ms': 3.1}
+
+import base64
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from flask import current_app
+from werkzeug.security import check_password_hash
+
+BCRYPT_PREFIXES = ('$2a$', '$2b$', '$2y$')
+
+class PasswordHasherBusy(Exception):
+    """Too many callers are already waiting for a hashing slot"""
+
+def _password_bytes(password):
+    """bcrypt only reads 72 bytes; longer passwords are pre-hashed so every byte counts"""
+    data = password.encode('utf-8')
+    if len(data) > 72:
+        data = base64.b64encode(hashlib.sha256(data).digest())
+    return data
+
+def _bcrypt_hash(password, rounds):
+    return bcrypt.hashpw(_password_bytes(password), bcrypt.gensalt(rounds)).decode('ascii')
+
+def _verify(password_hash, password):
+    if password_hash.startswith(BCRYPT_PREFIXES):
+        return bcrypt.checkpw(_password_bytes(password), password_hash.encode('ascii'))
+    return check_password_hash(password_hash, password)  # Legacy werkzeug hash
+
+def _green_threads():
+    """Whether eventlet has monkey-patched threading (gunicorn eventlet worker)"""
+    try:
+        from eventlet import patcher
+    except ImportError:
+        return False
+    return patcher.is_monkey_patched('thread')
+
+class PasswordHasher:
+    """Bounded pool that hashes and verifies passwords off the calling thread"""
+    def __init__(self, rounds=12, workers=4, max_queue=64):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_queue = max_queue
+        self._slots = threading.BoundedSemaphore(workers) if workers else None
+        self._lock = threading.Lock()
+        self._executor = None
+        self._stats = {'waiting': 0, 'active': 0, 'max_waiting': 0, 'completed': 0,
+                       'rejected': 0, 'wait_seconds': 0.0}
+
+    def hash(self, password):
+        return self._run(_bcrypt_hash, password, self.rounds)
+
+    def verify(self, password_hash, password):
+        if not password_hash:
+            return False
+        return self._run(_verify, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Whether password_hash uses another algorithm or number of rounds"""
+        if not password_hash.startswith(BCRYPT_PREFIXES):
+            return True
+        return int(password_hash.split('$')[2]) != self.rounds
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+        wait_seconds = stats.pop('wait_seconds')
+        stats['avg_wait_ms'] = round(wait_seconds / stats['completed'] * 1000, 1) if stats['completed'] else 0.0
+        return stats
+
+    def _run(self, fn, *args):
+        stats = self._stats
+        if self._slots is None:
+            with self._lock:
+                stats['completed'] += 1
+            return fn(*args)
+        with self._lock:
+            if stats['waiting'] >= self.max_queue:
+                stats['rejected'] += 1
+                raise PasswordHasherBusy('Too many password checks in progress')
+            stats['waiting'] += 1
+            stats['max_waiting'] = max(stats['max_waiting'], stats['waiting'])
+
+        queued_at = time.monotonic()
+        with self._slots:
+            with self._lock:
+                stats['waiting'] -= 1
+                stats['active'] += 1
+                stats['wait_seconds'] += time.monotonic() - queued_at
+            try:
+                return self._execute(fn, *args)
+            finally:
+                with self._lock:
+                    stats['active'] -= 1
+                    stats['completed'] += 1
+
+    def _execute(self, fn, *args):
+        if _green_threads():
+            from eventlet import tpool
+            return tpool.execute(fn, *args)  # Real OS thread; only this greenlet waits
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                        thread_name_prefix='password-hash')
+        return self._executor.submit(fn, *args).result()
+
+def init_password_hasher(app):
+    app.extensions['password_hasher'] = PasswordHasher(
+        rounds=app.config.get('BCRYPT_LOG_ROUNDS', 12),
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 4),
+        max_queue=app.config.get('PASSWORD_HASH_MAX_QUEUE', 64)
+    )
+    return app.extensions['password_hasher']
+
+def get_password_hasher():
+    """The current app's password hasher"""
+    return current_app.extensions['password_hasher']
@@ -1,5 +1,9 @@
 from datetime import date, timedelta
+from sqlalchemy import func
+from app import db
 from app.models.payment import Payment, PaymentStatus
+from app.models.property import Property
+from app.models.stats import LandlordMonthlyStats
 
 def get_overdue_payments():
     """Get all overdue payments that are still pending"""
@@ -32,20 +36,40 @@ def calculate_total_revenue(landlord_id, start_date, end_date):
     return total_revenue
 
 def get_payment_statistics(landlord_id=None, tenant_id=None):
-    """Get payment statistics for landlord or tenant"""
+    """Get payment statistics for landlord or tenant
+    Landlord figures are read from the monthly rollup (one row per month)
+    instead of scanning the payments table
+    """
+    if landlord_id and not tenant_id:
+        totals = db.session.query(
+            func.coalesce(func.sum(LandlordMonthlyStats.completed_count), 0),
+            func.coalesce(func.sum(LandlordMonthlyStats.pending_count), 0),
+            func.coalesce(func.sum(LandlordMonthlyStats.failed_count), 0),
+            func.coalesce(func.sum(LandlordMonthlyStats.cancelled_count), 0),
+            func.coalesce(func.sum(LandlordMonthlyStats.completed_total), 0)
+        ).filter(LandlordMonthlyStats.landlord_id == landlord_id).one()
+        completed, pending, failed, cancelled, total_amount = totals
+        return {
+            'total_payments': int(completed + pending + failed + cancelled),
+            'completed': int(completed),
+            'pending': int(pending),
+            'failed': int(failed),
+            'total_revenue': float(total_amount)
+        }
+    
     query = Payment.query
     
     if landlord_id:
-        query = query.filter_by(landlord_id=landlord_id)
+        query = query.join(Property).filter(Property.landlord_id == landlord_id)
     if tenant_id:
-        query = query.filter_by(tenant_id=tenant_id)
+        query = query.filter(Payment.tenant_id == tenant_id)
     
     total_payments = query.count()
-    completed_payments = query.filter_by(status=PaymentStatus.COMPLETED).count()
-    pending_payments = query.filter_by(status=PaymentStatus.PENDING).count()
-    failed_payments = query.filter_by(status=PaymentStatus.FAILED).count()
+    completed_payments = query.filter(Payment.status == PaymentStatus.COMPLETED).count()
+    pending_payments = query.filter(Payment.status == PaymentStatus.PENDING).count()
+    failed_payments = query.filter(Payment.status == PaymentStatus.FAILED).count()
     
-    total_amount = sum(float(p.amount) for p in query.filter_by(status=PaymentStatus.COMPLETED).all())
+    total_amount = sum(float(p.amount) for p in query.filter(Payment.status == PaymentStatus.COMPLETED).all())
     
     return {
         'total_payments': total_payments,
@@ -1,7 +1,83 @@
+# M-Pesa Daraja Client
+# STK Push integration shared by every request in the process.
+#
+# CONNECTIONS:
+# - One pooled requests.Session (keep-alive) reused for all Daraja calls
+# - Connect/read timeouts so a slow Daraja can't hold a worker indefinitely
+#
+# ACCESS TOKENS:
+# - OAuth tokens are cached process-wide until shortly before they expire,
+#   so an STK push costs one outbound call instead of two
+# - Refresh is single-flight: concurrent requests wait for one fetch
+#   instead of all calling /oauth/v1/generate
+#
+# METRICS:
+# - get_daraja_metrics() returns call counts, errors and latency per endpoint
+
 import requests
 import base64
+import threading
+import time
 from datetime import datetime
 from flask import current_app
+from requests.adapters import HTTPAdapter
+
+DARAJA_TIMEOUT = (3.05, 15)  # (connect, read) seconds
+TOKEN_REFRESH_MARGIN = 60  # Refresh this many seconds before the token expires
+POOL_SIZE = 10
+
+_session = None
+_session_lock = threading.Lock()
+_token_cache = {}  # (base_url, consumer_key) -> (token, expires_at)
+_token_lock = threading.Lock()
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+def get_session():
+    """Process-wide pooled session for Daraja calls"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+def _record_call(endpoint, elapsed, ok):
+    with _metrics_lock:
+        stats = _metrics.setdefault(endpoint, {'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        stats['calls'] += 1
+        stats['errors'] += not ok
+        stats['total_ms'] += elapsed * 1000
+        stats['max_ms'] = max(stats['max_ms'], elapsed * 1000)
+
+def get_daraja_metrics():
+    """Call counts, errors and latency (ms) per Daraja endpoint"""
+    with _metrics_lock:
+        return {
+            endpoint: {
+                'calls': stats['calls'],
+                'errors': stats['errors'],
+                'avg_ms': round(stats['total_ms'] / stats['calls'], 1),
+                'max_ms': round(stats['max_ms'], 1)
+            }
+            for endpoint, stats in _metrics.items()
+        }
+
+def reset_daraja_client():
+    """Drop the cached token, pooled session and metrics (tests, credential rotation)"""
+    global _session
+    with _token_lock:
+        _token_cache.clear()
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+    with _metrics_lock:
+        _metrics.clear()
 
 class MPesaService:
     def __init__(self):
@@ -11,22 +87,60 @@ class MPesaService:
         self.passkey = current_app.config['MPESA_PASSKEY']
         self.base_url = "https://sandbox.safaricom.co.ke"
     
-    def get_access_token(self):
+    def _request(self, endpoint, method, url, **kwargs):
+        """Send a Daraja request on the pooled session and record its latency"""
+        started = time.perf_counter()
+        ok = False
         try:
-            url = f"{self.base_url}/oauth/v1/generate?grant_type=client_credentials"
-            credentials = base64.b64encode(f"{self.consumer_key}:{self.consumer_secret}".encode()).decode()
-            
-            headers = {
-                'Authorization': f'Basic {credentials}',
-                'Content-Type': 'application/json'
-            }
-            
-            response = requests.get(url, headers=headers)
-            if response.status_code == 200:
-                return response.json()['access_token']
-        except Exception as e:
-            current_app.logger.error(f"MPesa token error: {str(e)}")
-        return None
+            response = get_session().request(method, url, timeout=DARAJA_TIMEOUT, **kwargs)
+            ok = response.status_code < 400
+            return response
+        finally:
+            elapsed = time.perf_counter() - started
+            _record_call(endpoint, elapsed, ok)
+            current_app.logger.debug(f"Daraja {endpoint} took {elapsed * 1000:.0f}ms")
+    
+    def _fetch_access_token(self):
+        """Request a new OAuth token; returns (token, expires_at) or None"""
+        url = f"{self.base_url}/oauth/v1/generate?grant_type=client_credentials"
+        credentials = base64.b64encode(f"{self.consumer_key}:{self.consumer_secret}".encode()).decode()
+        
+        headers = {
+            'Authorization': f'Basic {credentials}',
+            'Content-Type': 'application/json'
+        }
+        
+        response = self._request('oauth', 'GET', url, headers=headers)
+        if response.status_code != 200:
+            return None
+        data = response.json()
+        expires_in = int(data.get('expires_in', 3599))
+        return data['access_token'], time.monotonic() + expires_in - TOKEN_REFRESH_MARGIN
+    
+    def get_access_token(self):
+        """Cached access token, fetched once per expiry window across all threads"""
+        key = (self.base_url, self.consumer_key)
+        cached = _token_cache.get(key)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        
+        # Single-flight: whoever gets the lock refreshes, everyone else reuses it
+        with _token_lock:
+            cached = _token_cache.get(key)
+            if cached and cached[1] > time.monotonic():
+                return cached[0]
+            try:
+                fetched = self._fetch_access_token()
+            except Exception as e:
+                current_app.logger.error(f"MPesa token error: {str(e)}")
+                return None
+            if not fetched:
+                return None
+            _token_cache[key] = fetched
+            return fetched[0]
+    
+    def invalidate_access_token(self):
+        _token_cache.pop((self.base_url, self.consumer_key), None)
     
     def initiate_payment(self, phone_number, amount, account_reference):
         token = self.get_access_token()
@@ -57,7 +171,10 @@ class MPesaService:
         }
         
         try:
-            response = requests.post(url, json=payload, headers=headers)
+            response = self._request('stkpush', 'POST', url, json=payload, headers=headers)
+            if response.status_code == 401:
+                # Token revoked early; drop it so the next push fetches a fresh one
+                self.invalidate_access_token()
             return response.json()
         except Exception as e:
-            return {'error': str(e)}
\ No newline at end of file
+            return {'error': str(e)}
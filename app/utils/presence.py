@@ -0,0 +1,272 @@
+# Presence Backend
+# Tracks which users have live Socket.IO connections in a store every
+# gunicorn worker and node can see, so chat works with more than one worker.
+#
+# BACKENDS (chosen by REDIS_URL):
+# - REDIS_URL set: Redis. The same URL is the Socket.IO message queue, so
+#   emits to rooms (conversation_<id>, user_<id>) reach sockets held by
+#   any worker
+# - REDIS_URL empty: InMemoryRedis, an in-process stand-in speaking the
+#   same commands (single worker, tests)
+#
+# DATA (every connect/disconnect is O(1)):
+# - Set presence:user:<user_id>  socket ids of that user's devices
+# - Hash presence:sids           socket id -> user_id (reverse index)
+# - Sorted set presence:seen     socket id scored by last heartbeat
+# - Hash presence:last_seen      user_id -> last time any device was active
+#
+# A user is online while any of their sockets is registered. Each worker
+# heartbeats the sockets it holds (heartbeat()); expire_stale() drops sockets
+# that stopped heartbeating because their worker died without disconnecting.
+#
+# USAGE:
+# presence = get_presence()
+# presence.connect(user_id, request.sid)
+# if presence.is_online(other_user_id):
+#     emit('message_notification', data, room=f'user_{other_user_id}')  # every device
+
+import threading
+import time
+from flask import current_app
+
+class InMemoryRedis:
+    """In-process stand-in for the Redis commands the presence store, rate limiters and token version cache use"""
+    def __init__(self):
+        self._data = {}
+        self._expires = {}  # key -> monotonic deadline (expire())
+        self._lock = threading.RLock()
+
+    def _get(self, name, factory):
+        self._expire_if_due(name)
+        return self._data.setdefault(name, factory())
+
+    def _expire_if_due(self, name):
+        deadline = self._expires.get(name)
+        if deadline is not None and deadline <= time.monotonic():
+            self._data.pop(name, None)
+            self._expires.pop(name, None)
+
+    def _prune(self, name):
+        if not self._data.get(name):
+            self._data.pop(name, None)
+
+    # Counters (rate limiting)
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._expire_if_due(name)
+            value = int(self._data.get(name, 0)) + amount
+            self._data[name] = str(value)
+            return value
+
+    def expire(self, name, seconds):
+        with self._lock:
+            self._expire_if_due(name)
+            if name not in self._data:
+                return False
+            self._expires[name] = time.monotonic() + seconds
+            return True
+
+    def mget(self, keys):
+        with self._lock:
+            for name in keys:
+                self._expire_if_due(name)
+            return [self._data.get(name) for name in keys]
+
+    def delete(self, *names):
+        with self._lock:
+            removed = 0
+            for name in names:
+                self._expire_if_due(name)
+                removed += self._data.pop(name, None) is not None
+                self._expires.pop(name, None)
+            return removed
+
+    # Strings (token version cache)
+    def set(self, name, value, ex=None):
+        with self._lock:
+            self._data[name] = str(value)
+            if ex is None:
+                self._expires.pop(name, None)
+            else:
+                self._expires[name] = time.monotonic() + ex
+            return True
+
+    def get(self, name):
+        with self._lock:
+            self._expire_if_due(name)
+            return self._data.get(name)
+
+    # Hashes
+    def hset(self, name, key, value):
+        with self._lock:
+            bucket = self._get(name, dict)
+            created = str(key) not in bucket
+            bucket[str(key)] = str(value)
+            return int(created)
+
+    def hget(self, name, key):
+        with self._lock:
+            return self._data.get(name, {}).get(str(key))
+
+    def hdel(self, name, *keys):
+        with self._lock:
+            bucket = self._data.get(name, {})
+            removed = sum(bucket.pop(str(key), None) is not None for key in keys)
+            self._prune(name)
+            return removed
+
+    # Sets
+    def sadd(self, name, *values):
+        with self._lock:
+            members = self._get(name, set)
+            before = len(members)
+            members.update(str(value) for value in values)
+            return len(members) - before
+
+    def srem(self, name, *values):
+        with self._lock:
+            members = self._data.get(name, set())
+            before = len(members)
+            members.difference_update(str(value) for value in values)
+            removed = before - len(members)
+            self._prune(name)
+            return removed
+
+    def smembers(self, name):
+        with self._lock:
+            return set(self._data.get(name, set()))
+
+    def scard(self, name):
+        with self._lock:
+            return len(self._data.get(name, set()))
+
+    # Sorted sets
+    def zadd(self, name, mapping):
+        with self._lock:
+            scores = self._get(name, dict)
+            added = sum(str(member) not in scores for member in mapping)
+            scores.update({str(member): float(score) for member, score in mapping.items()})
+            return added
+
+    def zrem(self, name, *members):
+        with self._lock:
+            scores = self._data.get(name, {})
+            removed = sum(scores.pop(str(member), None) is not None for member in members)
+            self._prune(name)
+            return removed
+
+    def zrangebyscore(self, name, min, max):
+        with self._lock:
+            scores = self._data.get(name, {})
+            low = float('-inf') if min == '-inf' else float(min)
+            high = float('inf') if max == '+inf' else float(max)
+            return [member for member, score in sorted(scores.items(), key=lambda item: item[1])
+                    if low <= score <= high]
+
+    def pipeline(self):
+        return _InMemoryPipeline(self)
+
+class _InMemoryPipeline:
+    """Queues commands and runs them together under the store's lock"""
+    def __init__(self, client):
+        self._client = client
+        self._calls = []
+
+    def __getattr__(self, command):
+        def queue(*args, **kwargs):
+            self._calls.append((command, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        with self._client._lock:
+            results = [getattr(self._client, command)(*args, **kwargs) for command, args, kwargs in self._calls]
+        self._calls = []
+        return results
+
+class PresenceStore:
+    """Who is connected on which devices, shared across workers through a Redis-protocol client"""
+    SIDS_KEY = 'presence:sids'
+    SEEN_KEY = 'presence:seen'
+    LAST_SEEN_KEY = 'presence:last_seen'
+
+    def __init__(self, client, ttl=90):
+        self.client = client
+        self.ttl = ttl  # Seconds a socket survives without a heartbeat
+
+    @staticmethod
+    def _user_key(user_id):
+        return f'presence:user:{user_id}'
+
+    def connect(self, user_id, sid):
+        """Register one device's socket for user_id"""
+        now = time.time()
+        pipe = self.client.pipeline()
+        pipe.sadd(self._user_key(user_id), sid)
+        pipe.hset(self.SIDS_KEY, sid, user_id)
+        pipe.zadd(self.SEEN_KEY, {sid: now})
+        pipe.hset(self.LAST_SEEN_KEY, user_id, now)
+        pipe.execute()
+
+    def disconnect(self, sid):
+        """Unregister a socket; returns (user_id, still_online) or (None, False)"""
+        user_id = self.client.hget(self.SIDS_KEY, sid)
+        if user_id is None:
+            self.client.zrem(self.SEEN_KEY, sid)
+            return None, False
+        pipe = self.client.pipeline()
+        pipe.srem(self._user_key(user_id), sid)
+        pipe.hdel(self.SIDS_KEY, sid)
+        pipe.zrem(self.SEEN_KEY, sid)
+        pipe.hset(self.LAST_SEEN_KEY, user_id, time.time())
+        pipe.scard(self._user_key(user_id))
+        remaining = pipe.execute()[-1]
+        return int(user_id), remaining > 0
+
+    def heartbeat(self, sids):
+        """Mark sockets held by this worker as alive"""
+        if sids:
+            now = time.time()
+            self.client.zadd(self.SEEN_KEY, {sid: now for sid in sids})
+
+    def expire_stale(self):
+        """Drop sockets whose worker stopped heartbeating; returns user ids that went offline"""
+        offline = []
+        for sid in self.client.zrangebyscore(self.SEEN_KEY, '-inf', time.time() - self.ttl):
+            user_id, still_online = self.disconnect(sid)
+            if user_id is not None and not still_online:
+                offline.append(user_id)
+        return offline
+
+    def sids_for(self, user_id):
+        return self.client.smembers(self._user_key(user_id))
+
+    def is_online(self, user_id):
+        return self.client.scard(self._user_key(user_id)) > 0
+
+    def online_among(self, user_ids):
+        """The subset of user_ids that are online (one round trip)"""
+        user_ids = list(user_ids)
+        pipe = self.client.pipeline()
+        for user_id in user_ids:
+            pipe.scard(self._user_key(user_id))
+        return [user_id for user_id, devices in zip(user_ids, pipe.execute()) if devices]
+
+    def last_seen(self, user_id):
+        value = self.client.hget(self.LAST_SEEN_KEY, user_id)
+        return float(value) if value is not None else None
+
+def init_presence(app):
+    """Create the presence store for app (Redis when REDIS_URL is set)"""
+    redis_url = app.config.get('REDIS_URL')
+    if redis_url:
+        import redis  # Only needed for multi-worker deployments
+        client = redis.Redis.from_url(redis_url, decode_responses=True)
+    else:
+        client = InMemoryRedis()
+    app.extensions['presence'] = PresenceStore(client, ttl=app.config.get('PRESENCE_TTL_SECONDS', 90))
+    return app.extensions['presence']
+
+def get_presence():
+    """Presence store for the current app"""
+    return current_app.extensions['presence']
@@ -0,0 +1,107 @@
+# Rate Limiting Utility
+# Limiters for per-connection and per-client throttling.
+#
+# TokenBucket: allows `rate` events per second with bursts of up to
+# `capacity`; used to cap how many Socket.IO events one connection can send.
+#
+# SlidingWindowLimiter: allows `limit` hits per `window` seconds per key
+# (e.g. per email or client IP), shared across workers. Approximates a true
+# sliding window from two fixed-window counters:
+#     count = current + previous * (share of the previous window still inside)
+# so every check is one MGET of two keys and every hit one INCR, however
+# many hits are recorded. The store is any Redis-protocol client: Redis when
+# REDIS_URL is set, else the in-process InMemoryRedis (app/utils/presence.py).
+#
+# LOGIN THROTTLING (login_retry_after / record_login_attempt):
+# - per client IP: every attempt counts (LOGIN_LIMIT_PER_IP). Behind a
+#   reverse proxy the IP comes from X-Forwarded-For via ProxyFix, so set
+#   TRUSTED_PROXY_HOPS to the number of proxies (1 in ProductionConfig)
+# - per email: failed attempts count (LOGIN_LIMIT_PER_EMAIL); a successful
+#   login clears them
+# Both are checked before the user lookup and password hash, so a
+# credential stuffing burst is turned away with 429 + Retry-After without
+# costing any hashing CPU.
+
+import math
+import time
+from flask import current_app
+
+class TokenBucket:
+    """Token bucket limiter (not thread-safe; keep one per connection)"""
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def allow(self, cost=1):
+        """Take cost tokens if available; returns False when over the limit"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens < cost:
+            return False
+        self.tokens -= cost
+        return True
+
+class SlidingWindowLimiter:
+    """Sliding window counter limiter backed by a Redis-protocol client"""
+    def __init__(self, client, name, limit, window):
+        self.client = client
+        self.name = name
+        self.limit = limit
+        self.window = window
+
+    def _keys(self, key, now):
+        current = int(now // self.window)
+        prefix = f'ratelimit:{self.name}:{key}'
+        return f'{prefix}:{current}', f'{prefix}:{current - 1}'
+
+    def retry_after(self, key, now=None):
+        """Seconds until key may try again (0 if it may now); does not count a hit"""
+        now = time.time() if now is None else now
+        current, previous = (int(value or 0) for value in self.client.mget(self._keys(key, now)))
+        elapsed = now % self.window
+        if current + previous * (1 - elapsed / self.window) < self.limit:
+            return 0
+
+        if current >= self.limit:
+            # Wait for the next window, then for this window's hits to slide out
+            wait = self.window - elapsed + self.window * (1 - self.limit / current)
+        else:
+            wait = self.window * (1 - (self.limit - current) / previous) - elapsed
+        return max(1, math.ceil(wait))
+
+    def hit(self, key, now=None):
+        """Count one hit for key"""
+        current_key = self._keys(key, time.time() if now is None else now)[0]
+        pipe = self.client.pipeline()
+        pipe.incr(current_key)
+        pipe.expire(current_key, self.window * 2)  # Needed until it becomes the previous window
+        pipe.execute()
+
+    def reset(self, key, now=None):
+        self.client.delete(*self._keys(key, time.time() if now is None else now))
+
+def init_login_limiters(app):
+    """Per-IP and per-email login limiters sharing the presence store's client"""
+    client = app.extensions['presence'].client
+    window = app.config.get('LOGIN_LIMIT_WINDOW_SECONDS', 300)
+    app.extensions['login_limiters'] = {
+        'ip': SlidingWindowLimiter(client, 'login_ip', app.config.get('LOGIN_LIMIT_PER_IP', 100), window),
+        'email': SlidingWindowLimiter(client, 'login_email', app.config.get('LOGIN_LIMIT_PER_EMAIL', 10), window)
+    }
+    return app.extensions['login_limiters']
+
+def login_retry_after(email, ip):
+    """Seconds the caller must wait before trying to log in (0 if allowed)"""
+    limiters = current_app.extensions['login_limiters']
+    return max(limiters['ip'].retry_after(ip), limiters['email'].retry_after(email.lower()))
+
+def record_login_attempt(email, ip, succeeded):
+    limiters = current_app.extensions['login_limiters']
+    limiters['ip'].hit(ip)
+    if succeeded:
+        limiters['email'].reset(email.lower())
+    else:
+        limiters['email'].hit(email.lower())
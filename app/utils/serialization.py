@@ -0,0 +1,97 @@
+# Serialization Utility
+# Lets clients control how much data list and detail endpoints return.
+#
+# Every model's to_dict(depth, fields, expand) is paired with a
+# load_options(depth, fields, expand) plan (see app/models/base.py) that
+# eager-loads exactly the relationships to_dict will touch and defers the
+# columns it won't, so serializing N rows costs a fixed number of queries.
+#
+# QUERY PARAMETERS (shared by every resource that adopts them):
+# - fields: Comma-separated top-level keys to return, e.g. fields=id,title,status;
+#           relations count as keys, so with fields only the relations it
+#           lists are embedded (and loaded), e.g. fields=id,title,landlord
+# - expand: Comma-separated relations to embed, dotted for nesting,
+#           e.g. expand=property,property.landlord (expand= embeds nothing)
+# - depth:  Shorthand for "expand every relation N levels deep"; ignored
+#           when expand is given
+#
+# USAGE:
+# fields, expand = get_fieldset_params(Payment)
+# payments = Payment.query.options(*Payment.load_options(fields=fields, expand=expand)).all()
+# return {'payments': [p.to_dict(fields=fields, expand=expand) for p in payments]}
+
+from flask import request
+
+def get_depth_param(default, maximum):
+    """
+    Read the ?depth= query parameter controlling nested object embedding
+
+    Args:
+        default: Depth used when the client does not specify one
+        maximum: Deepest nesting the endpoint supports
+
+    Returns:
+        Integer depth between 0 and maximum
+    """
+    depth = request.args.get('depth', default, type=int)
+    return min(max(0, depth), maximum)
+
+def _split(value):
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+def parse_expand(model, value):
+    """
+    Parse an expand string into the nested dict used by to_dict/load_options
+
+    Args:
+        model: Root model class
+        value: Comma-separated relation paths, e.g. "property.landlord,tenant"
+
+    Returns:
+        Dict tree, e.g. {'property': {'landlord': {}}, 'tenant': {}}
+
+    Raises:
+        ValueError: If a path names a relation the model does not expose
+    """
+    tree = {}
+    for path in _split(value):
+        node, current = tree, model
+        for relation in path.split('.'):
+            if relation not in current.SERIALIZED_RELATIONS:
+                raise ValueError(f'Cannot expand {path!r}')
+            node = node.setdefault(relation, {})
+            current = current.related_model(relation)
+    return tree
+
+def get_fieldset_params(model, max_depth=None, extra_fields=()):
+    """
+    Extract the fields/expand selection for a model from the request
+
+    Args:
+        model: Root model class being serialized
+        max_depth: Deepest ?depth= allowed (defaults to model.DEFAULT_DEPTH)
+        extra_fields: Keys the endpoint adds beyond model.SERIALIZED_FIELDS
+
+    Returns:
+        Tuple of (fields, expand) where fields is a set of keys or None for
+        all keys, and expand is the relation tree to embed (only relations
+        listed in fields when fields is given)
+
+    Raises:
+        ValueError: If fields or expand name something the model lacks
+    """
+    fields = None
+    if request.args.get('fields') is not None:
+        fields = set(_split(request.args['fields']))
+        allowed = set(model.SERIALIZED_FIELDS) | set(model.SERIALIZED_RELATIONS) | set(extra_fields)
+        unknown = fields - allowed
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    if request.args.get('expand') is not None:
+        expand = parse_expand(model, request.args['expand'])
+    else:
+        maximum = model.DEFAULT_DEPTH if max_depth is None else max_depth
+        expand = model.expand_for_depth(get_depth_param(model.DEFAULT_DEPTH, maximum))
+
+    return fields, model.selected_expand(fields=fields, expand=expand)
@@ -0,0 +1,95 @@
+# Background STK Push
+# PaymentList.post commits a pending payment and returns 202 straight away;
+# the Daraja STK push runs here on a bounded thread pool so slow Daraja
+# responses tie up pool threads rather than gunicorn workers.
+#
+# OUTCOME:
+# - Success: payment.mpesa_checkout_id is stored (the callback completes it)
+# - Failure (Daraja rejects the push, or the push raises): payment is marked
+#   failed, so it never stays pending without a checkout id
+# Either way a 'payment_updated' Socket.IO event is sent to the tenant's
+# user room, and clients without a socket poll GET /api/payments/<id>.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from app import db, socketio
+from app.models import Payment, PaymentStatus, LandlordMonthlyStats
+from app.utils.payments import MPesaService
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Process-wide pool for STK pushes (size: STK_PUSH_WORKERS)"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=current_app.config.get('STK_PUSH_WORKERS', 8),
+                    thread_name_prefix='stk-push'
+                )
+    return _executor
+
+def notify_payment_updated(payment, error=None):
+    """Push the payment's new state to the tenant's connected clients"""
+    data = {'payment': payment.to_dict(depth=0)}
+    if error:
+        data['error'] = error
+    socketio.emit('payment_updated', data, room=f'user_{payment.tenant_id}')
+
+def perform_stk_push(payment_id):
+    """Send the STK push for a pending payment and record the result
+    Runs inside an app context; commits its own changes.
+    """
+    payment = db.session.get(Payment, payment_id)
+    if payment is None or payment.status != PaymentStatus.PENDING or payment.mpesa_checkout_id:
+        return None
+
+    result = MPesaService().initiate_payment(payment.phone_number, payment.amount, payment.reference)
+
+    if 'CheckoutRequestID' not in result:
+        fail_payment(payment, result.get('error') or result.get('errorMessage') or 'STK push failed')
+        return result
+
+    # Store M-Pesa checkout ID for callback matching
+    payment.mpesa_checkout_id = result['CheckoutRequestID']
+    db.session.commit()
+
+    notify_payment_updated(payment)
+    return result
+
+def fail_payment(payment, error):
+    """Mark a pending payment failed (commits) and tell the tenant why"""
+    payment.status = PaymentStatus.FAILED
+    LandlordMonthlyStats.record_payment(payment, PaymentStatus.PENDING)
+    db.session.commit()
+    notify_payment_updated(payment, error)
+
+def _fail_after_error(payment_id):
+    """Fail the payment if the push raised before a checkout id was stored"""
+    payment = db.session.get(Payment, payment_id)
+    if payment is not None and payment.status == PaymentStatus.PENDING and not payment.mpesa_checkout_id:
+        fail_payment(payment, 'Could not send the M-Pesa payment request, please try again')
+
+def submit_stk_push(payment_id):
+    """Queue the STK push for a committed payment; returns the Future"""
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                return perform_stk_push(payment_id)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"STK push for payment {payment_id} failed: {str(e)}")
+                try:
+                    _fail_after_error(payment_id)
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error(f"Could not mark payment {payment_id} failed: {str(e)}")
+            finally:
+                db.session.remove()
+
+    return get_executor().submit(run)
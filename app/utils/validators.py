@@ -15,6 +15,12 @@ def validate_date_range(start_date, end_date):
         return True
     return start_date < end_date
 
+MAX_ID = 2 ** 31 - 1  # Integer primary keys are 32-bit on PostgreSQL
+
+def validate_id(value):
+    """Whether a JSON value can be a row id (bools and numeric strings are rejected)"""
+    return isinstance(value, int) and not isinstance(value, bool) and 1 <= value <= MAX_ID
+
 def validate_rent_amount(amount):
     return amount >= 0
 
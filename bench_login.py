@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark login throughput and event loop stalls under eventlet
+Runs like the production gunicorn eventlet worker: logins are served by
+green threads while a ticker green thread stands in for connected chat
+sockets and records how long the event loop was blocked.
+
+Compare hashing on the request green thread (workers=0, the behaviour
+before the password hashing pool) with the pool:
+    python bench_login.py 64 16 0
+    python bench_login.py 64 16 4
+
+Usage: python bench_login.py [logins] [concurrency] [workers]
+BCRYPT_LOG_ROUNDS in the environment sets the cost (default 12).
+"""
+import eventlet
+eventlet.monkey_patch()
+
+import os
+import sys
+import tempfile
+import time
+from app import create_app, db
+from app.models import User
+from app.config import Config
+from app.utils.passwords import get_password_hasher
+
+def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    database = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{database.name}'
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+        EMAIL_OUTBOX_WORKER = False
+        PASSWORD_HASH_WORKERS = workers
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        user = User(email='bench@test.com', first_name='Bench', last_name='User')
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.commit()
+
+    client = app.test_client()
+    running = True
+    stalls = []
+
+    def ticker(interval=0.01):
+        while running:
+            started = time.perf_counter()
+            eventlet.sleep(interval)
+            stalls.append(time.perf_counter() - started - interval)
+
+    def login(_):
+        started = time.perf_counter()
+        response = client.post('/api/auth/login', json={'email': 'bench@test.com', 'password': 'password123'})
+        return response.status_code, time.perf_counter() - started
+
+    tick = eventlet.spawn(ticker)
+    started = time.perf_counter()
+    results = list(eventlet.GreenPool(concurrency).imap(login, range(logins)))
+    elapsed = time.perf_counter() - started
+    running = False
+    tick.wait()
+
+    latencies = sorted(latency for _, latency in results)
+    errors = sum(1 for status, _ in results if status != 200)
+    percentile = lambda values, p: values[min(len(values) - 1, int(len(values) * p))] * 1000
+    stalls.sort()
+
+    print(f"workers={workers} rounds={app.config['BCRYPT_LOG_ROUNDS']}: {logins} logins "
+          f"(concurrency {concurrency}) in {elapsed:.2f}s = {logins / elapsed:.1f} logins/s")
+    print(f"login latency p50={percentile(latencies, 0.50):.0f}ms p95={percentile(latencies, 0.95):.0f}ms")
+    print(f"event loop stall p50={percentile(stalls, 0.50):.1f}ms max={stalls[-1] * 1000:.1f}ms")
+    with app.app_context():
+        print(f"hasher: {get_password_hasher().metrics()}")
+    print(f"non-200 responses: {errors}")
+    os.unlink(database.name)
+    return 1 if errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Standalone email outbox worker
+Sends queued emails (payment confirmations etc.) outside the web process.
+Set EMAIL_OUTBOX_WORKER=false on the web service when running this.
+
+Usage: python email_worker.py
+"""
+import time
+from app import create_app, db
+from app.utils.email_outbox import drain_outbox
+
+app = create_app()
+
+if __name__ == '__main__':
+    poll_interval = app.config.get('EMAIL_OUTBOX_POLL_SECONDS', 2)
+    print("Email outbox worker started")
+    while True:
+        with app.app_context():
+            try:
+                sent = drain_outbox()
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"Email outbox drain failed: {str(e)}")
+                sent = 0
+            finally:
+                db.session.remove()
+        if not sent:
+            time.sleep(poll_interval)
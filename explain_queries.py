@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+EXPLAIN the hot endpoint queries to check they use the indexes from
+migrations 004, 005 and 007 instead of scanning whole tables.
+
+Each query below mirrors the one the endpoint builds. On PostgreSQL the
+planner is told to avoid sequential scans (enable_seqscan = off) so that a
+small development database still shows whether a usable index exists.
+
+Usage: python explain_queries.py [--memory] [user_id]
+--memory explains against an empty in-memory SQLite database created from
+the models (which declare the same indexes as the migrations), for when no
+migrated database is at hand.
+Exits with status 1 if any query still scans a table without an index.
+"""
+import sys
+from sqlalchemy import select, or_
+from app import create_app, db
+from app.models import Property, Payment, PaymentStatus, Conversation, Message, LandlordMonthlyStats
+from app.resources.dashboard import unread_messages_subquery
+
+def endpoint_queries(user_id):
+    """(name, statement) pairs matching what each endpoint executes"""
+    newest_first = (Property.created_at.desc(), Property.id.desc())
+    return [
+        ('GET /api/properties (landlord)',
+         select(Property).where(Property.landlord_id == user_id).order_by(*newest_first).limit(21)),
+        ('GET /api/properties (tenant)',
+         select(Property).where(Property.tenant_id == user_id).order_by(*newest_first).limit(21)),
+        ('GET /api/payments (landlord)',
+         select(Payment).join(Property).where(Property.landlord_id == user_id)),
+        ('GET /api/payments (tenant)',
+         select(Payment).where(Payment.tenant_id == user_id)),
+        ('POST /api/payments/callback',
+         select(Payment).where(Payment.mpesa_checkout_id == 'ws_CO_000000000000')),
+        ('GET /api/dashboard/landlord (properties)',
+         select(Property.status).where(Property.landlord_id == user_id)),
+        ('GET /api/dashboard/landlord (rollup)',
+         select(LandlordMonthlyStats).where(LandlordMonthlyStats.landlord_id == user_id)),
+        ('GET /api/dashboard/landlord (recent payments)',
+         select(Payment).join(Property).where(Property.landlord_id == user_id)
+         .order_by(Payment.created_at.desc()).limit(5)),
+        ('GET /api/dashboard/tenant (pending)',
+         select(Payment.id).where(Payment.tenant_id == user_id, Payment.status == PaymentStatus.PENDING)),
+        ('GET /api/dashboard/* (unread messages)',
+         select(unread_messages_subquery(user_id))),
+        ('GET /api/conversations',
+         select(Conversation).where(or_(Conversation.initiator_id == user_id, Conversation.participant_id == user_id))
+         .order_by(Conversation.last_message_at.desc())),
+        ('GET /api/conversations/<id>/messages',
+         select(Message).where(Message.conversation_id == 1)
+         .order_by(Message.created_at.desc(), Message.id.desc()).limit(51)),
+        ('GET /api/conversations/<id>/messages?since=',
+         select(Message).where(Message.conversation_id == 1, Message.updated_at > '2024-01-01')
+         .order_by(Message.updated_at.asc(), Message.id.asc()).limit(51)),
+        ('GET /api/conversations/<id> (unread)',
+         select(Message.id).where(Message.conversation_id == 1, Message.sender_id != user_id,
+                                  Message.is_read == False)),
+    ]
+
+def explain(statement):
+    """Return the plan lines for a statement on the current database"""
+    dialect = db.engine.dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    prefix = 'EXPLAIN QUERY PLAN' if dialect.name == 'sqlite' else 'EXPLAIN'
+    rows = db.session.connection().exec_driver_sql(f'{prefix} {sql}').fetchall()
+    return [str(row[-1]) for row in rows]
+
+def is_full_scan(line):
+    """Whether a plan line reads a whole table rather than an index"""
+    if 'Seq Scan' in line:  # PostgreSQL
+        return True
+    # SQLite: "SCAN properties" vs "SCAN properties USING INDEX ..." / "SEARCH ..."
+    line = line.strip()
+    return line.startswith('SCAN') and 'INDEX' not in line and line != 'SCAN CONSTANT ROW'
+
+def main():
+    args = sys.argv[1:]
+    memory = '--memory' in args
+    args = [arg for arg in args if arg != '--memory']
+    user_id = int(args[0]) if args else 1
+    if memory:
+        from app.config import TestingConfig
+        app = create_app(TestingConfig)
+    else:
+        app = create_app()
+    failures = 0
+    with app.app_context():
+        if memory:
+            db.create_all()
+        if db.engine.dialect.name == 'postgresql':
+            db.session.connection().exec_driver_sql('SET enable_seqscan = off')
+
+        for name, statement in endpoint_queries(user_id):
+            plan = explain(statement)
+            scans = [line for line in plan if is_full_scan(line)]
+            failures += bool(scans)
+            print(f"{'✗ SCAN' if scans else '✓ INDEX'}  {name}")
+            for line in plan:
+                print(f"    {line}")
+
+    print(f"\n{failures} quer{'y' if failures == 1 else 'ies'} without index usage")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,10 @@
+# Gunicorn settings, read automatically from the working directory
+# (gunicorn run:app in Procfile / render.yaml)
+#
+# The email outbox worker (app/utils/email_outbox.py) starts here, once each
+# worker process has loaded the app, rather than when run.py is imported:
+# flask db upgrade and other scripts import run.py too.
+
+def post_worker_init(worker):
+    from app.utils.email_outbox import start_outbox_worker
+    start_outbox_worker(worker.wsgi)
@@ -0,0 +1,38 @@
+"""Add landlord monthly stats rollup table
+
+Revision ID: 003
+Revises: 002
+Create Date: 2024-02-01
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Create landlord_monthly_stats table (one row per landlord per month)
+    op.create_table(
+        'landlord_monthly_stats',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('landlord_id', sa.Integer(), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('completed_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('completed_total', sa.Numeric(precision=12, scale=2), nullable=False, server_default='0'),
+        sa.Column('pending_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('failed_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('cancelled_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['landlord_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('landlord_id', 'month', name='uq_landlord_monthly_stats_landlord_month')
+    )
+    # Populate from existing payments with: python rebuild_stats.py
+
+def downgrade():
+    op.drop_table('landlord_monthly_stats')
@@ -0,0 +1,50 @@
+"""Add composite indexes for hot foreign-key filters
+
+Revision ID: 004
+Revises: 003
+Create Date: 2024-02-15
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Properties: role-filtered lists ordered newest first (keyset pagination)
+    op.create_index('ix_properties_landlord_id_created_at', 'properties', ['landlord_id', 'created_at', 'id'])
+    op.create_index('ix_properties_tenant_id_created_at', 'properties', ['tenant_id', 'created_at', 'id'])
+    # Landlord dashboard occupancy counts
+    op.create_index('ix_properties_landlord_id_status', 'properties', ['landlord_id', 'status'])
+
+    # Payments: tenant history / dashboard, landlord lists join through property_id
+    op.create_index('ix_payments_tenant_id_status', 'payments', ['tenant_id', 'status'])
+    op.create_index('ix_payments_property_id_created_at', 'payments', ['property_id', 'created_at'])
+
+    # Chat: inbox list filters on either side, ordered by latest activity
+    op.create_index('ix_chat_conversations_initiator_id_last_message_at', 'chat_conversations',
+                    ['initiator_id', 'last_message_at'])
+    op.create_index('ix_chat_conversations_participant_id_last_message_at', 'chat_conversations',
+                    ['participant_id', 'last_message_at'])
+
+    # Chat: message history in chronological order
+    op.create_index('ix_chat_messages_conversation_id_created_at', 'chat_messages', ['conversation_id', 'created_at'])
+    # Partial index: only unread rows, so mark-as-read and unread counts stay small
+    op.create_index('ix_chat_messages_unread', 'chat_messages', ['conversation_id', 'sender_id'],
+                    postgresql_where=sa.text('is_read = false'),
+                    sqlite_where=sa.text('is_read = 0'))
+
+def downgrade():
+    op.drop_index('ix_chat_messages_unread', table_name='chat_messages')
+    op.drop_index('ix_chat_messages_conversation_id_created_at', table_name='chat_messages')
+    op.drop_index('ix_chat_conversations_participant_id_last_message_at', table_name='chat_conversations')
+    op.drop_index('ix_chat_conversations_initiator_id_last_message_at', table_name='chat_conversations')
+    op.drop_index('ix_payments_property_id_created_at', table_name='payments')
+    op.drop_index('ix_payments_tenant_id_status', table_name='payments')
+    op.drop_index('ix_properties_landlord_id_status', table_name='properties')
+    op.drop_index('ix_properties_tenant_id_created_at', table_name='properties')
+    op.drop_index('ix_properties_landlord_id_created_at', table_name='properties')
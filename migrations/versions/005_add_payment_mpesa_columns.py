@@ -0,0 +1,30 @@
+"""Add M-Pesa columns to payments
+
+Revision ID: 005
+Revises: 004
+Create Date: 2024-02-20
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Set when the STK push is accepted (checkout id) or requested (phone)
+    op.add_column('payments', sa.Column('mpesa_checkout_id', sa.String(length=100), nullable=True))
+    op.add_column('payments', sa.Column('phone_number', sa.String(length=20), nullable=True))
+
+    # Each STK push yields exactly one CheckoutRequestID; enforce it so the
+    # callback can match with a single index probe and duplicates can't exist.
+    # NULLs (non M-Pesa payments) are allowed to repeat under a unique index.
+    op.create_index('ix_payments_mpesa_checkout_id', 'payments', ['mpesa_checkout_id'], unique=True)
+
+def downgrade():
+    op.drop_index('ix_payments_mpesa_checkout_id', table_name='payments')
+    op.drop_column('payments', 'phone_number')
+    op.drop_column('payments', 'mpesa_checkout_id')
@@ -0,0 +1,29 @@
+"""Index chat messages for keyset history windows and delta sync
+
+Revision ID: 007
+Revises: 006
+Create Date: 2024-02-15
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # before_id/after_id windows order by (created_at, id) within a conversation
+    op.drop_index('ix_chat_messages_conversation_id_created_at', table_name='chat_messages')
+    op.create_index('ix_chat_messages_conversation_id_created_at', 'chat_messages',
+                    ['conversation_id', 'created_at', 'id'])
+    # ?since= delta sync orders by (updated_at, id)
+    op.create_index('ix_chat_messages_conversation_id_updated_at', 'chat_messages',
+                    ['conversation_id', 'updated_at', 'id'])
+
+def downgrade():
+    op.drop_index('ix_chat_messages_conversation_id_updated_at', table_name='chat_messages')
+    op.drop_index('ix_chat_messages_conversation_id_created_at', table_name='chat_messages')
+    op.create_index('ix_chat_messages_conversation_id_created_at', 'chat_messages', ['conversation_id', 'created_at'])
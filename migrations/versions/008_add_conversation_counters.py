@@ -0,0 +1,41 @@
+"""Add maintained message and unread counters to conversations
+
+Revision ID: 008
+Revises: 007
+Create Date: 2024-02-20
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('chat_conversations', sa.Column('message_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('chat_conversations', sa.Column('initiator_unread_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('chat_conversations', sa.Column('participant_unread_count', sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill from existing messages; the app keeps them current from here on
+    op.execute("""
+        UPDATE chat_conversations SET
+            message_count = (
+                SELECT COUNT(*) FROM chat_messages m
+                WHERE m.conversation_id = chat_conversations.id),
+            initiator_unread_count = (
+                SELECT COUNT(*) FROM chat_messages m
+                WHERE m.conversation_id = chat_conversations.id
+                  AND m.sender_id != chat_conversations.initiator_id AND m.is_read = false),
+            participant_unread_count = (
+                SELECT COUNT(*) FROM chat_messages m
+                WHERE m.conversation_id = chat_conversations.id
+                  AND m.sender_id != chat_conversations.participant_id AND m.is_read = false)
+    """)
+
+def downgrade():
+    op.drop_column('chat_conversations', 'participant_unread_count')
+    op.drop_column('chat_conversations', 'initiator_unread_count')
+    op.drop_column('chat_conversations', 'message_count')
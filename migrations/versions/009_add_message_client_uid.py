@@ -0,0 +1,25 @@
+"""Add client_uid to chat messages for write-behind persistence
+
+Revision ID: 009
+Revises: 008
+Create Date: 2024-03-01
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Idempotency key so journal replays never insert a message twice
+    op.add_column('chat_messages', sa.Column('client_uid', sa.String(length=32), nullable=True))
+    # A unique index rather than a constraint: SQLite can't ALTER constraints
+    op.create_index('uq_chat_messages_client_uid', 'chat_messages', ['client_uid'], unique=True)
+
+def downgrade():
+    op.drop_index('uq_chat_messages_client_uid', table_name='chat_messages')
+    op.drop_column('chat_messages', 'client_uid')
@@ -0,0 +1,22 @@
+"""Add token_version to users for access token revocation
+
+Revision ID: 010
+Revises: 009
+Create Date: 2024-03-08
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Embedded in access tokens; bumping it revokes every token issued before
+    op.add_column('users', sa.Column('token_version', sa.Integer(), nullable=False, server_default='0'))
+
+def downgrade():
+    op.drop_column('users', 'token_version')
@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+"""
+Rebuild the landlord_monthly_stats rollup from the payments table
+Run after deploying the rollup migration, after bulk payment imports,
+or to repair drift. Optionally pass a landlord id to rebuild one landlord.
+
+Usage: python rebuild_stats.py [landlord_id]
+"""
+import sys
+from app import create_app
+from app.models import LandlordMonthlyStats
+
+app = create_app()
+with app.app_context():
+    landlord_id = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    rows = LandlordMonthlyStats.rebuild(landlord_id)
+    print(f"Rebuilt {rows} landlord monthly stats rows")
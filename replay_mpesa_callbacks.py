@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Replay a burst of M-Pesa STK callbacks against a running server
+Stands in for Safaricom at month-end: many callbacks in a short window,
+each delivered several times, to measure callback latency and confirm
+duplicates are no-ops.
+
+Checkout ids are read from pending payments in the configured database,
+so point DATABASE_URL at the same database the server uses.
+
+Usage: python replay_mpesa_callbacks.py [base_url] [deliveries] [concurrency]
+Example: python replay_mpesa_callbacks.py http://localhost:5000 3 32
+"""
+import sys
+import time
+import random
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from app import create_app
+from app.models import Payment, PaymentStatus
+
+def main():
+    base_url = sys.argv[1] if len(sys.argv) > 1 else 'http://localhost:5000'
+    deliveries = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 32
+
+    app = create_app()
+    with app.app_context():
+        checkout_ids = [row.mpesa_checkout_id for row in Payment.query.filter(
+            Payment.status == PaymentStatus.PENDING,
+            Payment.mpesa_checkout_id.isnot(None)
+        ).with_entities(Payment.mpesa_checkout_id)]
+
+    if not checkout_ids:
+        print("No pending M-Pesa payments to replay callbacks for")
+        return 1
+
+    burst = [checkout_id for checkout_id in checkout_ids for _ in range(deliveries)]
+    random.shuffle(burst)
+    session = requests.Session()
+
+    def deliver(checkout_id):
+        payload = {'Body': {'stkCallback': {
+            'MerchantRequestID': f'replay-{checkout_id}',
+            'CheckoutRequestID': checkout_id,
+            'ResultCode': 0,
+            'ResultDesc': 'The service request is processed successfully.'
+        }}}
+        started = time.perf_counter()
+        response = session.post(f'{base_url}/api/payments/callback', json=payload, timeout=30)
+        return response.status_code, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(deliver, burst))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for _, latency in results)
+    errors = sum(1 for status, _ in results if status != 200)
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(f"{len(burst)} callbacks ({len(checkout_ids)} payments x {deliveries}) in {elapsed:.2f}s "
+          f"= {len(burst) / elapsed:.0f} req/s")
+    print(f"latency p50={percentile(0.50):.1f}ms p95={percentile(0.95):.1f}ms p99={percentile(0.99):.1f}ms")
+    print(f"non-200 responses: {errors}")
+    return 1 if errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,9 +6,12 @@
 # SETUP COMMANDS:
 # 1. Install dependencies: pip install -r requirements.txt
 # 2. Set environment variables in .env file (see .env.example)
-# 3. Initialize database: python init_db.py
+# 3. Initialize database: python init_db.py (or flask --app run db upgrade)
 # 4. Run development server: python run.py
 # 5. Run production server: gunicorn --worker-class eventlet -w 1 run:app
+#    More workers/nodes: set REDIS_URL (Socket.IO message queue + presence,
+#    see app/utils/presence.py) and run one eventlet worker per process
+#    behind a load balancer with sticky sessions
 #
 # API ENDPOINTS:
 # - POST /api/auth/register - Register new user (landlord/tenant)
@@ -25,36 +28,30 @@
 #
 # AUTHENTICATION:
 # - Include JWT token in headers: Authorization: Bearer <token>
-# - Token expires after 24 hours (configurable in config.py)
+# - Access tokens expire after 15 minutes; renew with POST /api/auth/refresh
+#   (configurable in config.py)
 #
 # DATABASE:
 # - Development: SQLite (landlord_app.db)
 # - Production: PostgreSQL (set DATABASE_URL environment variable)
 # ============================================================================
 
-from app import create_app, db, socketio
-from flask_migrate import Migrate
+from app import create_app, socketio
+from app.utils.email_outbox import start_outbox_worker
 import os
 
 # Create Flask application instance with configuration
+# The schema is not created here: every gunicorn worker imports this file,
+# and boot must not wait on the database. Create or migrate it once per
+# deploy instead (python init_db.py, or flask --app run db upgrade)
 app = create_app()
 
-# Initialize Flask-Migrate for database migrations
-# Commands: flask db init, flask db migrate, flask db upgrade
-migrate = Migrate(app, db)
-
-# Create database tables on startup
-with app.app_context():
-    try:
-        # Import all models to register them with SQLAlchemy
-        from app.models import User, Property, Payment, Conversation, Message
-        # Create all tables defined in models
-        db.create_all()
-        app.logger.info("Database tables created successfully")
-    except Exception as e:
-        app.logger.error(f"Database initialization error: {e}")
-
 if __name__ == '__main__':
+    # Send queued emails in the background (EMAIL_OUTBOX_WORKER=false when using email_worker.py)
+    # Only when serving: gunicorn starts it from gunicorn.conf.py, and
+    # flask db upgrade imports this file without serving
+    start_outbox_worker(app)
+    
     # Get port from environment variable or use default 5000
     port = int(os.environ.get('PORT', 5000))
     
@@ -0,0 +1,42 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+from app.models import db, User, Property
+from app.models.user import Profile
+
+@contextmanager
+def count_statements():
+    """Collect the SQL statements run inside the block into the yielded list"""
+    statements = []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+def make_user(email, role, password='password123'):
+    """Add a user with a profile (flushed, so it has an id)"""
+    user = User(email=email, first_name='Test', last_name='User')
+    user.set_password(password)
+    user.profile = Profile(role=role)
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+def make_property(landlord, tenant=None, **overrides):
+    """Add a property owned by landlord, optionally let to tenant (flushed)"""
+    data = dict(title='Unit', address='1 Test St', city='Nairobi', state='NA', zip_code='00100',
+                property_type='apartment', monthly_rent=1000, landlord_id=landlord.id,
+                tenant_id=tenant.id if tenant else None)
+    data.update(overrides)
+    prop = Property(**data)
+    db.session.add(prop)
+    db.session.flush()
+    return prop
+
+def make_rental(suffix=''):
+    """Landlord, tenant and a property let to the tenant"""
+    landlord = make_user(f'landlord{suffix}@test.com', 'landlord')
+    tenant = make_user(f'tenant{suffix}@test.com', 'tenant')
+    return landlord, tenant, make_property(landlord, tenant)
@@ -1,12 +1,11 @@
 import pytest
 from app import create_app, db
-from app.models.user import User, UserProfile
+from app.models.user import User
 
 @pytest.fixture
 def app():
-    app = create_app()
-    app.config['TESTING'] = True
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    from app.config import TestingConfig
+    app = create_app(TestingConfig)  # The database URI is read when the app is created
 
     with app.app_context():
         db.create_all()
@@ -25,7 +24,7 @@ def test_user_registration(client):
         'last_name': 'Doe'
     })
     assert response.status_code == 201
-    assert 'access_token' in response.json
+    assert 'token' in response.json
 
 def test_user_login(client):
     # First register
@@ -42,4 +41,4 @@ def test_user_login(client):
         'password': 'password123'
     })
     assert response.status_code == 200
-    assert 'access_token' in response.json
\ No newline at end of file
+    assert 'token' in response.json
\ No newline at end of file
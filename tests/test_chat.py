@@ -19,18 +19,17 @@ def client(app):
 
 @pytest.fixture
 def test_users(app):
-    with app.app_context():
-        # Create two users
-        user1 = User(email='user1@test.com', first_name='John', last_name='Doe', role='landlord')
-        user1.set_password('password123')
-        
-        user2 = User(email='user2@test.com', first_name='Jane', last_name='Smith', role='tenant')
-        user2.set_password('password123')
-        
-        db.session.add_all([user1, user2])
-        db.session.commit()
-        
-        return {'user1': user1, 'user2': user2}
+    # Created in the app fixture's context, so they stay bound to its session
+    user1 = User(email='user1@test.com', first_name='John', last_name='Doe', role='landlord')
+    user1.set_password('password123')
+    
+    user2 = User(email='user2@test.com', first_name='Jane', last_name='Smith', role='tenant')
+    user2.set_password('password123')
+    
+    db.session.add_all([user1, user2])
+    db.session.commit()
+    
+    return {'user1': user1, 'user2': user2}
 
 def test_create_conversation(client, test_users):
     # Login as user1
@@ -38,7 +37,7 @@ def test_create_conversation(client, test_users):
         'email': 'user1@test.com',
         'password': 'password123'
     })
-    token = response.json['access_token']
+    token = response.json['token']
     headers = {'Authorization': f'Bearer {token}'}
     
     response = client.post('/api/conversations', json={
@@ -55,7 +54,7 @@ def test_send_message(client, test_users):
         'email': 'user1@test.com',
         'password': 'password123'
     })
-    token = response.json['access_token']
+    token = response.json['token']
     headers = {'Authorization': f'Bearer {token}'}
     
     # Create conversation
@@ -72,4 +71,393 @@ def test_send_message(client, test_users):
     }, headers=headers)
     
     assert response.status_code == 201
-    assert response.json['message']['content'] == 'Hello, this is a test message!'
\ No newline at end of file
+    assert response.json['message']['content'] == 'Hello, this is a test message!'
+
+def _auth_headers(user):
+    from flask_jwt_extended import create_access_token
+    return {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+@pytest.fixture
+def users(test_users):
+    return test_users['user1'], test_users['user2']
+
+@pytest.fixture
+def history(app, users):
+    """Conversation with 12 alternating messages one minute apart"""
+    from datetime import datetime, timedelta
+    user1, user2 = users
+    conversation = Conversation(initiator_id=user1.id, participant_id=user2.id)
+    db.session.add(conversation)
+    db.session.flush()
+    start = datetime(2024, 1, 1, 9, 0)
+    messages = [
+        Message(content=f'message {i}', conversation_id=conversation.id,
+                sender_id=(user1 if i % 2 == 0 else user2).id,
+                created_at=start + timedelta(minutes=i), updated_at=start + timedelta(minutes=i))
+        for i in range(12)
+    ]
+    db.session.add_all(messages)
+    db.session.commit()
+    return conversation.id, [message.id for message in messages]
+
+def test_message_history_windows(client, users, history):
+    conversation_id, ids = history
+    headers = _auth_headers(users[0])
+    url = f'/api/conversations/{conversation_id}/messages'
+
+    response = client.get(f'{url}?limit=5', headers=headers)
+    assert response.status_code == 200
+    assert [m['id'] for m in response.json['messages']] == ids[-5:]  # Newest, oldest first
+    assert response.json['pagination']['has_more'] is True
+    # Two senders listed once, not embedded in each message
+    assert set(response.json['senders']) == {str(users[0].id), str(users[1].id)}
+    assert 'sender' not in response.json['messages'][0]
+
+    response = client.get(f'{url}?limit=5&before_id={ids[2]}', headers=headers)
+    assert [m['id'] for m in response.json['messages']] == ids[:2]
+    assert response.json['pagination']['has_more'] is False
+
+    response = client.get(f'{url}?limit=5&after_id={ids[2]}', headers=headers)
+    assert [m['id'] for m in response.json['messages']] == ids[3:8]
+    assert response.json['pagination']['has_more'] is True
+
+    assert client.get(f'{url}?before_id=999999', headers=headers).status_code == 400
+    assert client.get(f'{url}?before_id={ids[1]}&after_id={ids[0]}', headers=headers).status_code == 400
+
+def test_message_delta_sync(app, client, users, history):
+    app.config['CHAT_SYNC_LAG_SECONDS'] = 0  # Exact tokens; the lag is covered below
+    conversation_id, ids = history
+    headers = _auth_headers(users[0])
+    url = f'/api/conversations/{conversation_id}/messages'
+
+    token = client.get(url, headers=headers).json['pagination']['sync_token']
+    response = client.get(f'{url}?since={token}', headers=headers)
+    assert response.json['messages'] == []
+    assert response.json['pagination']['sync_token'] == token
+
+    # One old message read, one new message sent: only those come back
+    db.session.get(Message, ids[3]).mark_as_read()
+    db.session.add(Message(content='new', conversation_id=conversation_id, sender_id=users[1].id))
+    db.session.commit()
+
+    response = client.get(f'{url}?since={token}', headers=headers)
+    messages = response.json['messages']
+    assert [m['id'] for m in messages][0] == ids[3] and messages[0]['is_read'] is True
+    assert [m['content'] for m in messages][1] == 'new'
+    assert response.json['senders'].keys() == {str(users[1].id)}
+
+    next_token = response.json['pagination']['sync_token']
+    assert client.get(f'{url}?since={next_token}', headers=headers).json['messages'] == []
+    assert client.get(f'{url}?since=not-a-token', headers=headers).status_code == 400
+
+def test_delta_sync_from_empty_conversation(client, users):
+    landlord, tenant = users
+    conversation = Conversation(initiator_id=landlord.id, participant_id=tenant.id)
+    db.session.add(conversation)
+    db.session.commit()
+    headers = _auth_headers(tenant)
+    url = f'/api/conversations/{conversation.id}/messages'
+
+    token = client.get(url, headers=headers).json['pagination']['sync_token']
+    response = client.get(f'{url}?since={token}', headers=headers)
+    assert response.status_code == 200
+    assert response.json['messages'] == [] and response.json['pagination']['sync_token'] == token
+
+    # The first message arrives: syncing from the empty token picks it up
+    db.session.add(Message(content='first', conversation_id=conversation.id, sender_id=landlord.id))
+    db.session.commit()
+    response = client.get(f'{url}?since={token}', headers=headers)
+    assert [m['content'] for m in response.json['messages']] == ['first']
+    assert response.json['pagination']['sync_token'] != token
+
+def test_delta_sync_picks_up_late_commits(client, users):
+    from datetime import timedelta
+    landlord, tenant = users
+    conversation = Conversation(initiator_id=landlord.id, participant_id=tenant.id)
+    db.session.add(conversation)
+    db.session.commit()
+    conversation_id = conversation.id
+    headers = _auth_headers(tenant)
+    url = f'/api/conversations/{conversation_id}/messages'
+
+    sent = client.post(url, json={'content': 'newest'}, headers=_auth_headers(landlord)).json['message']
+    token = client.get(url, headers=headers).json['pagination']['sync_token']
+    response = client.get(f'{url}?since={token}', headers=headers)
+    # Changes inside the lag are sent again rather than skipped past
+    assert [m['content'] for m in response.json['messages']] == ['newest']
+    assert response.json['pagination']['has_more'] is False
+    token = response.json['pagination']['sync_token']
+
+    # Stamped before the newest message, but its transaction committed only now
+    stamped = db.session.get(Message, sent['id']).updated_at - timedelta(seconds=1)
+    db.session.add(Message(content='late', conversation_id=conversation_id, sender_id=landlord.id,
+                           created_at=stamped, updated_at=stamped))
+    db.session.commit()
+
+    response = client.get(f'{url}?since={token}', headers=headers)
+    assert [m['content'] for m in response.json['messages']] == ['late', 'newest']
+
+def test_conversation_counters(client, users):
+    landlord, tenant = users
+    conversation = Conversation(initiator_id=landlord.id, participant_id=tenant.id)
+    db.session.add(conversation)
+    db.session.commit()
+    conversation_id = conversation.id
+    url = f'/api/conversations/{conversation_id}/messages'
+
+    for content in ('one', 'two', 'three'):
+        assert client.post(url, json={'content': content, 'conversation_id': conversation_id}, headers=_auth_headers(landlord)).status_code == 201
+    client.post(url, json={'content': 'reply', 'conversation_id': conversation_id}, headers=_auth_headers(tenant))
+
+    def inbox(user):
+        conversations = client.get('/api/conversations', headers=_auth_headers(user)).json['conversations']
+        return {c['id']: (c['message_count'], c['unread_count']) for c in conversations}[conversation_id]
+
+    assert inbox(landlord) == (4, 1)
+    assert inbox(tenant) == (4, 3)
+
+    # Opening the conversation reads the tenant's side only
+    assert client.get(f'/api/conversations/{conversation_id}', headers=_auth_headers(tenant)).status_code == 200
+    assert inbox(tenant) == (4, 0)
+    assert inbox(landlord) == (4, 1)
+
+def test_conversation_sparse_fieldsets(app, client, users):
+    from tests.factories import count_statements
+    landlord, tenant = users
+    conversation = Conversation(initiator_id=landlord.id, participant_id=tenant.id, participant_unread_count=2)
+    db.session.add(conversation)
+    db.session.commit()
+    headers = _auth_headers(tenant)
+
+    with count_statements() as statements:
+        response = client.get('/api/conversations?fields=id', headers=headers)
+    # No relations embedded or loaded, and unread_count needs no extra query
+    assert response.json['conversations'] == [{'id': conversation.id, 'unread_count': 2}]
+    assert len(statements) == 1 and 'FROM chat_conversations' in statements[0]
+
+    response = client.get('/api/conversations?fields=id,participant,unread_count', headers=headers)
+    conversations = response.json['conversations']
+    assert set(conversations[0]) == {'id', 'participant', 'unread_count'}
+    assert conversations[0]['participant']['id'] == tenant.id
+
+def test_read_watermark_is_one_update(app, client, users, history):
+    from tests.factories import count_statements
+    conversation_id, ids = history
+    landlord, tenant = users
+    # history has no counters maintained; start from the real unread state
+    conversation = db.session.get(Conversation, conversation_id)
+    conversation.participant_unread_count = 6
+    db.session.commit()
+    url = f'/api/conversations/{conversation_id}/read'
+
+    with count_statements() as statements:
+        response = client.put(url, json={'up_to_id': ids[5]}, headers=_auth_headers(tenant))
+
+    # Tenant reads the landlord's messages 0, 2 and 4
+    assert response.status_code == 200
+    assert response.json == {'conversation_id': conversation_id, 'read_count': 3, 'unread_count': 3}
+    assert sum(s.lstrip().upper().startswith('UPDATE CHAT_MESSAGES') for s in statements) == 1
+
+    # Repeating is a no-op; no watermark reads the rest
+    assert client.put(url, json={'up_to_id': ids[5]}, headers=_auth_headers(tenant)).json['read_count'] == 0
+    assert client.put(url, headers=_auth_headers(tenant)).json == {
+        'conversation_id': conversation_id, 'read_count': 3, 'unread_count': 0}
+    assert Message.query.filter_by(conversation_id=conversation_id, sender_id=landlord.id,
+                                   is_read=False).count() == 0
+    assert client.put(url, json={'up_to_id': 'x'}, headers=_auth_headers(tenant)).status_code == 400
+
+def test_presence_multi_device_across_workers():
+    import time
+    from app.utils.presence import InMemoryRedis, PresenceStore
+    shared = InMemoryRedis()  # Stands in for the Redis server
+    worker_a, worker_b = PresenceStore(shared, ttl=60), PresenceStore(shared, ttl=60)
+
+    # User 1 on phone (worker A) and laptop (worker B)
+    worker_a.connect(1, 'phone')
+    worker_b.connect(1, 'laptop')
+    worker_b.connect(2, 'desktop')
+    assert worker_a.sids_for(1) == {'phone', 'laptop'}
+    assert worker_a.online_among([1, 2, 3]) == [1, 2]
+
+    # Closing one device keeps the user online
+    assert worker_a.disconnect('phone') == (1, True)
+    assert worker_b.is_online(1)
+    assert worker_b.disconnect('laptop') == (1, False)
+    assert not worker_a.is_online(1)
+    assert worker_a.last_seen(1) is not None
+    assert worker_a.disconnect('laptop') == (None, False)  # Already gone
+
+    # Worker B dies without disconnecting: its socket expires after the TTL
+    shared.zadd(PresenceStore.SEEN_KEY, {'desktop': time.time() - 120})
+    assert worker_a.expire_stale() == [2]
+    assert worker_a.online_among([1, 2]) == []
+
+def test_socket_identity_comes_from_token(app, users):
+    from tests.factories import count_statements
+    from flask_jwt_extended import create_access_token
+    from app import socketio
+    landlord, tenant = users
+    conversation = Conversation(initiator_id=landlord.id, participant_id=tenant.id)
+    db.session.add(conversation)
+    db.session.commit()
+    conversation_id = conversation.id
+
+    socket = socketio.test_client(app)
+    # Unauthenticated events are refused
+    socket.emit('send_message', {'conversation_id': conversation_id, 'user_id': landlord.id, 'content': 'spoof'})
+    socket.emit('authenticate', {'token': create_access_token(identity=tenant.id)})
+    # A client-supplied user_id can't impersonate the other participant
+    socket.emit('send_message', {'conversation_id': conversation_id, 'user_id': landlord.id, 'content': 'hi'})
+    messages = Message.query.filter_by(conversation_id=conversation_id).all()
+    assert [(m.sender_id, m.content) for m in messages] == [(tenant.id, 'hi')]
+
+    # Membership is cached per connection: typing costs no queries
+    with count_statements() as statements:
+        for _ in range(20):
+            socket.emit('typing', {'conversation_id': conversation_id, 'is_typing': True})
+    assert statements == []
+    socket.disconnect()
+
+def test_typing_is_coalesced_and_rate_limited(app, users):
+    from unittest import mock
+    from flask_jwt_extended import create_access_token
+    from app import socketio
+    landlord, tenant = users
+    conversation = Conversation(initiator_id=landlord.id, participant_id=tenant.id)
+    db.session.add(conversation)
+    db.session.commit()
+    app.config.update(SOCKET_EVENT_RATE=0.001, SOCKET_EVENT_BURST=30)
+
+    socket = socketio.test_client(app)
+    socket.emit('authenticate', {'token': create_access_token(identity=tenant.id)})
+    with mock.patch('app.sockets.notify_user') as notify_user:
+        # A burst of keystrokes relays one start; stopping relays one stop
+        for _ in range(10):
+            socket.emit('typing', {'conversation_id': conversation.id, 'is_typing': True})
+        socket.emit('typing', {'conversation_id': conversation.id, 'is_typing': False})
+        socket.emit('typing', {'conversation_id': conversation.id, 'is_typing': False})
+        relayed = [call.args[2]['is_typing'] for call in notify_user.call_args_list]
+        assert relayed == [True, False]
+        assert notify_user.call_args_list[0].args[:2] == (landlord.id, 'user_typing')
+
+        # 12 of the 30-event burst are spent; of 60 more state changes only 18 get through
+        for _ in range(30):
+            socket.emit('typing', {'conversation_id': conversation.id, 'is_typing': True})
+            socket.emit('typing', {'conversation_id': conversation.id, 'is_typing': False})
+        assert len(notify_user.call_args_list) == 2 + 18
+    socket.disconnect()
+
+def test_token_bucket():
+    from unittest import mock
+    from app.utils.rate_limit import TokenBucket
+    with mock.patch('app.utils.rate_limit.time.monotonic', return_value=100.0) as clock:
+        bucket = TokenBucket(rate=2, capacity=3)
+        assert [bucket.allow() for _ in range(4)] == [True, True, True, False]
+        clock.return_value = 101.0  # Two more tokens after a second
+        assert [bucket.allow() for _ in range(3)] == [True, True, False]
+
+def test_write_behind_batches_and_recovers_after_crash(app, users, tmp_path):
+    from app.utils.message_buffer import WriteBehindBuffer
+    landlord, tenant = users
+    conversation = Conversation(initiator_id=landlord.id, participant_id=tenant.id)
+    db.session.add(conversation)
+    db.session.commit()
+    conversation_id = conversation.id
+    app.config['CHAT_JOURNAL_DIR'] = str(tmp_path)
+
+    def stored():
+        db.session.expire_all()
+        return Message.query.filter_by(conversation_id=conversation_id).order_by(Message.created_at).all()
+
+    # Batched: nothing is written until flush, then one batch
+    buffer = WriteBehindBuffer(app)
+    buffer._flusher_started = True  # Flush by hand
+    buffer.enqueue(conversation_id, landlord.id, 'one')
+    buffer.enqueue(conversation_id, tenant.id, 'two')
+    assert stored() == []
+    assert buffer.flush() == 2
+    assert [m.content for m in stored()] == ['one', 'two']
+
+    # Crash: three messages journaled (and broadcast) but never flushed
+    for content in ('three', 'four', 'five'):
+        buffer.enqueue(conversation_id, landlord.id, content)
+    journal = buffer.journal.read()
+    assert len(journal) == 3
+    with open(buffer.journal.path, 'a') as torn:
+        torn.write('{"client_uid": "torn')  # Half-written append at the moment of the crash
+
+    restarted = WriteBehindBuffer(app)
+    assert restarted.recover() == 3
+    assert [m.content for m in stored()] == ['one', 'two', 'three', 'four', 'five']
+    assert list(tmp_path.iterdir()) == []
+
+    # Crash after commit but before the journal was trimmed: replay inserts nothing twice
+    buffer.journal.rewrite(journal)
+    assert WriteBehindBuffer(app).recover() == 0
+    assert len(stored()) == 5
+
+    conversation = db.session.get(Conversation, conversation_id)
+    assert conversation.message_count == 5
+    assert (conversation.participant_unread_count, conversation.initiator_unread_count) == (4, 1)
+    assert conversation.last_message == 'five'
+
+def test_write_behind_drops_messages_of_deleted_conversations(app, users, tmp_path):
+    from app.utils.message_buffer import WriteBehindBuffer
+    landlord, tenant = users
+    doomed = Conversation(initiator_id=landlord.id, participant_id=tenant.id)
+    kept = Conversation(initiator_id=tenant.id, participant_id=landlord.id)
+    db.session.add_all([doomed, kept])
+    db.session.commit()
+    doomed_id, kept_id = doomed.id, kept.id
+    app.config['CHAT_JOURNAL_DIR'] = str(tmp_path)
+
+    buffer = WriteBehindBuffer(app)
+    buffer._flusher_started = True  # Flush by hand
+    buffer.enqueue(doomed_id, landlord.id, 'lost')
+    buffer.enqueue(kept_id, tenant.id, 'one')
+    db.session.delete(doomed)
+    db.session.commit()
+
+    assert buffer.flush() == 1
+    buffer.enqueue(kept_id, landlord.id, 'two')
+    assert buffer.flush() == 1
+    assert buffer._pending == [] and list(tmp_path.iterdir()) == []
+    db.session.expire_all()
+    assert [m.content for m in Message.query.order_by(Message.created_at)] == ['one', 'two']
+
+def test_write_behind_recovery_skips_foreign_journal_files(app, users, tmp_path):
+    import json
+    from app.utils.message_buffer import WriteBehindBuffer
+    landlord, tenant = users
+    conversation = Conversation(initiator_id=landlord.id, participant_id=tenant.id)
+    db.session.add(conversation)
+    db.session.commit()
+    app.config['CHAT_JOURNAL_DIR'] = str(tmp_path)
+
+    (tmp_path / 'journal-backup.jsonl').write_text('')
+    record = {'client_uid': 'dead-worker', 'conversation_id': conversation.id, 'sender_id': landlord.id,
+              'content': 'left behind', 'created_at': '2024-01-01T00:00:00'}
+    (tmp_path / 'journal-999999999.jsonl').write_text(json.dumps(record) + '\n')  # No such pid
+    assert WriteBehindBuffer(app).recover() == 1
+    assert Message.query.filter_by(client_uid='dead-worker').count() == 1
+
+def test_socket_mark_read_rejects_bad_watermark(app, users, history):
+    from unittest import mock
+    from flask_jwt_extended import create_access_token
+    from app import socketio
+    conversation_id, ids = history
+    landlord, tenant = users
+
+    socket = socketio.test_client(app)
+    socket.emit('authenticate', {'token': create_access_token(identity=tenant.id)})
+    with mock.patch('app.sockets.emit') as emit:
+        for up_to_id in ('5', 'x', True, 0, -1, 2 ** 40, 1.5):
+            emit.reset_mock()
+            socket.emit('mark_read', {'conversation_id': conversation_id, 'up_to_id': up_to_id})
+            assert [call.args[0] for call in emit.call_args_list] == ['error']
+        assert Message.query.filter_by(conversation_id=conversation_id, is_read=True).count() == 0
+
+        emit.reset_mock()
+        socket.emit('mark_read', {'conversation_id': conversation_id, 'up_to_id': ids[5]})
+        emit.assert_called_once_with('marked_read', {'conversation_id': conversation_id, 'count': 3})
+    socket.disconnect()
@@ -0,0 +1,28 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_fresh_upgrade_reaches_head(tmp_path):
+    database = tmp_path / 'fresh.db'
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{database}', EMAIL_OUTBOX_WORKER='false')
+    result = subprocess.run(
+        [sys.executable, '-m', 'flask', '--app', 'run', 'db', 'upgrade'],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    connection = sqlite3.connect(database)
+    try:
+        heads = os.listdir(os.path.join(ROOT, 'migrations', 'versions'))
+        latest = max(name.split('_')[0] for name in heads if name.endswith('.py'))
+        assert connection.execute('SELECT version_num FROM alembic_version').fetchall() == [(latest,)]
+
+        columns = {row[1] for row in connection.execute('PRAGMA table_info(payments)')}
+        assert {'mpesa_checkout_id', 'phone_number'} <= columns
+        indexes = {row[1]: row[2] for row in connection.execute('PRAGMA index_list(payments)')}
+        assert indexes['ix_payments_mpesa_checkout_id'] == 1  # Unique
+    finally:
+        connection.close()
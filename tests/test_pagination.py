@@ -0,0 +1,17 @@
+import pytest
+from datetime import datetime
+from app.utils.pagination import encode_cursor, decode_cursor, InvalidCursorError
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 1, 15, 10, 30, 0, 123456)
+    cursor = encode_cursor(created_at, 42)
+
+    assert decode_cursor(cursor) == (created_at, 42)
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor(datetime(2024, 1, 15), 7)
+    assert '=' not in cursor and '/' not in cursor and '+' not in cursor
+
+def test_invalid_cursor_rejected():
+    with pytest.raises(InvalidCursorError):
+        decode_cursor('not-a-cursor')
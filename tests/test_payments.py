@@ -1,11 +1,12 @@
 import unittest
 from app import create_app
 from app.models import db, User, Payment
+from tests.factories import make_user, make_property, make_rental, count_statements
 
 class PaymentTestCase(unittest.TestCase):
     def setUp(self):
-        self.app = create_app()
-        self.app.config['TESTING'] = True
+        from app.config import TestingConfig
+        self.app = create_app(TestingConfig)
         self.client = self.app.test_client()
         
         with self.app.app_context():
@@ -16,5 +17,345 @@ class PaymentTestCase(unittest.TestCase):
             db.drop_all()
     
     def test_get_payments(self):
-        response = self.client.get('/api/payments/')
-        self.assertEqual(response.status_code, 401)  # Requires auth
\ No newline at end of file
+        response = self.client.get('/api/payments')
+        self.assertEqual(response.status_code, 401)  # Requires auth
+
+class PaymentDatabaseTestCase(unittest.TestCase):
+    """Base case with an in-memory database and user helpers"""
+    def setUp(self):
+        from app.config import TestingConfig
+        self.app = create_app(TestingConfig)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+class PaymentSerializationTestCase(PaymentDatabaseTestCase):
+    """Listing payments must cost a constant number of queries"""
+    def _seed(self, count):
+        from datetime import datetime
+        landlord = make_user(f'landlord{count}@test.com', 'landlord')
+        for i in range(count):
+            tenant = make_user(f'tenant{count}-{i}@test.com', 'tenant')
+            prop = make_property(landlord, tenant, title=f'Unit {i}')
+            db.session.add(Payment(amount=1000, payment_date=datetime.utcnow(),
+                                   property_id=prop.id, tenant_id=tenant.id,
+                                   reference=f'ref-{count}-{i}'))
+        db.session.commit()
+        landlord_id = landlord.id
+        db.session.expunge_all()
+        return landlord_id
+
+    def _count_list_queries(self, landlord_id, expected):
+        from flask_jwt_extended import create_access_token
+        headers = {'Authorization': f'Bearer {create_access_token(identity=landlord_id)}'}
+        with count_statements() as statements:
+            response = self.app.test_client().get('/api/payments', headers=headers)
+        self.assertEqual(len(response.get_json()['payments']), expected)
+        db.session.expunge_all()
+        return len(statements)
+
+    def test_list_query_count_is_constant(self):
+        small = self._count_list_queries(self._seed(2), 2)
+        large = self._count_list_queries(self._seed(10), 10)
+        self.assertEqual(small, large)
+
+class LandlordMonthlyStatsTestCase(PaymentDatabaseTestCase):
+    """Incremental rollup updates must match a full rebuild"""
+    def test_incremental_updates_match_rebuild(self):
+        from datetime import datetime
+        from app.models import PaymentStatus, LandlordMonthlyStats
+        landlord, tenant, prop = make_rental()
+
+        payments = []
+        for i, amount in enumerate([1000, 1500, 700]):
+            payment = Payment(amount=amount, payment_date=datetime(2024, 3, 5 + i),
+                              property_id=prop.id, tenant_id=tenant.id, reference=f'ref-{i}')
+            db.session.add(payment)
+            db.session.flush()
+            LandlordMonthlyStats.record_payment(payment)
+            payments.append(payment)
+        db.session.commit()
+
+        for payment, status in zip(payments, [PaymentStatus.COMPLETED, PaymentStatus.COMPLETED, PaymentStatus.FAILED]):
+            old_status = payment.status
+            payment.status = status
+            LandlordMonthlyStats.record_payment(payment, old_status)
+            db.session.commit()
+
+        incremental = LandlordMonthlyStats.query.filter_by(landlord_id=landlord.id).one().to_dict()
+        self.assertEqual(incremental['completed_total'], 2500.0)
+        self.assertEqual(incremental['pending_count'], 0)
+        self.assertEqual(incremental['failed_count'], 1)
+
+        LandlordMonthlyStats.rebuild(landlord.id)
+        rebuilt = LandlordMonthlyStats.query.filter_by(landlord_id=landlord.id).one().to_dict()
+        self.assertEqual(incremental, rebuilt)
+
+    def test_landlord_status_update_feeds_rollup(self):
+        from datetime import datetime
+        from flask_jwt_extended import create_access_token
+        from app.models import LandlordMonthlyStats, EmailOutbox
+        self.app.config['SENDGRID_API_KEY'] = 'test-key'
+        landlord, tenant, prop = make_rental()
+        payment = Payment(amount=1200, payment_date=datetime(2024, 3, 5), property_id=prop.id,
+                          tenant_id=tenant.id, reference='ref-put')
+        db.session.add(payment)
+        db.session.flush()
+        LandlordMonthlyStats.record_payment(payment)
+        db.session.commit()
+
+        client = self.app.test_client()
+        url = f'/api/payments/{payment.id}'
+        headers = {'Authorization': f'Bearer {create_access_token(identity=landlord.id)}'}
+        self.assertEqual(client.put(url, headers=headers, json={'status': 'paid'}).status_code, 400)
+        self.assertEqual(client.put(url, headers=headers, json={'status': None}).status_code, 400)
+
+        for _ in range(2):  # Repeating the update changes nothing
+            response = client.put(url, headers=headers, json={'status': 'completed'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json()['payment']['status'], 'completed')
+
+        db.session.expire_all()
+        stats = LandlordMonthlyStats.query.one()
+        self.assertEqual((stats.pending_count, stats.completed_count, float(stats.completed_total)), (0, 1, 1200.0))
+        self.assertEqual(EmailOutbox.query.count(), 1)
+
+        tenant_headers = {'Authorization': f'Bearer {create_access_token(identity=tenant.id)}'}
+        self.assertEqual(client.put(url, headers=tenant_headers, json={'status': 'failed'}).status_code, 403)
+
+class PaymentCallbackBurstTestCase(PaymentDatabaseTestCase):
+    """Replays a month-end burst of M-Pesa callbacks, duplicates included"""
+    PAYMENTS = 50
+    DELIVERIES = 3  # Safaricom retries: every callback arrives several times
+
+    def _callback(self, checkout_id, result_code):
+        return {'Body': {'stkCallback': {
+            'MerchantRequestID': f'merchant-{checkout_id}',
+            'CheckoutRequestID': checkout_id,
+            'ResultCode': result_code,
+            'ResultDesc': 'processed'
+        }}}
+
+    def test_duplicate_callbacks_are_idempotent(self):
+        import random
+        from datetime import datetime
+        from app.models import PaymentStatus, LandlordMonthlyStats
+        landlord, tenant, prop = make_rental()
+        for i in range(self.PAYMENTS):
+            payment = Payment(amount=1000, payment_date=datetime.utcnow(), property_id=prop.id,
+                              tenant_id=tenant.id, reference=f'ref-{i}', mpesa_checkout_id=f'ws_CO_{i}')
+            db.session.add(payment)
+            db.session.flush()
+            LandlordMonthlyStats.record_payment(payment)
+        db.session.commit()
+
+        # Even ids succeed, odd ids fail; deliveries arrive shuffled
+        burst = [(f'ws_CO_{i}', 0 if i % 2 == 0 else 1032)
+                 for i in range(self.PAYMENTS) for _ in range(self.DELIVERIES)]
+        random.Random(42).shuffle(burst)
+
+        client = self.app.test_client()
+        for checkout_id, result_code in burst:
+            response = client.post('/api/payments/callback', json=self._callback(checkout_id, result_code))
+            self.assertEqual(response.status_code, 200)
+
+        db.session.expire_all()
+        completed = Payment.query.filter_by(status=PaymentStatus.COMPLETED).count()
+        failed = Payment.query.filter_by(status=PaymentStatus.FAILED).count()
+        self.assertEqual(completed, self.PAYMENTS // 2)
+        self.assertEqual(failed, self.PAYMENTS // 2)
+
+        # Rollup counted each payment exactly once despite the retries
+        stats = LandlordMonthlyStats.query.filter_by(landlord_id=landlord.id).one()
+        self.assertEqual(stats.completed_count, self.PAYMENTS // 2)
+        self.assertEqual(stats.failed_count, self.PAYMENTS // 2)
+        self.assertEqual(stats.pending_count, 0)
+
+class EmailOutboxTestCase(PaymentDatabaseTestCase):
+    """Confirmation emails are queued with the status change and sent by the worker"""
+    def test_callback_queues_one_email_and_worker_retries(self):
+        from datetime import datetime, timedelta
+        from unittest import mock
+        from app.models import EmailOutbox
+        from app.utils.email_outbox import drain_outbox
+        self.app.config['SENDGRID_API_KEY'] = 'test-key'
+        landlord, tenant, prop = make_rental()
+        db.session.add(Payment(amount=1000, payment_date=datetime.utcnow(), property_id=prop.id,
+                               tenant_id=tenant.id, reference='ref-1', mpesa_checkout_id='ws_CO_1'))
+        db.session.commit()
+
+        client = self.app.test_client()
+        callback = {'Body': {'stkCallback': {'CheckoutRequestID': 'ws_CO_1', 'ResultCode': 0}}}
+        with mock.patch('app.utils.email.send_email') as send_email:
+            for _ in range(3):
+                self.assertEqual(client.post('/api/payments/callback', json=callback).status_code, 200)
+            send_email.assert_not_called()  # Nothing sent on the request path
+
+        email = EmailOutbox.query.one()
+        self.assertEqual((email.to_email, email.status), ('tenant@test.com', 'pending'))
+
+        # Provider down: attempt recorded and retry pushed back
+        with mock.patch('app.utils.email_outbox.send_email', return_value=False):
+            self.assertEqual(drain_outbox(), 1)
+            self.assertEqual(drain_outbox(), 0)  # Not due yet
+        self.assertEqual((email.status, email.attempts), ('pending', 1))
+        self.assertGreater(email.next_attempt_at, datetime.utcnow())
+
+        email.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        with mock.patch('app.utils.email_outbox.send_email', return_value=True) as send_email:
+            self.assertEqual(drain_outbox(), 1)
+            send_email.assert_called_once_with(email.to_email, email.subject, email.html_content)
+        self.assertEqual((email.status, email.attempts), ('sent', 2))
+
+    def test_worker_commits_each_email_and_leases_the_rest(self):
+        from unittest import mock
+        from app.models import EmailOutbox
+        from app.utils.email_outbox import drain_outbox
+        for i in range(3):
+            EmailOutbox.enqueue(f'tenant{i}@test.com', 'Receipt', '<p>Paid</p>')
+        db.session.commit()
+
+        # Worker dies while sending the second email
+        with mock.patch('app.utils.email_outbox.send_email', side_effect=[True, RuntimeError('killed')]):
+            with self.assertRaises(RuntimeError):
+                drain_outbox()
+        db.session.rollback()
+
+        statuses = [email.status for email in EmailOutbox.query.order_by(EmailOutbox.id)]
+        self.assertEqual(statuses, ['sent', 'pending', 'pending'])
+        # The unsent emails stay leased, so other workers don't pick them up yet
+        with mock.patch('app.utils.email_outbox.send_email') as send_email:
+            self.assertEqual(drain_outbox(), 0)
+            send_email.assert_not_called()
+
+class MPesaClientTestCase(unittest.TestCase):
+    """STK pushes reuse one pooled session and a cached access token"""
+    def setUp(self):
+        from app.config import TestingConfig
+        from app.utils.payments import reset_daraja_client
+        reset_daraja_client()
+        self.app = create_app(TestingConfig)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+
+    def tearDown(self):
+        from app.utils.payments import reset_daraja_client
+        reset_daraja_client()
+        self.ctx.pop()
+
+    def _fake_session(self):
+        import threading
+        import time
+        from unittest import mock
+        calls = []
+        lock = threading.Lock()
+        def request(method, url, **kwargs):
+            self.assertIn('timeout', kwargs)
+            with lock:
+                calls.append(url)
+            response = mock.Mock(status_code=200)
+            if 'oauth' in url:
+                time.sleep(0.05)  # Slow token endpoint widens the stampede window
+                response.json.return_value = {'access_token': 'token', 'expires_in': '3599'}
+            else:
+                response.json.return_value = {'CheckoutRequestID': 'ws_CO_1', 'ResponseCode': '0'}
+            return response
+        return mock.Mock(request=request), calls
+
+    def test_token_fetched_once_for_concurrent_pushes(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from unittest import mock
+        from app.utils.payments import MPesaService, get_daraja_metrics
+        session, calls = self._fake_session()
+        app = self.app
+
+        def push(i):
+            with app.app_context():
+                return MPesaService().initiate_payment('254712345678', 1000, f'ref-{i}')
+
+        with mock.patch('app.utils.payments.get_session', return_value=session):
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                results = list(pool.map(push, range(20)))
+
+        self.assertTrue(all('CheckoutRequestID' in result for result in results))
+        self.assertEqual(sum('oauth' in url for url in calls), 1)
+        self.assertEqual(len(calls), 21)
+        metrics = get_daraja_metrics()
+        self.assertEqual((metrics['oauth']['calls'], metrics['stkpush']['calls']), (1, 20))
+
+class AsyncStkPushTestCase(PaymentDatabaseTestCase):
+    """POST /api/payments answers before Daraja does"""
+    def _setup_tenant(self):
+        from flask_jwt_extended import create_access_token
+        landlord, tenant, prop = make_rental()
+        db.session.commit()
+        return prop.id, {'Authorization': f'Bearer {create_access_token(identity=tenant.id)}'}
+
+    def _create_payment(self, initiate_payment):
+        import time
+        from unittest import mock
+        from app.utils import stk_push
+        property_id, headers = self._setup_tenant()
+        futures = []
+        def submit(payment_id):
+            futures.append(stk_push.submit_stk_push(payment_id))
+        with mock.patch('app.utils.stk_push.MPesaService') as service, \
+             mock.patch('app.resources.payments.submit_stk_push', side_effect=submit):
+            service.return_value.initiate_payment.side_effect = initiate_payment
+            started = time.perf_counter()
+            response = self.app.test_client().post('/api/payments', headers=headers, json={
+                'property_id': property_id, 'amount': 1000, 'phone_number': '254712345678'})
+            elapsed = time.perf_counter() - started
+            for future in futures:
+                future.result(timeout=5)
+        db.session.expire_all()
+        return response, elapsed
+
+    def test_push_runs_in_background_and_records_checkout_id(self):
+        import time
+        def slow_daraja(phone_number, amount, reference):
+            time.sleep(0.5)
+            return {'CheckoutRequestID': 'ws_CO_async'}
+        response, elapsed = self._create_payment(slow_daraja)
+        self.assertEqual(response.status_code, 202)
+        self.assertLess(elapsed, 0.5)
+        payment_id = response.get_json()['payment']['id']
+        self.assertEqual(response.headers['Location'], f'/api/payments/{payment_id}')
+        self.assertIsNone(response.get_json()['payment']['mpesa_checkout_id'])
+        self.assertEqual(db.session.get(Payment, payment_id).mpesa_checkout_id, 'ws_CO_async')
+
+    def test_failed_push_marks_payment_failed(self):
+        from app.models import PaymentStatus, LandlordMonthlyStats
+        response, _ = self._create_payment(lambda *args: {'error': 'Failed to get access token'})
+        self.assertEqual(response.status_code, 202)
+        payment = db.session.get(Payment, response.get_json()['payment']['id'])
+        self.assertEqual(payment.status, PaymentStatus.FAILED)
+        stats = LandlordMonthlyStats.query.one()
+        self.assertEqual((stats.pending_count, stats.failed_count), (0, 1))
+
+    def test_push_that_raises_marks_payment_failed(self):
+        from app.models import PaymentStatus, LandlordMonthlyStats
+        def unreachable(*args):
+            raise ConnectionError('Daraja unreachable')
+        response, _ = self._create_payment(unreachable)
+        self.assertEqual(response.status_code, 202)
+        payment = db.session.get(Payment, response.get_json()['payment']['id'])
+        self.assertEqual(payment.status, PaymentStatus.FAILED)
+        stats = LandlordMonthlyStats.query.one()
+        self.assertEqual((stats.pending_count, stats.failed_count), (0, 1))
+
+    def test_invalid_payment_method_is_rejected(self):
+        from unittest import mock
+        property_id, headers = self._setup_tenant()
+        with mock.patch('app.resources.payments.submit_stk_push') as submit:
+            response = self.app.test_client().post('/api/payments', headers=headers, json={
+                'property_id': property_id, 'amount': 1000, 'payment_method': 'cheque'})
+        self.assertEqual(response.status_code, 400)
+        submit.assert_not_called()
+        self.assertEqual(Payment.query.count(), 0)
@@ -4,9 +4,8 @@ from app.models import db, User, Property
 
 @pytest.fixture
 def app():
-    app = create_app()
-    app.config['TESTING'] = True
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    from app.config import TestingConfig
+    app = create_app(TestingConfig)  # The database URI is read when the app is created
 
     with app.app_context():
         db.create_all()
@@ -33,7 +32,7 @@ def auth_headers(client):
     return {'Authorization': f'Bearer {token}'}
 
 def test_create_property(client, auth_headers):
-    response = client.post('/api/properties/', json={
+    response = client.post('/api/properties', json={
         'title': 'Test Property',
         'address': '123 Test St',
         'city': 'Test City',
@@ -47,10 +46,264 @@ def test_create_property(client, auth_headers):
     assert response.json['property']['title'] == 'Test Property'
 
 def test_get_properties(client, auth_headers):
-    response = client.get('/api/properties/', headers=auth_headers)
+    response = client.get('/api/properties', headers=auth_headers)
     assert response.status_code == 200
     assert 'properties' in response.json
 
 def test_unauthorized_access(client):
-    response = client.get('/api/properties/')
-    assert response.status_code == 401
\ No newline at end of file
+    response = client.get('/api/properties')
+    assert response.status_code == 401
+
+def _create_property(client, auth_headers, **overrides):
+    data = {
+        'title': 'Test Property',
+        'address': '123 Test St',
+        'city': 'Nairobi',
+        'state': 'NA',
+        'zip_code': '00100',
+        'property_type': 'apartment',
+        'monthly_rent': 1500.00,
+        'bedrooms': 2
+    }
+    data.update(overrides)
+    return client.post('/api/properties', json=data, headers=auth_headers)
+
+def test_get_properties_cursor_pagination(client, auth_headers):
+    for i in range(5):
+        _create_property(client, auth_headers, title=f'Property {i}')
+
+    first = client.get('/api/properties?limit=2', headers=auth_headers).json
+    assert len(first['properties']) == 2
+    assert first['pagination']['has_more'] is True
+
+    seen = [p['id'] for p in first['properties']]
+    cursor = first['pagination']['next_cursor']
+    while cursor:
+        page = client.get(f'/api/properties?limit=2&cursor={cursor}', headers=auth_headers).json
+        seen.extend(p['id'] for p in page['properties'])
+        cursor = page['pagination']['next_cursor']
+
+    assert len(seen) == 5
+    assert len(set(seen)) == 5
+
+def test_get_properties_filters(client, auth_headers):
+    _create_property(client, auth_headers, city='Nairobi', monthly_rent=1000, bedrooms=1)
+    _create_property(client, auth_headers, city='Mombasa', monthly_rent=3000, bedrooms=3)
+
+    response = client.get('/api/properties?city=mombasa', headers=auth_headers)
+    assert [p['city'] for p in response.json['properties']] == ['Mombasa']
+
+    response = client.get('/api/properties?max_rent=2000', headers=auth_headers)
+    assert [p['bedrooms'] for p in response.json['properties']] == [1]
+
+    response = client.get('/api/properties?status=bogus', headers=auth_headers)
+    assert response.status_code == 400
+
+def test_get_properties_sparse_fieldsets(client, auth_headers):
+    _create_property(client, auth_headers)
+
+    response = client.get('/api/properties?fields=id,title&expand=', headers=auth_headers)
+    assert response.status_code == 200
+    assert set(response.json['properties'][0]) == {'id', 'title'}
+
+    response = client.get('/api/properties?fields=id,landlord&expand=landlord', headers=auth_headers)
+    assert set(response.json['properties'][0]) == {'id', 'landlord'}
+
+    # With fields, relations are embedded only when listed
+    response = client.get('/api/properties?fields=id&expand=landlord', headers=auth_headers)
+    assert set(response.json['properties'][0]) == {'id'}
+    response = client.get('/api/properties?fields=id,tenant', headers=auth_headers)
+    assert set(response.json['properties'][0]) == {'id', 'tenant'}
+
+    response = client.get('/api/properties?expand=payments', headers=auth_headers)
+    assert response.status_code == 400
+
+def test_current_user_is_loaded_once_per_request(app, client, auth_headers):
+    from flask_jwt_extended import decode_token
+    from flask_jwt_extended import verify_jwt_in_request
+    from app.utils.decorators import landlord_required
+    from tests.factories import count_statements
+
+    token = auth_headers['Authorization'].split()[1]
+    assert decode_token(token)['role'] == 'landlord'
+
+    with count_statements() as statements:
+        assert client.get('/api/properties', headers=auth_headers).status_code == 200
+    user_queries = [s for s in statements if 'FROM users' in s]
+    assert len(user_queries) == 1 and 'profiles' in user_queries[0]
+    assert not [s for s in statements if 'FROM profiles' in s]
+
+    # Role claim answers the decorator without touching the database
+    with count_statements() as statements, app.test_request_context(headers=auth_headers):
+        verify_jwt_in_request()
+        assert landlord_required(lambda: 'ok')() == 'ok'
+    assert statements == []
+
+def _login(client, email='landlord@test.com', password='password123'):
+    return client.post('/api/auth/login', json={'email': email, 'password': password}).json
+
+def test_refresh_tokens_rotate_and_reuse_revokes_session(client, auth_headers):
+    from flask_jwt_extended import decode_token
+    from app.models import RefreshToken
+
+    session = _login(client)
+    first = session['refresh_token']
+    assert RefreshToken.query.filter_by(token_hash=first).first() is None  # Stored hashed
+
+    rotated = client.post('/api/auth/refresh', json={'refresh_token': first})
+    assert rotated.status_code == 200
+    claims = decode_token(rotated.json['token'])
+    assert claims['role'] == 'landlord' and claims['exp'] - claims['iat'] == 15 * 60
+    second = rotated.json['refresh_token']
+    assert second != first
+    headers = {'Authorization': f"Bearer {rotated.json['token']}"}
+    assert client.get('/api/properties', headers=headers).status_code == 200
+
+    # Replaying the rotated token revokes the whole session, including its successor
+    assert client.post('/api/auth/refresh', json={'refresh_token': first}).status_code == 401
+    assert client.post('/api/auth/refresh', json={'refresh_token': second}).status_code == 401
+
+    # Other sessions are untouched
+    other = _login(client)['refresh_token']
+    assert client.post('/api/auth/refresh', json={'refresh_token': other}).status_code == 200
+    assert client.post('/api/auth/refresh', json={}).status_code == 400
+
+def test_logout_revokes_every_session(client, auth_headers):
+    from flask_jwt_extended import decode_token
+
+    sessions = [_login(client) for _ in range(2)]
+    claims = decode_token(sessions[0]['token'])
+    assert claims['is_active'] is True and claims['token_version'] == 0
+
+    assert client.post('/api/auth/logout', headers=auth_headers).status_code == 200
+    for session in sessions:
+        response = client.post('/api/auth/refresh', json={'refresh_token': session['refresh_token']})
+        assert response.status_code == 401
+
+    # Access tokens aren't looked up; they lapse within JWT_ACCESS_TOKEN_EXPIRES
+    assert client.get('/api/properties', headers=auth_headers).status_code == 200
+    assert decode_token(_login(client)['token'])['token_version'] == 1
+
+def test_cached_token_version_expires(app, auth_headers):
+    import time
+    from unittest import mock
+    from app.utils.auth import current_token_version
+
+    user = User.query.filter_by(email='landlord@test.com').one()
+    assert current_token_version(user.id) == 0
+    # Revoked through another worker: this process's cache entry isn't dropped
+    user.token_version = 1
+    db.session.commit()
+    assert current_token_version(user.id) == 0
+    later = time.monotonic() + app.config['TOKEN_VERSION_CACHE_SECONDS'] + 1
+    with mock.patch('app.utils.presence.time.monotonic', return_value=later):
+        assert current_token_version(user.id) == 1
+
+def test_login_upgrades_legacy_password_hash(app, client):
+    from werkzeug.security import generate_password_hash
+    from app.utils.passwords import PasswordHasher, PasswordHasherBusy, get_password_hasher
+
+    user = User(email='legacy@test.com', first_name='Old', last_name='Hash', role='tenant')
+    user.password_hash = generate_password_hash('password123')
+    db.session.add(user)
+    db.session.commit()
+
+    credentials = {'email': 'legacy@test.com', 'password': 'password123'}
+    assert client.post('/api/auth/login', json=credentials).status_code == 200
+    user = User.query.filter_by(email='legacy@test.com').first()
+    assert user.password_hash.startswith('$2b$') and not user.password_needs_rehash()
+    assert client.post('/api/auth/login', json=credentials).status_code == 200
+    assert client.post('/api/auth/login', json=dict(credentials, password='wrong')).status_code == 401
+
+    metrics = get_password_hasher().metrics()
+    assert metrics['completed'] >= 4 and metrics['waiting'] == 0 and metrics['active'] == 0
+
+    # Passwords past bcrypt's 72 byte limit still count in full
+    hasher = PasswordHasher(rounds=4, workers=1, max_queue=0)
+    with pytest.raises(PasswordHasherBusy):
+        hasher.hash('x' * 100)
+    hasher.max_queue = 1
+    long_hash = hasher.hash('x' * 100)
+    assert hasher.verify(long_hash, 'x' * 100) and not hasher.verify(long_hash, 'x' * 99)
+
+def test_login_throttled_per_email_before_hashing(app, client, auth_headers):
+    from app.utils.passwords import get_password_hasher
+
+    app.extensions['login_limiters']['email'].limit = 3
+    bad = {'email': 'landlord@test.com', 'password': 'wrong'}
+    assert [client.post('/api/auth/login', json=bad).status_code for _ in range(3)] == [401] * 3
+
+    hashed = get_password_hasher().metrics()['completed']
+    response = client.post('/api/auth/login', json=dict(bad, password='password123'))
+    assert response.status_code == 429 and int(response.headers['Retry-After']) >= 1
+    assert get_password_hasher().metrics()['completed'] == hashed  # Refused before the hash
+
+    # Other accounts from the same client are unaffected
+    assert client.post('/api/auth/login', json={'email': 'other@test.com', 'password': 'x'}).status_code == 401
+
+def test_login_ip_limit_uses_forwarded_client_address():
+    from app.config import TestingConfig
+
+    class ProxiedConfig(TestingConfig):
+        TRUSTED_PROXY_HOPS = 1
+
+    app = create_app(ProxiedConfig)
+    app.extensions['login_limiters']['ip'].limit = 2
+    with app.app_context():
+        db.create_all()
+        client = app.test_client()
+        def login(ip):
+            return client.post('/api/auth/login', json={'email': 'nobody@test.com', 'password': 'x'},
+                               headers={'X-Forwarded-For': ip}).status_code
+        assert [login('203.0.113.1') for _ in range(3)] == [401, 401, 429]
+        # Another client behind the same proxy has its own bucket
+        assert login('203.0.113.2') == 401
+        db.drop_all()
+
+def test_sliding_window_limiter():
+    from app.utils.presence import InMemoryRedis
+    from app.utils.rate_limit import SlidingWindowLimiter
+
+    limiter = SlidingWindowLimiter(InMemoryRedis(), 'test', limit=4, window=60)
+    for _ in range(4):
+        assert limiter.retry_after('k', now=1210) == 0
+        limiter.hit('k', now=1210)
+    assert limiter.retry_after('k', now=1210) == 50  # All 4 in this window: wait for the next
+    assert limiter.retry_after('k', now=1230) == 30
+    assert limiter.retry_after('other', now=1210) == 0
+
+    # A quarter into the next window 3/4 of the previous hits still count (3)
+    assert limiter.retry_after('k', now=1275) == 0
+    limiter.hit('k', now=1275)
+    limiter.hit('k', now=1275)
+    assert limiter.retry_after('k', now=1275) == 15  # 2 + 4 * 0.75 = 5; under 4 at half way
+    limiter.reset('k', now=1275)
+    assert limiter.retry_after('k', now=1275) == 0
+
+def test_cors_policy_preflight_and_wildcards(app, client, auth_headers):
+    from app.utils.cors import CorsPolicy
+
+    policy = CorsPolicy(['https://app.example.com/', 'https://landlord-app-*.vercel.app'],
+                        methods=('GET',), headers=('Authorization',), max_age=600)
+    assert policy.allows('https://app.example.com') and policy.allows('https://APP.example.com')
+    assert policy.allows('https://landlord-app-git-feature-x.vercel.app')
+    assert not policy.allows('https://landlord-app-x.evil.com/.vercel.app')
+    assert not policy.allows('https://evil.com') and not policy.allows(None)
+
+    app.extensions['cors_policy'] = CorsPolicy(['https://app.example.com'], methods=('GET', 'OPTIONS'),
+                                               headers=('Content-Type', 'Authorization'), max_age=7200)
+
+    preflight = client.options('/api/properties', headers={
+        'Origin': 'https://app.example.com', 'Access-Control-Request-Method': 'GET',
+        'Access-Control-Request-Headers': 'Authorization'})
+    assert preflight.status_code == 200
+    assert preflight.headers['Access-Control-Allow-Origin'] == 'https://app.example.com'
+    assert preflight.headers['Access-Control-Max-Age'] == '7200'
+    assert 'Authorization' in preflight.headers['Access-Control-Allow-Headers']
+
+    response = client.get('/api/properties', headers=dict(auth_headers, Origin='https://app.example.com'))
+    assert response.headers['Access-Control-Allow-Origin'] == 'https://app.example.com'
+    assert 'Access-Control-Max-Age' not in response.headers and 'Origin' in response.headers['Vary']
+
+    response = client.get('/api/properties', headers=dict(auth_headers, Origin='https://evil.com'))
+    assert 'Access-Control-Allow-Origin' not in response.headers
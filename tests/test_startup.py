@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported on first use, never while booting a worker
+LAZY_MODULES = ('cloudinary', 'sendgrid', 'flasgger', 'flask_migrate', 'alembic')
+
+# Cumulative import time allowed for `create_app()`; raise deliberately
+STARTUP_BUDGET_MS = float(os.environ.get('STARTUP_IMPORT_BUDGET_MS', 1500))
+
+def _boot_imports():
+    """Run create_app() in a fresh interpreter under -X importtime
+    Returns {top-level module: cumulative microseconds}
+    """
+    env = {key: value for key, value in os.environ.items() if not key.startswith('CLOUDINARY_')}
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'from app import create_app; create_app()'],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    imports = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not name.startswith('  '):  # Top level: nested imports are already counted
+            imports[name.strip()] = int(cumulative)
+    return imports, result.stderr
+
+def test_create_app_import_budget():
+    imports, report = _boot_imports()
+
+    loaded = [line.split('|')[2].strip() for line in report.splitlines() if line.count('|') == 2]
+    eager = sorted({name.split('.')[0] for name in loaded} & set(LAZY_MODULES))
+    assert not eager, f'Imported at startup, should be lazy: {eager}'
+
+    total_ms = sum(imports.values()) / 1000
+    slowest = sorted(imports.items(), key=lambda item: -item[1])[:5]
+    assert total_ms <= STARTUP_BUDGET_MS, (
+        f'Startup imports took {total_ms:.0f}ms (budget {STARTUP_BUDGET_MS:.0f}ms); slowest: '
+        + ', '.join(f'{name} {us / 1000:.0f}ms' for name, us in slowest)
+    )
+
+def test_create_app_under_cli_sets_up_migrate():
+    import click
+    from app import create_app
+    from app.config import TestingConfig
+
+    # `flask db ...` builds the app inside a click context
+    with click.Context(click.Command('db')):
+        app = create_app(TestingConfig)
+    assert 'migrate' in app.extensions